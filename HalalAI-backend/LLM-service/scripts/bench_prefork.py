@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Compare boot time and per-worker memory of `uvicorn --workers N` against the
+pre-fork entry point (`python -m halal_rag.api.prefork`).
+
+For every mode the script starts the server, waits until all N workers print
+"Application startup complete", then reads /proc/<pid>/smaps_rollup of each
+worker. Pss (proportional set size) is the number that matters: pages shared
+copy-on-write with the parent are split between the processes sharing them.
+
+Linux only. Usage:
+    python scripts/bench_prefork.py --workers 4 [--data data/quran_ru.jsonl] [--output results/prefork.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+READY_MARKER = "✓ Application startup complete"
+
+
+def read_smaps(pid: int) -> dict:
+    """Rss / Pss / Private memory of a process in MiB"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1]) / 1024
+    return {
+        "rss_mib": round(fields.get("Rss", 0.0), 1),
+        "pss_mib": round(fields.get("Pss", 0.0), 1),
+        "private_mib": round(fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0), 1),
+    }
+
+
+def child_pids(parent: int) -> list[int]:
+    """Worker processes of the server (resource tracker excluded)"""
+    pids = []
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+            cmdline = (entry / "cmdline").read_bytes().decode(errors="ignore")
+        except OSError:
+            continue
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        if ppid == parent and "resource_tracker" not in cmdline:
+            pids.append(int(entry.name))
+    return sorted(pids)
+
+
+def run_mode(name: str, cmd: list[str], workers: int, env: dict, timeout: float) -> dict:
+    print(f"\n{'=' * 60}\n{name}: {' '.join(cmd)}\n{'=' * 60}")
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1
+    )
+    ready = threading.Event()
+    seen = [0]
+
+    def pump():
+        for line in proc.stdout:
+            if READY_MARKER in line:
+                seen[0] += 1
+                if seen[0] >= workers:
+                    ready.set()
+
+    threading.Thread(target=pump, daemon=True).start()
+
+    try:
+        if not ready.wait(timeout):
+            raise TimeoutError(f"{name}: only {seen[0]}/{workers} workers ready after {timeout}s")
+        boot_s = time.perf_counter() - started
+        time.sleep(2.0)  # let allocations settle
+
+        workers_mem = {pid: read_smaps(pid) for pid in child_pids(proc.pid)}
+        parent_mem = read_smaps(proc.pid)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    pss_total = parent_mem["pss_mib"] + sum(m["pss_mib"] for m in workers_mem.values())
+    result = {
+        "mode": name,
+        "workers": workers,
+        "boot_seconds": round(boot_s, 2),
+        "parent": parent_mem,
+        "per_worker": list(workers_mem.values()),
+        "avg_worker_pss_mib": round(
+            sum(m["pss_mib"] for m in workers_mem.values()) / max(len(workers_mem), 1), 1
+        ),
+        "total_pss_mib": round(pss_total, 1),
+    }
+    print(f"  boot: {result['boot_seconds']}s, avg worker Pss: {result['avg_worker_pss_mib']} MiB, "
+          f"total Pss: {result['total_pss_mib']} MiB")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8123)
+    parser.add_argument("--data", help="JSONL corpus (defaults to data/quran_ru.jsonl)")
+    parser.add_argument("--timeout", type=float, default=900.0)
+    parser.add_argument("--output", help="write the comparison as JSON to this file")
+    args = parser.parse_args()
+
+    if not sys.platform.startswith("linux"):
+        print("Error: /proc/<pid>/smaps_rollup is required (Linux only)")
+        sys.exit(1)
+
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    if args.data:
+        env["RAG_DATA_FILE"] = str(Path(args.data).resolve())
+
+    results = [
+        run_mode(
+            "uvicorn --workers",
+            [sys.executable, "-m", "uvicorn", "halal_rag.api.main:app",
+             "--host", "127.0.0.1", "--port", str(args.port), "--workers", str(args.workers)],
+            args.workers, env, args.timeout,
+        ),
+        run_mode(
+            "prefork",
+            [sys.executable, "-m", "halal_rag.api.prefork",
+             "--host", "127.0.0.1", "--port", str(args.port), "--workers", str(args.workers)],
+            args.workers, env, args.timeout,
+        ),
+    ]
+
+    print(f"\n{'mode':<20}{'boot, s':>10}{'worker Pss, MiB':>18}{'total Pss, MiB':>17}")
+    for r in results:
+        print(f"{r['mode']:<20}{r['boot_seconds']:>10}{r['avg_worker_pss_mib']:>18}{r['total_pss_mib']:>17}")
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
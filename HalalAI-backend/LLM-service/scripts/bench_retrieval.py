@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of the vector index: `VectorStore.add_documents` and
+`VectorStore.search` on synthetic corpora, without the embedding model.
+
+For every corpus size × dimension × precision the script builds a store with
+one `add_documents` call, times `search` for every top_k × query batch (rows
+of a 2-D query, i.e. query variants fused by max), then times appends of
+`--add-batch` rows into the full store. Latencies are reported as p50 / p99 and
+ops/sec over `--queries` calls after `--warmup` untimed ones.
+
+Peak memory is the process high-water mark (VmHWM) of each phase, reset
+before the phase through /proc/self/clear_refs, so it includes torch
+allocations and temporaries such as the grown buffer made by an append;
+the resident size at the start of the phase is recorded next to it.
+On other platforms it is reported as null. Cases that would not fit in
+available memory are skipped and recorded as such.
+
+Usage:
+    python scripts/bench_retrieval.py --output results/retrieval.json
+    python scripts/bench_retrieval.py --rows 6000 --dims 384 --dtypes float32,bfloat16 --threads 4
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from halal_rag.rag.vector_store import VectorStore
+
+BACKENDS = {"torch": VectorStore}
+DTYPES = {"float32": torch.float32, "bfloat16": torch.bfloat16, "float16": torch.float16}
+# Python-side cost of one synthetic document dict plus its metadata index entries
+DOC_OVERHEAD_BYTES = 600
+SURAS = 114
+
+
+def int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def str_list(value: str) -> list[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def reset_peak_rss() -> bool:
+    """Reset the process high-water mark (Linux >= 4.0)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _status_mib(field: str):
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mib():
+    return _status_mib("VmHWM")
+
+
+def rss_mib():
+    return _status_mib("VmRSS")
+
+
+def available_bytes():
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def estimate_bytes(rows: int, dim: int, dtype: torch.dtype) -> int:
+    """Embedding buffer with its growth headroom, the old buffer while it is copied, documents"""
+    element = torch.empty(0, dtype=dtype).element_size()
+    return int(rows * dim * element * 2.5) + rows * DOC_OVERHEAD_BYTES
+
+
+def make_documents(start: int, count: int) -> list[dict]:
+    """Quran-like rows: consecutive verses grouped in suras"""
+    per_sura = 300
+    return [
+        {
+            "sura": (i // per_sura) % SURAS + 1,
+            "verse": str(i % per_sura + 1),
+            "text": f"synthetic verse {i}",
+        }
+        for i in range(start, start + count)
+    ]
+
+
+def make_embeddings(count: int, dim: int, dtype: torch.dtype, generator: torch.Generator) -> torch.Tensor:
+    return torch.randn(count, dim, generator=generator).to(dtype)
+
+
+def summarize(latencies: list[float], rows_per_op: int = 0) -> dict:
+    values = np.asarray(latencies)
+    total = float(values.sum())
+    result = {
+        "ops": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)) * 1000, 4),
+        "p99_ms": round(float(np.percentile(values, 99)) * 1000, 4),
+        "mean_ms": round(float(values.mean()) * 1000, 4),
+        "ops_per_sec": round(len(values) / total, 1) if total > 0 else None,
+    }
+    if rows_per_op:
+        result["rows_per_sec"] = round(len(values) * rows_per_op / total, 1) if total > 0 else None
+    return result
+
+
+def time_calls(func, count: int, warmup: int) -> list[float]:
+    for _ in range(warmup):
+        func()
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def run_case(backend: str, rows: int, dim: int, dtype_name: str, args, generator: torch.Generator) -> dict:
+    dtype = DTYPES[dtype_name]
+    case = {"backend": backend, "rows": rows, "dim": dim, "dtype": dtype_name}
+    print(f"\n{backend} rows={rows} dim={dim} dtype={dtype_name}")
+
+    needed = estimate_bytes(rows + args.add_repeats * max(args.add_batch, default=0), dim, dtype)
+    available = available_bytes()
+    if available is not None and needed > available * 0.8:
+        case["skipped"] = f"needs ~{needed / 2**20:.0f} MiB, {available / 2**20:.0f} MiB available"
+        print(f"  skipped: {case['skipped']}")
+        return case
+
+    documents = make_documents(0, rows)
+    embeddings = make_embeddings(rows, dim, dtype, generator)
+    gc.collect()
+
+    store = BACKENDS[backend]()
+    rss_before = rss_mib()
+    reset_peak_rss()
+    started = time.perf_counter()
+    store.add_documents(documents, embeddings)
+    build_s = time.perf_counter() - started
+    case["build"] = {
+        "seconds": round(build_s, 4),
+        "rows_per_sec": round(rows / build_s, 1),
+        "rss_before_mib": rss_before,
+        "peak_rss_mib": peak_rss_mib(),
+    }
+    del documents, embeddings
+    print(f"  build: {build_s:.3f}s ({case['build']['rows_per_sec']:.0f} rows/s)")
+
+    # Searches first, so every query sees exactly `rows` documents
+    case["search"] = []
+    case["search_rss_before_mib"] = rss_mib()
+    reset_peak_rss()
+    for top_k in args.top_k:
+        for batch in args.query_batch:
+            queries = [make_embeddings(batch, dim, dtype, generator) for _ in range(args.queries + args.warmup)]
+            it = iter(queries)
+            latencies = time_calls(lambda: store.search(next(it), top_k=top_k), args.queries, args.warmup)
+            entry = {"top_k": top_k, "query_batch": batch, **summarize(latencies)}
+            case["search"].append(entry)
+            print(f"  search top_k={top_k:<4} batch={batch:<3} p50 {entry['p50_ms']:.3f} ms  "
+                  f"p99 {entry['p99_ms']:.3f} ms  {entry['ops_per_sec']} ops/s")
+    case["search_peak_rss_mib"] = peak_rss_mib()
+
+    case["add"] = []
+    next_row = rows
+    for batch in args.add_batch:
+        chunks = [
+            (make_documents(next_row + i * batch, batch), make_embeddings(batch, dim, dtype, generator))
+            for i in range(args.add_repeats)
+        ]
+        next_row += batch * args.add_repeats
+        it = iter(chunks)
+        store_rows = len(store.documents)
+        rss_before = rss_mib()
+        reset_peak_rss()
+        latencies = time_calls(lambda: store.add_documents(*next(it)), args.add_repeats, 0)
+        entry = {"batch": batch, "store_rows": store_rows, **summarize(latencies, rows_per_op=batch),
+                 "rss_before_mib": rss_before, "peak_rss_mib": peak_rss_mib()}
+        case["add"].append(entry)
+        del chunks
+        print(f"  add batch={batch:<6} p50 {entry['p50_ms']:.1f} ms  p99 {entry['p99_ms']:.1f} ms  "
+              f"{entry['rows_per_sec']} rows/s")
+
+    del store
+    gc.collect()
+    return case
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, timeout=10
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "numpy": np.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "cpu_count": os.cpu_count(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", type=str_list, default=["torch"], help=f"of {', '.join(BACKENDS)}")
+    parser.add_argument("--rows", type=int_list, default=[6000, 100_000, 1_000_000])
+    parser.add_argument("--dims", type=int_list, default=[384, 768, 1024])
+    parser.add_argument("--dtypes", type=str_list, default=["float32"], help=f"of {', '.join(DTYPES)}")
+    parser.add_argument("--top-k", type=int_list, default=[3, 10, 50])
+    parser.add_argument("--query-batch", type=int_list, default=[1, 4],
+                        help="query variants per search call (rows of a 2-D query)")
+    parser.add_argument("--add-batch", type=int_list, default=[100, 1000, 10_000],
+                        help="rows per add_documents call into the built store")
+    parser.add_argument("--add-repeats", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--threads", type=int, help="torch intra-op threads (default: torch's choice)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    for name, allowed in ((args.backends, BACKENDS), (args.dtypes, DTYPES)):
+        unknown = [v for v in name if v not in allowed]
+        if unknown:
+            parser.error(f"unknown value(s) {', '.join(unknown)}; expected {', '.join(allowed)}")
+    if args.queries < 1 or args.add_repeats < 1:
+        parser.error("--queries and --add-repeats must be positive")
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.set_grad_enabled(False)
+    generator = torch.Generator().manual_seed(args.seed)
+    if not reset_peak_rss():
+        print("Warning: /proc/self/clear_refs is not writable, peak memory is the process lifetime maximum",
+              file=sys.stderr)
+
+    cases = [
+        run_case(backend, rows, dim, dtype_name, args, generator)
+        for backend in args.backends
+        for dtype_name in args.dtypes
+        for dim in args.dims
+        for rows in args.rows
+    ]
+
+    print(f"\n{'backend':<8}{'dtype':<10}{'rows':>9}{'dim':>6}{'top_k':>7}{'batch':>7}"
+          f"{'p50, ms':>10}{'p99, ms':>10}{'ops/s':>10}")
+    for case in cases:
+        for s in case.get("search", []):
+            print(f"{case['backend']:<8}{case['dtype']:<10}{case['rows']:>9}{case['dim']:>6}{s['top_k']:>7}"
+                  f"{s['query_batch']:>7}{s['p50_ms']:>10.3f}{s['p99_ms']:>10.3f}{s['ops_per_sec']:>10}")
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"environment": environment(), "parameters": vars(args), "cases": cases},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n✓ Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,10 @@ Create chunked representation of Quran data.
 
 Groups verses into chunks of size N with optional overlap.
 Chunk format: {chunk_id, sura, verse_start, verse_end, text}
+
+Retrieval no longer needs this file: SimpleRAG(context_window=N) expands
+verse hits to their neighbours on the verse-level index. It is kept for
+exporting chunk datasets.
 """
 
 import json
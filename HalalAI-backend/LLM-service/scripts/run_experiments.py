@@ -105,12 +105,17 @@ CONFIGS = [
 ]
 
 
-def load_documents(use_chunks: bool, base_path: Path) -> list[dict]:
-    """Load verse or chunk documents"""
-    if use_chunks:
-        data_file = base_path / "data" / "quran_chunks.jsonl"
-    else:
-        data_file = base_path / "data" / "quran_ru.jsonl"
+# "Chunk" configurations expand each verse hit by this many neighbours on each
+# side, on the same verse-level index (no separate chunk embeddings)
+CHUNK_CONTEXT_WINDOW = 1
+
+# One index per (model, fine-tuned) pair, shared by verse and chunk configs
+_indexes: dict[tuple[str, bool], SimpleRAG] = {}
+
+
+def load_documents(base_path: Path) -> list[dict]:
+    """Load verse documents"""
+    data_file = base_path / "data" / "quran_ru.jsonl"
 
     if not data_file.exists():
         print(f"Error: {data_file} not found")
@@ -146,26 +151,33 @@ def run_config(config: Config, results_dir: Path, base_path: Path):
         return
 
     # C2-C9: With RAG
-    docs = load_documents(config.use_chunks, base_path)
-    if not docs:
-        print(f"Error: Could not load documents for {config.id}")
-        return
+    key = (config.model_name, config.use_finetuned)
+    rag = _indexes.get(key)
+    if rag is None:
+        docs = load_documents(base_path)
+        if not docs:
+            print(f"Error: Could not load documents for {config.id}")
+            return
 
-    try:
-        rag = SimpleRAG(
-            documents=docs,
-            embedding_model=config.model_name,
-            use_finetuned=config.use_finetuned
-        )
-        print(f"✓ RAG initialized with {len(docs)} documents")
-    except Exception as e:
-        print(f"Error initializing RAG: {e}")
-        return
+        try:
+            rag = SimpleRAG(
+                documents=docs,
+                model_type="sbert" if "sbert" in config.model_name else "paraphrase",
+                use_finetuned=config.use_finetuned,
+                # The configurations compare embedding models: dense retrieval only, whatever RAG_HYBRID says
+                hybrid=False,
+            )
+            _indexes[key] = rag
+            print(f"✓ RAG initialized with {len(docs)} documents")
+        except Exception as e:
+            print(f"Error initializing RAG: {e}")
+            return
+    context_window = CHUNK_CONTEXT_WINDOW if config.use_chunks else 0
 
     # Run queries
     for i, question in enumerate(TEST_QUESTIONS, 1):
         try:
-            results = rag.search(question, top_k=3)
+            results = rag.search(question, top_k=3, context_window=context_window)
             output_file = config_dir / f"question_{i:02d}.txt"
 
             with open(output_file, 'w', encoding='utf-8') as f:
@@ -176,10 +188,7 @@ def run_config(config: Config, results_dir: Path, base_path: Path):
 
                 for j, result in enumerate(results, 1):
                     f.write(f"Result {j} (score: {result.get('score', 'N/A'):.4f}):\n")
-                    if config.use_chunks:
-                        f.write(f"Sura {result['sura']}:{result['verse_start']}-{result['verse_end']}\n")
-                    else:
-                        f.write(f"Sura {result['sura']}:{result['verse']}\n")
+                    f.write(f"Sura {result['sura']}:{result['verse']}\n")
                     f.write(f"Text: {result['text']}\n")
                     f.write(f"\n{'-'*60}\n\n")
 
@@ -4,8 +4,10 @@ import logging
 import os
 from typing import Optional
 
+from halal_rag.llm.hedging import HedgedExecutor
+from halal_rag.llm.history import ConversationMemory
 from halal_rag.llm.interfaces import ILLMClient
-from halal_rag.llm.open_router import OpenRouterClient
+from halal_rag.rag.cutoff import SourceCutoff
 from halal_rag.rag.interfaces import IRAGPipeline
 from halal_rag.rag.retriever import SimpleRAG
 from .interfaces import IChatService
@@ -13,6 +15,21 @@ from .interfaces import IChatService
 logger = logging.getLogger(__name__)
 
 
+def _fallback_models_from_env() -> list[str]:
+    """LLM_FALLBACK_MODELS: comma-separated models tried after the requested one"""
+    return [m.strip() for m in os.getenv("LLM_FALLBACK_MODELS", "").split(",") if m.strip()]
+
+
+def _hedger_from_env() -> HedgedExecutor:
+    delay = os.getenv("LLM_HEDGE_DELAY", "").strip()
+    return HedgedExecutor(
+        hedging=os.getenv("LLM_HEDGING", "true").strip().lower() not in ("0", "false", "no", "off"),
+        default_delay=float(delay) if delay else None,
+        quantile=float(os.getenv("LLM_HEDGE_QUANTILE", "0.9")),
+        max_models=int(os.getenv("LLM_HEDGE_MAX_MODELS", "100")),
+    )
+
+
 class DependencyContainer:
     """Manages dependencies for the application"""
 
@@ -21,12 +38,12 @@ class DependencyContainer:
     _chat_service: Optional[IChatService] = None
 
     @classmethod
-    def set_rag(cls, rag: IRAGPipeline) -> None:
+    def set_rag(cls, rag: Optional[IRAGPipeline]) -> None:
         """Set RAG instance (called during app startup)"""
         cls._rag = rag
 
     @classmethod
-    def set_llm_client(cls, client: ILLMClient) -> None:
+    def set_llm_client(cls, client: Optional[ILLMClient]) -> None:
         """Set LLM client instance"""
         cls._llm_client = client
 
@@ -36,18 +53,12 @@ class DependencyContainer:
         return cls._rag
 
     @classmethod
-    def get_llm_client(cls, api_key: Optional[str] = None) -> Optional[ILLMClient]:
-        """Get or create LLM client (lazy initialization)"""
-        if cls._llm_client is None:
-            try:
-                key = api_key or os.getenv("OPEN_ROUTER_KEY")
-                if not key:
-                    raise ValueError("OPEN_ROUTER_KEY must be provided or set as environment variable")
-                cls._llm_client = OpenRouterClient()
-                print("✓ OpenRouter client initialized")
-            except Exception as e:
-                print(f"⚠️  Failed to initialize OpenRouter client: {e}")
-                cls._llm_client = None
+    def get_llm_client(cls) -> Optional[ILLMClient]:
+        """The client installed by the app lifespan, None outside it.
+
+        The lifespan owns the one pooled client and closes it on shutdown, so
+        nothing here builds a second one.
+        """
         return cls._llm_client
 
     @classmethod
@@ -58,20 +69,28 @@ class DependencyContainer:
             llm_client = cls.get_llm_client()
             if rag:
                 from .services import ChatService
-                cls._chat_service = ChatService(rag=rag, llm_client=llm_client)
-                print("✓ ChatService initialized")
+                cls._chat_service = ChatService(
+                    rag=rag,
+                    llm_client=llm_client,
+                    fallback_models=_fallback_models_from_env(),
+                    hedger=_hedger_from_env(),
+                    memory=ConversationMemory.from_env(llm_client),
+                    cutoff=SourceCutoff.from_env(),
+                    debug_timings=os.getenv("LLM_DEBUG_TIMINGS", "false").strip().lower() in ("1", "true", "yes", "on"),
+                )
+                logger.info("✓ ChatService initialized")
         return cls._chat_service
 
 
 # Module-level convenience functions for backward compatibility
-def set_rag(rag: IRAGPipeline) -> None:
+def set_rag(rag: Optional[IRAGPipeline]) -> None:
     """Set RAG instance (called during app startup)"""
     DependencyContainer.set_rag(rag)
     # Reset chat service when RAG changes
     DependencyContainer._chat_service = None
 
 
-def set_llm_client(client: ILLMClient) -> None:
+def set_llm_client(client: Optional[ILLMClient]) -> None:
     """Set LLM client instance"""
     DependencyContainer.set_llm_client(client)
     # Reset chat service when LLM client changes
@@ -83,9 +102,9 @@ def get_rag() -> Optional[IRAGPipeline]:
     return DependencyContainer.get_rag()
 
 
-def get_llm_client(api_key: Optional[str] = None) -> Optional[ILLMClient]:
-    """Get or create LLM client (lazy initialization)"""
-    return DependencyContainer.get_llm_client(api_key=api_key)
+def get_llm_client() -> Optional[ILLMClient]:
+    """Get the LLM client installed by the app lifespan"""
+    return DependencyContainer.get_llm_client()
 
 
 def get_chat_service() -> Optional[IChatService]:
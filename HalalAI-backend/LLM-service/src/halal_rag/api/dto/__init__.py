@@ -3,5 +3,8 @@ from .chat_response import ChatResponse
 from .health_response import HealthResponse
 from .api_info_response import ApiInfoResponse
 from .root_response import RootResponse
+from .stats_response import StatsResponse
+from .source_filter import SourceFilter
+from .usage_response import UsageResponse
 
-__all__ = ["ChatRequest", "ChatResponse", "HealthResponse", "ApiInfoResponse", "RootResponse"]
+__all__ = ["ChatRequest", "ChatResponse", "HealthResponse", "ApiInfoResponse", "RootResponse", "StatsResponse", "UsageResponse", "SourceFilter"]
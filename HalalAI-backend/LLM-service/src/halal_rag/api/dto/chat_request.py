@@ -1,6 +1,8 @@
 from typing import Optional
 from pydantic import BaseModel
 
+from .source_filter import SourceFilter
+
 
 class ChatRequest(BaseModel):
     """Request model for /llm/chat endpoint"""
@@ -10,3 +12,11 @@ class ChatRequest(BaseModel):
     remote_model: str = "qwen/qwen3.6-plus:free"
     temperature: float = 0.7
     use_rag: bool = True
+    # Ordered models tried (and hedged) after remote_model; None = server default
+    fallback_models: Optional[list[str]] = None
+    # Stable id of the dialog; enables the cached summary of older turns
+    conversation_id: Optional[str] = None
+    # Search only these suras / verse ranges / corpora
+    source_filter: Optional[SourceFilter] = None
+    # Return the per-stage latency breakdown in ChatResponse.timings
+    debug: bool = False
@@ -7,3 +7,7 @@ class ChatResponse(BaseModel):
     reply: str
     used_remote: bool = False
     remote_error: Optional[str] = None
+    # Sources that passed the relevance cutoff and the prompt budget
+    sources_used: int = 0
+    # Milliseconds per pipeline stage; only for debug requests (or LLM_DEBUG_TIMINGS=true)
+    timings: Optional[dict[str, float]] = None
@@ -5,3 +5,5 @@ class HealthResponse(BaseModel):
     status: str
     rag_ready: str
     llm_ready: str
+    # remote_model -> closed / open / half_open
+    circuit_breakers: dict[str, str] = {}
@@ -0,0 +1,12 @@
+from typing import Optional
+from pydantic import BaseModel
+
+
+class SourceFilter(BaseModel):
+    """Restricts RAG retrieval to part of the corpus"""
+    suras: Optional[list[int]] = None
+    # Verse range applied inside every selected sura
+    verse_from: Optional[int] = None
+    verse_to: Optional[int] = None
+    corpus: Optional[list[str]] = None
+    translation: Optional[list[str]] = None
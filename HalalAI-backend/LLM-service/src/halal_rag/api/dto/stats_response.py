@@ -0,0 +1,10 @@
+from typing import Any
+from pydantic import BaseModel
+
+
+class StatsResponse(BaseModel):
+    """Response model for /llm/stats endpoint"""
+    upstream: dict[str, Any]
+    routing: dict[str, Any] = {}
+    # Documents, shards and index memory per corpus
+    retrieval: dict[str, Any] = {}
@@ -0,0 +1,9 @@
+from typing import Any
+from pydantic import BaseModel
+
+
+class UsageResponse(BaseModel):
+    """Response model for /llm/usage endpoint"""
+    models: dict[str, Any] = {}
+    api_keys: dict[str, Any] = {}
+    evicted: int = 0
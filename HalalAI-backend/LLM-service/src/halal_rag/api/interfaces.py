@@ -11,3 +11,7 @@ class IChatService(ABC):
     async def process_chat(self, request: ChatRequest) -> ChatResponse:
         """Process chat request end-to-end"""
         ...
+
+    def stats(self) -> dict:
+        """Runtime statistics of the service"""
+        return {}
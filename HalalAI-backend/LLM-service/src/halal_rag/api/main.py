@@ -1,52 +1,121 @@
 """FastAPI application for HalalAI RAG Service"""
 
+import hmac
 import logging
 import json
+import os
+import time
 from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
-from halal_rag.rag.retriever import SimpleRAG
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from halal_rag.llm.open_router import OpenRouterClient
+from halal_rag.rag.embeddings import EmbeddingModel
+from halal_rag.rag.expansion import QueryExpander
+from halal_rag.rag.registry import CorpusSpec, IndexRegistry, SharedEncoder, parse_corpora
+from halal_rag.rag.rerank import Reranker, rerank_enabled
+from halal_rag.rag.retriever import SimpleRAG, lemma_query_key
 from halal_rag.api import dependencies
-from halal_rag.api.dto import ChatRequest, ChatResponse, HealthResponse, ApiInfoResponse, RootResponse
+from halal_rag.observability.logs import REQUEST_ID_HEADER, bind_request, configure_logging, shutdown_logging
+from halal_rag.observability import profiler
+from halal_rag.observability.metrics import CONTENT_TYPE, ERRORS, IN_FLIGHT, REGISTRY, observe_pool, timed
+from halal_rag.observability.timing import SERVER_TIMING_HEADER, bind_timings
+from halal_rag.observability.tracing import TRACEPARENT_HEADER, configure_tracing, get_tracer, shutdown_tracing
+from halal_rag.api.dto import ChatRequest, ChatResponse, HealthResponse, ApiInfoResponse, RootResponse, StatsResponse, UsageResponse
 
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+# Longest profile a single /admin/profile call may run
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "120"))
+
+DATA_FILE = Path(
+    os.getenv("RAG_DATA_FILE", Path(__file__).parent.parent.parent.parent / "data" / "quran_ru.jsonl")
+)
+
+
+def corpus_specs() -> list[CorpusSpec]:
+    """Corpora from RAG_CORPORA, or the Quran translation at RAG_DATA_FILE"""
+    shards = int(os.getenv("RAG_CORPUS_SHARDS", "1"))
+    configured = os.getenv("RAG_CORPORA", "").strip()
+    if configured:
+        return parse_corpora(configured, default_shards=shards)
+    return [CorpusSpec(name="quran_ru", path=DATA_FILE, shards=shards)]
+
+
+def load_documents(data_file: Path) -> list[dict]:
+    """Read a JSONL corpus, one document per line"""
+    docs = []
+    with open(data_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                docs.append(json.loads(line))
+    return docs
+
+
+def load_rag(specs: Optional[list[CorpusSpec]] = None) -> IndexRegistry:
+    """Build one RAG pipeline per corpus shard around a single loaded encoder"""
+    specs = specs or corpus_specs()
+    for spec in specs:
+        if not spec.path.exists():
+            kind = "Quran" if spec.path == DATA_FILE else f"Corpus '{spec.name}'"
+            raise FileNotFoundError(f"{kind} data not found at {spec.path}")
+
+    encoder = SharedEncoder(EmbeddingModel(model_type="paraphrase", use_finetuned=True))
+    # Stateful stages are shared too: one cross-encoder, one set of synonym vectors.
+    # Inflections of one query share rerank cache entries, as in a standalone SimpleRAG
+    reranker = Reranker.from_env(query_key=lemma_query_key()) if rerank_enabled() else None
+    expander = QueryExpander.from_env(encoder)
+
+    def pipeline(documents, embeddings):
+        return SimpleRAG(documents=documents, embeddings=embeddings, reranker=reranker, expander=expander)
+
+    default = [name.strip() for name in os.getenv("RAG_DEFAULT_CORPORA", "").split(",") if name.strip()]
+    registry = IndexRegistry.build(specs, pipeline, encoder, default=default or None, loader=load_documents)
+    logger.info("✓ Loaded %d documents", sum(c["documents"] for c in registry.stats()["corpora"].values()))
+    return registry
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application startup and shutdown"""
-    print("🚀 Starting HalalAI RAG API...")
-
-    # Startup: Initialize RAG
-    try:
-        print("📚 Loading RAG system...")
-        data_file = Path(__file__).parent.parent.parent.parent / "data" / "quran_ru.jsonl"
-
-        if not data_file.exists():
-            raise FileNotFoundError(f"Quran data not found at {data_file}")
+    configure_logging()
+    # One tracer and exporter per worker process (TRACE_EXPORTER, TRACE_SAMPLE_RATE)
+    configure_tracing()
+    logger.info("🚀 Starting HalalAI RAG API...")
 
-        docs = []
-        with open(data_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line:
-                    docs.append(json.loads(line))
+    # Startup: Initialize RAG (skipped when a pre-fork parent already loaded it)
+    if dependencies.get_rag() is None:
+        try:
+            logger.info("📚 Loading RAG system...")
+            dependencies.set_rag(load_rag())
+            logger.info("✓ RAG system ready")
 
-        print(f"✓ Loaded {len(docs)} Quranic verses")
-        rag = SimpleRAG(documents=docs, model_type="paraphrase", use_finetuned=True)
-        dependencies.set_rag(rag)
-        print("✓ RAG system ready")
+        except Exception as e:
+            logger.error("❌ Failed to initialize RAG: %s", e)
+            raise
+    else:
+        logger.info("✓ Using RAG system preloaded by the parent process")
 
-    except Exception as e:
-        print(f"❌ Failed to initialize RAG: {e}")
-        raise
+    # One pooled upstream client per worker process, shared by all requests
+    llm_client = OpenRouterClient()
+    dependencies.set_llm_client(llm_client)
+    logger.info("✓ OpenRouter client ready (pool of %d connections)", llm_client.settings.max_connections)
 
-    print("✓ Application startup complete")
+    logger.info("✓ Application startup complete")
     yield
 
     # Shutdown
-    print("👋 Shutting down RAG system...")
+    logger.info("👋 Shutting down RAG system...")
+    await llm_client.close()
+    dependencies.set_llm_client(None)
+    dependencies.set_rag(None)
+    shutdown_tracing()
+    shutdown_logging()
 
 
 app = FastAPI(
@@ -57,16 +126,51 @@ app = FastAPI(
 )
 
 
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """Bind a request id (taken from X-Request-ID or generated) to every log record; report stage timings"""
+    request_id = bind_request(request.headers.get(REQUEST_ID_HEADER))
+    timings = bind_timings()
+    IN_FLIGHT.inc()
+    try:
+        # Root span of the request, continuing the caller's trace (traceparent from the Spring backend)
+        with get_tracer().trace(
+            "http.request",
+            traceparent=request.headers.get(TRACEPARENT_HEADER),
+            method=request.method,
+            path=request.url.path,
+            request_id=request_id,
+        ) as root:
+            response = await call_next(request)
+            if root is not None:
+                root.set_attribute("status_code", response.status_code)
+    except Exception as e:
+        ERRORS.labels("http", type(e).__name__).inc()
+        raise
+    finally:
+        IN_FLIGHT.dec()
+    profiler.request_finished()
+    if response.status_code >= 500:
+        ERRORS.labels("http", f"http_{response.status_code}").inc()
+    response.headers[REQUEST_ID_HEADER] = request_id
+    if timings.stages:
+        response.headers[SERVER_TIMING_HEADER] = timings.header()
+    return response
+
+
 @app.get("/llm/health", response_model=HealthResponse, tags=["Health"])
 async def health_check() -> HealthResponse:
     """Check service availability"""
     rag = dependencies.get_rag()
     llm_client = dependencies.get_llm_client()
 
+    breakers = llm_client.stats().get("circuit_breakers", {}) if llm_client else {}
+
     return HealthResponse(
         status="ok",
         rag_ready="ready" if rag else "initializing",
-        llm_ready="ready" if llm_client else "not initialized"
+        llm_ready="ready" if llm_client else "not initialized",
+        circuit_breakers={model: b["state"] for model, b in breakers.items()},
     )
 
 
@@ -80,7 +184,79 @@ async def chat(request: ChatRequest):
     if not service:
         raise HTTPException(status_code=503, detail="Chat service not initialized")
 
-    return await service.process_chat(request)
+    with timed("total"):
+        return await service.process_chat(request)
+
+
+@app.get("/llm/stats", response_model=StatsResponse, tags=["Health"])
+async def stats() -> StatsResponse:
+    """Runtime statistics of the upstream LLM client, model routing and loaded corpora"""
+    llm_client = dependencies.get_llm_client()
+    service = dependencies.get_chat_service()
+    rag_stats = getattr(dependencies.get_rag(), "stats", None)
+    return StatsResponse(
+        upstream=llm_client.stats() if llm_client else {},
+        routing=service.stats() if service else {},
+        retrieval=rag_stats() if callable(rag_stats) else {},
+    )
+
+
+@app.get("/llm/usage", response_model=UsageResponse, tags=["Health"])
+async def usage() -> UsageResponse:
+    """Upstream tokens, latency, time to first token and errors per model and per hashed API key"""
+    llm_client = dependencies.get_llm_client()
+    return UsageResponse(**(llm_client.usage_stats() if llm_client else {}))
+
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Health"])
+async def metrics() -> PlainTextResponse:
+    """Stage latency histograms, cache, error and retry counters, in-flight and queue gauges (Prometheus text format)"""
+    llm_client = dependencies.get_llm_client()
+    observe_pool(llm_client.stats().get("pool") if llm_client else None)
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+def require_admin(request: Request) -> None:
+    """Admin endpoints exist only when LLM_ADMIN_TOKEN is set and take it in X-Admin-Token"""
+    token = os.getenv("LLM_ADMIN_TOKEN", "")
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get(ADMIN_TOKEN_HEADER, ""), token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@app.post("/admin/profile", response_class=PlainTextResponse, include_in_schema=False)
+async def profile(
+    request: Request,
+    seconds: float = 10.0,
+    requests: int = 0,
+    interval_ms: float = 5.0,
+    tasks: bool = True,
+) -> PlainTextResponse:
+    """Sample this worker for `seconds` (or until `requests` requests were served) and return collapsed stacks"""
+    require_admin(request)
+    if not 0 < seconds <= PROFILE_MAX_SECONDS or requests < 0 or interval_ms < 1:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Expected 0 < seconds <= {PROFILE_MAX_SECONDS:g}, requests >= 0, interval_ms >= 1",
+        )
+    logger.info("Profiling started", extra={"seconds": seconds, "requests": requests, "interval_ms": interval_ms})
+    try:
+        result = await profiler.profile(seconds, requests=requests, interval=interval_ms / 1000, include_tasks=tasks)
+    except profiler.ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    logger.info("Profiling finished", extra={"samples": result.ticks, "requests": result.requests})
+    filename = f"profile-{os.getpid()}-{int(time.time())}.folded"
+    return PlainTextResponse(
+        result.collapsed(),
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Profile-Pid": str(os.getpid()),
+            "X-Profile-Samples": str(result.ticks),
+            "X-Profile-Requests": str(result.requests),
+            "X-Profile-Seconds": f"{result.elapsed:.3f}",
+        },
+    )
 
 
 @app.get("/llm/info", response_model=ApiInfoResponse, tags=["Docs"])
@@ -93,6 +269,9 @@ async def api_info() -> ApiInfoResponse:
         endpoints={
             "health": "/llm/health",
             "chat": "/llm/chat (POST)",
+            "stats": "/llm/stats",
+            "usage": "/llm/usage",
+            "metrics": "/metrics",
             "info": "/llm/info",
             "docs": "/docs"
         }
@@ -0,0 +1,168 @@
+"""Pre-fork server entry point.
+
+The parent process imports torch, loads the encoder and builds the index once,
+then forks uvicorn workers that share the read-only weights and embedding
+tensors through copy-on-write. Usage::
+
+    python -m halal_rag.api.prefork --workers 4 --port 8000
+"""
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Optional
+
+import uvicorn
+
+from halal_rag.api import dependencies
+from halal_rag.api.main import app, load_rag
+from halal_rag.rag.registry import IndexRegistry
+
+logger = logging.getLogger(__name__)
+
+
+def _freeze_model(rag) -> None:
+    """Put the model into a state where serving never writes to shared pages"""
+    model = getattr(getattr(rag, "embeddings", None), "model", None)
+    if model is not None:
+        model.eval()
+        for param in model.parameters():
+            param.requires_grad_(False)
+
+    # A corpus registry holds one pipeline per corpus shard
+    pipelines = rag.pipelines() if isinstance(rag, IndexRegistry) else [rag]
+    for pipeline in pipelines:
+        store = getattr(pipeline, "store", None)
+        embeddings = getattr(store, "embeddings", None)
+        if embeddings is not None:
+            store.embeddings = embeddings.contiguous()
+
+
+def preload() -> None:
+    """Load the encoder and index in the parent before any worker is forked"""
+    # No cyclic GC passes while hundreds of thousands of objects are allocated
+    gc.disable()
+    try:
+        rag = load_rag()
+        _freeze_model(rag)
+    finally:
+        gc.enable()
+
+    dependencies.set_rag(rag)
+
+    # Move everything allocated so far into the permanent generation: the
+    # collector in the children never traverses these objects, so it never
+    # writes to (and unshares) the pages holding their headers. Weights and
+    # embeddings live in tensor storage outside of PyObject headers, so
+    # refcount updates on the wrapping objects touch only a handful of pages.
+    gc.collect()
+    gc.freeze()
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, host: str, port: int, threads: Optional[int]) -> None:
+    """Body of a forked worker: serve the app on the inherited socket"""
+    # Default signal handlers; uvicorn installs its own graceful ones
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+    config = uvicorn.Config(app, host=host, port=port, log_level="info", lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(sock: socket.socket, host: str, port: int, threads: Optional[int]) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(sock, host, port, threads)
+        except BaseException:
+            logger.exception("Worker %s crashed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def serve(host: str, port: int, workers: int, threads: Optional[int] = None) -> None:
+    """Preload the RAG system, fork `workers` children and supervise them"""
+    started = time.perf_counter()
+    logger.info("🚀 Pre-fork server: loading RAG once for %d workers...", workers)
+    preload()
+    logger.info("✓ RAG preloaded in %.1fs", time.perf_counter() - started)
+
+    sock = _bind_socket(host, port)
+    children: set[int] = set()
+    shutting_down = False
+
+    def stop(signum, _frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for child in list(children):
+            try:
+                os.kill(child, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        children.add(_spawn(sock, host, port, threads))
+    logger.info("✓ %d workers serving on http://%s:%d", workers, host, port)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not shutting_down:
+            logger.warning("⚠️  Worker %d exited with status %d, respawning", pid, status)
+            time.sleep(1.0)  # do not spin if workers die right after start
+            children.add(_spawn(sock, host, port, threads))
+
+    sock.close()
+    logger.info("👋 Pre-fork server stopped")
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="HalalAI RAG API pre-fork server")
+    parser.add_argument("--host", default=os.getenv("RAG_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("RAG_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("RAG_WORKERS", "2")))
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=int(os.getenv("RAG_WORKER_THREADS", "0")) or None,
+        help="torch intra-op threads per worker (default: torch decides)",
+    )
+    args = parser.parse_args(argv)
+
+    if sys.platform == "win32":
+        parser.error("pre-fork mode requires os.fork(); use uvicorn directly on Windows")
+
+    serve(args.host, args.port, args.workers, args.threads)
+
+
+if __name__ == "__main__":
+    main()
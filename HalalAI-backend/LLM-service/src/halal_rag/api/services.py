@@ -3,11 +3,19 @@
 import logging
 from typing import Optional
 
+from halal_rag.llm.hedging import HedgedExecutor
+from halal_rag.llm.history import ConversationMemory
 from halal_rag.llm.interfaces import ILLMClient
+from halal_rag.llm.token_budget import PromptBudgeter
+from halal_rag.observability.logs import log_bodies
+from halal_rag.observability.metrics import run_queued, timed
+from halal_rag.observability.timing import bind_timings, current_timings
+from halal_rag.observability.tracing import span
+from halal_rag.rag.cutoff import SourceCutoff
 from halal_rag.rag.interfaces import IRAGPipeline
+from halal_rag.rag.metadata import SearchFilter, source_label
 from .interfaces import IChatService
-from .dto import ChatRequest, ChatResponse
-from halal_rag.llm.open_router import OpenRouterClient
+from .dto import ChatRequest, ChatResponse, SourceFilter
 
 logger = logging.getLogger(__name__)
 
@@ -15,11 +23,32 @@ logger = logging.getLogger(__name__)
 class ChatService(IChatService):
     """Service for handling chat requests"""
 
-    def __init__(self, rag: Optional[IRAGPipeline], llm_client: Optional[ILLMClient]):
+    def __init__(
+        self,
+        rag: Optional[IRAGPipeline],
+        llm_client: Optional[ILLMClient],
+        fallback_models: Optional[list[str]] = None,
+        hedger: Optional[HedgedExecutor] = None,
+        budgeter: Optional[PromptBudgeter] = None,
+        memory: Optional[ConversationMemory] = None,
+        cutoff: Optional[SourceCutoff] = None,
+        debug_timings: bool = False,
+    ):
         self.rag = rag
         self.llm_client = llm_client
-        # Create one reusable OpenRouter client
-        self.openrouter_client = OpenRouterClient()
+        # Models tried after request.remote_model, in order
+        self.fallback_models = fallback_models or []
+        self.hedger = hedger or HedgedExecutor()
+        self.budgeter = budgeter or PromptBudgeter()
+        self.memory = memory or ConversationMemory()
+        self.cutoff = cutoff or SourceCutoff()
+        # Stage timings in every response, not only for requests with `debug`
+        self.debug_timings = debug_timings
+
+    def model_chain(self, primary: str, fallback_models: Optional[list[str]] = None) -> list[str]:
+        """Ordered, de-duplicated list of models to try for a request"""
+        chain = [primary] + (fallback_models if fallback_models is not None else self.fallback_models)
+        return list(dict.fromkeys(m for m in chain if m))
 
     def extract_user_message(self, messages: list[dict[str, str]]) -> str:
         """Extract last user message from conversation history"""
@@ -28,47 +57,96 @@ class ChatService(IChatService):
                 return msg.get("content", "").strip()
         return ""
 
-    def search_sources(self, query: str, top_k: int = 3) -> list[dict]:
+    def search_sources(self, query: str, top_k: int = 3, search_filter: Optional[SearchFilter] = None) -> list[dict]:
         """Search for relevant Quranic verses"""
         if not self.rag or not query:
             return []
-        return self.rag.search(query, top_k=top_k)
+        if search_filter is None:
+            return self.rag.search(query, top_k=top_k)
+        return self.rag.search(query, top_k=top_k, search_filter=search_filter)
+
+    @staticmethod
+    def to_search_filter(source_filter: Optional[SourceFilter]) -> Optional[SearchFilter]:
+        """Request-level filter -> retrieval filter (None when nothing is constrained)"""
+        if source_filter is None:
+            return None
+        metadata = {
+            name: values
+            for name, values in (("corpus", source_filter.corpus), ("translation", source_filter.translation))
+            if values
+        }
+        search_filter = SearchFilter(
+            suras=source_filter.suras,
+            verse_from=source_filter.verse_from,
+            verse_to=source_filter.verse_to,
+            metadata=metadata,
+        )
+        return None if search_filter.is_empty() else search_filter
 
     def format_sources(self, sources: list[dict]) -> str:
         """Format sources for LLM prompt"""
         if not sources:
             return "No sources found"
-        return "\n\n".join([f"Сура {r['sura']}:{r['verse']}\n{r['text']}" for r in sources])
+        return "\n\n".join(f"{source_label(r)}\n{r['text']}" for r in sources)
 
     async def generate_response(
-        self, query: str, sources: str, api_key: Optional[str], model: str, max_tokens: int, temperature: float = 0.7
+        self,
+        query: str,
+        sources: str,
+        api_key: Optional[str],
+        model: str,
+        max_tokens: int,
+        temperature: float = 0.7,
+        fallback_models: Optional[list[str]] = None,
+        history: Optional[list[dict[str, str]]] = None,
     ) -> tuple[str, bool, Optional[str]]:
-        """Generate response using LLM"""
+        """Generate response using LLM, hedging over the model chain"""
         if not api_key:
             return "", False, "API key is required"
+        if self.llm_client is None:
+            return "", False, "LLM client is not initialized"
 
-        try:
-            reply = await self.openrouter_client.generate(
+        llm_client = self.llm_client
+
+        async def call(candidate: str) -> str:
+            return await llm_client.generate(
                 query=query,
                 sources=sources,
                 api_key=api_key,
-                model=model,
+                model=candidate,
                 max_tokens=max_tokens,
-                temperature=temperature
+                temperature=temperature,
+                history=history,
             )
+
+        try:
+            reply, winner = await self.hedger.run(self.model_chain(model, fallback_models), call)
+            if winner != model:
+                logger.info("Answer served by fallback model", extra={"model": model, "served_by": winner})
             return reply, True, None
 
         except Exception as e:
             error_msg = str(e)
-            print(f"❌ LLM generation failed: {error_msg}")
+            logger.warning("LLM generation failed: %s", error_msg, extra={"model": model})
             return "", False, error_msg
 
+    def stats(self) -> dict:
+        """Model chain, prompt budget, history cache and source cutoff counters"""
+        return {
+            "hedging": self.hedger.stats.as_dict(),
+            "prompt_budget": self.budgeter.stats(),
+            "history": self.memory.stats(),
+            "source_cutoff": self.cutoff.stats(),
+        }
+
     def handle_error(self, error: Optional[str]) -> str:
         """Generate user-friendly error message"""
         if not error:
             return "Извините, удаленная модель недоступна. Пожалуйста, проверьте ваш API ключ и попробуйте снова."
 
-        if "429" in error or "Too Many Requests" in error:
+        if "circuit open" in error.lower():
+            return "Модель временно недоступна: OpenRouter в последнее время возвращает ошибки. Пожалуйста, попробуйте позже."
+        elif "429" in error or "Too Many Requests" in error:
             return "OpenRouter API вернул ошибку 429: слишком много запросов. Это может быть из-за лимита free модели или превышения rate limit. Пожалуйста, попробуйте позже."
         elif "401" in error or "Unauthorized" in error or "authentication" in error.lower():
             return "Ошибка аутентификации OpenRouter: ваш API ключ недействителен или истек. Проверьте настройки."
@@ -101,12 +179,12 @@ class ChatService(IChatService):
 
     async def process_chat(self, request: ChatRequest) -> ChatResponse:
         """Process chat request end-to-end"""
-        print("\n" + "="*80)
-        print(f"🔄 PROCESSING NEW REQUEST (RAG={request.use_rag})")
-        print("="*80)
+        # Stages are timed into the request's timings (bound by the HTTP middleware)
+        timings = current_timings() or bind_timings()
 
         # 1. Extract message
-        query = self.extract_user_message(request.messages)
+        with span("extract_user_message", messages=len(request.messages)):
+            query = self.extract_user_message(request.messages)
         if not query:
             return ChatResponse(
                 reply="No user message found",
@@ -114,47 +192,115 @@ class ChatService(IChatService):
                 remote_error="Invalid request"
             )
 
-        print(f"📝 Chat query: {query}\n   model={request.remote_model}, use_rag={request.use_rag}")
+        logger.info(
+            "Chat request",
+            extra={"model": request.remote_model, "use_rag": request.use_rag, "query_chars": len(query)},
+        )
+        if log_bodies():
+            logger.info("Chat query: %s", query)
+
+        # 2. Recent turns verbatim, older turns folded into a cached summary
+        with timed("history"):
+            windowed = await self.memory.window(
+                request.messages,
+                conversation_id=request.conversation_id,
+                api_key=request.api_key,
+                model=request.remote_model,
+            )
+        history = windowed.as_messages()
+        if history:
+            logger.debug(
+                "History windowed",
+                extra={
+                    "recent_messages": len(windowed.recent),
+                    "folded_messages": windowed.folded_messages,
+                    "summarized_messages": windowed.summarized_messages,
+                },
+            )
 
-        # 2. Search sources (only if RAG enabled)
+        # 3. Search sources (only if RAG enabled)
         sources = []
         sources_text = ""
         if request.use_rag:
-            sources = self.search_sources(query)
-            sources_text = self.format_sources(sources)
-            # Log retrieved sources
-            print(f"\n📚 RAG RETRIEVED {len(sources)} SOURCES:")
-            for i, source in enumerate(sources, 1):
-                score = source.get('score', 'N/A')
-                sura = source.get('sura', 'N/A')
-                verse = source.get('verse', 'N/A')
-                text = source.get('text', '')[:80]
-                print(f"  {i}. [Score: {score:.3f}] Сура {sura}:{verse} - {text}...")
-
-        # 3. Build prompt
-        system_prompt, user_prompt = self.build_prompt(query, sources_text)
-        full_prompt = f"[SYSTEM]\n{system_prompt}\n\n[USER]\n{user_prompt}"
-
-        # 4. Generate response via LLM
-        reply, used_remote, error = await self.generate_response(
-            query=query,
-            sources=sources_text,
-            api_key=request.api_key,
-            model=request.remote_model,
-            max_tokens=request.max_tokens,
-            temperature=request.temperature
-        )
+            # Dense and lexical retrieval are CPU-bound: keep them off the event loop
+            # Wall time of the search, including the wait for a free thread
+            with timed("retrieval"):
+                retrieved = await run_queued(
+                    "retrieval",
+                    self.search_sources,
+                    query,
+                    self.cutoff.max_depth,
+                    self.to_search_filter(request.source_filter),
+                )
+            with timed("prompt_build"):
+                # Weak matches cost prompt tokens without grounding the answer
+                cutoff = self.cutoff.apply(retrieved)
+                sources = cutoff.sources
+                if cutoff.used < cutoff.retrieved:
+                    logger.info(
+                        "Weak sources left out",
+                        extra={
+                            "retrieved": cutoff.retrieved,
+                            "below_threshold": cutoff.below_threshold,
+                            "after_drop_off": cutoff.after_drop_off,
+                        },
+                    )
+                # Fit sources into the prompt budget of the most constrained model in the chain
+                system_prompt, _ = self.build_prompt(query, "")
+                budget = self.budgeter.fit(
+                    system_prompt,
+                    query,
+                    sources,
+                    self.model_chain(request.remote_model, request.fallback_models),
+                    request.max_tokens,
+                    history=history,
+                )
+                if budget.dropped_sources or budget.truncated_sources or budget.dropped_history:
+                    logger.info(
+                        "Sources trimmed to prompt budget",
+                        extra={
+                            "budget_tokens": budget.budget,
+                            "dropped_sources": budget.dropped_sources,
+                            "truncated_sources": budget.truncated_sources,
+                            "dropped_history": budget.dropped_history,
+                            "tokens_saved": budget.tokens_saved,
+                        },
+                    )
+                sources = budget.sources
+                history = budget.history
+                sources_text = self.format_sources(sources)
+            logger.info(
+                "RAG retrieved sources",
+                extra={"sources": [f"{r.get('sura')}:{r.get('verse')}@{r.get('score', 0):.3f}" for r in sources]},
+            )
+
+        # 4. Generate response via LLM (the client builds the prompt)
+        with timed("llm"):
+            reply, used_remote, error = await self.generate_response(
+                query=query,
+                sources=sources_text,
+                api_key=request.api_key,
+                model=request.remote_model,
+                max_tokens=request.max_tokens,
+                temperature=request.temperature,
+                fallback_models=request.fallback_models,
+                history=history,
+            )
 
         # 5. Handle errors if needed
         if not reply:
             reply = self.handle_error(error)
 
-        print("="*80)
-        print(f"✅ REQUEST COMPLETED")
-        print("="*80 + "\n")
+        stage_ms = timings.as_dict()
+        logger.info(
+            "Chat request completed",
+            extra={"used_remote": used_remote, "sources_used": len(sources), "timings_ms": stage_ms},
+        )
 
         return ChatResponse(
             reply=reply,
             used_remote=used_remote,
-            remote_error=error
+            remote_error=error,
+            sources_used=len(sources),
+            timings=stage_ms if request.debug or self.debug_timings else None,
         )
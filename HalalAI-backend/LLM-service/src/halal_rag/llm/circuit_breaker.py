@@ -0,0 +1,197 @@
+"""Per-model circuit breakers for upstream LLM calls"""
+
+from __future__ import annotations
+
+import os
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Callable
+
+import httpx
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a model whose breaker is open"""
+
+    def __init__(self, model: str, retry_in: float):
+        super().__init__(f"Circuit open for model {model}, retry in {retry_in:.1f}s")
+        self.model = model
+        self.retry_in = retry_in
+
+
+def counts_as_failure(exc: BaseException) -> bool:
+    """Upstream-side failures trip the breaker; caller errors (401, 400, ...) do not"""
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status >= 500 or status in (408, 429)
+    return isinstance(exc, (httpx.TransportError, httpx.TimeoutException))
+
+
+@dataclass(frozen=True)
+class BreakerSettings:
+    """Thresholds of a breaker.
+
+    A call is a failure when it raises an upstream error or takes longer than
+    `slow_call_seconds`. The breaker opens once at least `min_calls` calls in
+    the last `window_seconds` have a failure rate of `failure_rate_threshold`,
+    stays open for `open_seconds`, then lets `half_open_probes` calls through.
+    A probe that neither finishes nor is released within `probe_timeout_seconds`
+    frees its slot, so a lost probe cannot hold the breaker half-open.
+    A registry keeps breakers for at most `max_models` models.
+    """
+
+    window_seconds: float = 60.0
+    min_calls: int = 10
+    failure_rate_threshold: float = 0.5
+    slow_call_seconds: float = 30.0
+    open_seconds: float = 30.0
+    half_open_probes: int = 1
+    probe_timeout_seconds: float = 60.0
+    max_models: int = 100
+
+    @classmethod
+    def from_env(cls) -> BreakerSettings:
+        """Read LLM_BREAKER_* overrides from the environment"""
+        return cls(
+            window_seconds=float(os.getenv("LLM_BREAKER_WINDOW", cls.window_seconds)),
+            min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", cls.min_calls)),
+            failure_rate_threshold=float(os.getenv("LLM_BREAKER_FAILURE_RATE", cls.failure_rate_threshold)),
+            slow_call_seconds=float(os.getenv("LLM_BREAKER_SLOW_CALL", cls.slow_call_seconds)),
+            open_seconds=float(os.getenv("LLM_BREAKER_OPEN_SECONDS", cls.open_seconds)),
+            half_open_probes=int(os.getenv("LLM_BREAKER_HALF_OPEN_PROBES", cls.half_open_probes)),
+            probe_timeout_seconds=float(os.getenv("LLM_BREAKER_PROBE_TIMEOUT", cls.probe_timeout_seconds)),
+            max_models=int(os.getenv("LLM_BREAKER_MAX_MODELS", cls.max_models)),
+        )
+
+
+class CircuitBreaker:
+    """Closed -> open -> half-open state machine over a rolling time window"""
+
+    def __init__(self, name: str, settings: BreakerSettings, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.settings = settings
+        self._clock = clock
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_started = 0.0
+        self._calls: deque = deque()  # (timestamp, failed)
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.settings.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+        return self._state
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may go through now"""
+        state = self.state
+        if state == OPEN:
+            self.rejected += 1
+            raise CircuitOpenError(self.name, self.settings.open_seconds - (self._clock() - self._opened_at))
+        if state == HALF_OPEN:
+            now = self._clock()
+            if self._probes_in_flight >= self.settings.half_open_probes:
+                if now - self._probe_started < self.settings.probe_timeout_seconds:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, self.settings.probe_timeout_seconds - (now - self._probe_started))
+                # Probes that never reported back are treated as lost
+                self._probes_in_flight = 0
+            self._probes_in_flight += 1
+            self._probe_started = now
+
+    def release(self) -> None:
+        """Give back the slot of a call that ended without an outcome (cancelled)"""
+        if self._state == HALF_OPEN:
+            self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+
+    def record(self, latency: float, failed: bool) -> None:
+        failed = failed or latency > self.settings.slow_call_seconds
+        now = self._clock()
+
+        if self._state == HALF_OPEN:
+            self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+            if failed:
+                self._open(now)
+            else:
+                self._state = CLOSED
+                self._calls.clear()
+            return
+
+        self._calls.append((now, failed))
+        self._trim(now)
+        if self._state == CLOSED and len(self._calls) >= self.settings.min_calls:
+            if self.failure_rate() >= self.settings.failure_rate_threshold:
+                self._open(now)
+
+    def failure_rate(self) -> float:
+        self._trim(self._clock())
+        if not self._calls:
+            return 0.0
+        return sum(1 for _, failed in self._calls if failed) / len(self._calls)
+
+    def _open(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self._calls.clear()
+        self.times_opened += 1
+
+    def _trim(self, now: float) -> None:
+        horizon = now - self.settings.window_seconds
+        while self._calls and self._calls[0][0] < horizon:
+            self._calls.popleft()
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "state": self.state,
+            "calls_in_window": len(self._calls),
+            "failure_rate": round(self.failure_rate(), 4),
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class CircuitBreakerRegistry:
+    """Lazily creates one breaker per model.
+
+    Model names come from requests, so at most `settings.max_models` breakers
+    are kept. The least recently used closed breaker is evicted first: it
+    holds nothing but recent call outcomes. Open and half-open breakers go
+    only when every breaker is tripped.
+    """
+
+    def __init__(self, settings: BreakerSettings | None = None, clock: Callable[[], float] = time.monotonic):
+        self.settings = settings or BreakerSettings.from_env()
+        self._clock = clock
+        self._breakers: OrderedDict[str, CircuitBreaker] = OrderedDict()
+        self.evicted = 0
+
+    def get(self, model: str) -> CircuitBreaker:
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            breaker = self._breakers[model] = CircuitBreaker(model, self.settings, self._clock)
+            while len(self._breakers) > self.settings.max_models:
+                self._evict(keep=model)
+        else:
+            self._breakers.move_to_end(model)
+        return breaker
+
+    def _evict(self, keep: str) -> None:
+        candidates = [name for name in self._breakers if name != keep]
+        closed = [name for name in candidates if self._breakers[name].state == CLOSED]
+        del self._breakers[(closed or candidates)[0]]
+        self.evicted += 1
+
+    def states(self) -> dict[str, str]:
+        return {model: breaker.state for model, breaker in self._breakers.items()}
+
+    def stats(self) -> dict[str, Any]:
+        return {model: breaker.snapshot() for model, breaker in self._breakers.items()}
@@ -0,0 +1,179 @@
+"""Hedged requests over an ordered chain of models"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class LatencyTracker:
+    """Rolling window of call latencies per model.
+
+    Calls that lost a hedge or failed are recorded with the time they ran:
+    a lower bound of their latency, which keeps slow models from looking
+    faster than they are. Model names come from requests, so at most
+    `max_models` windows are kept, least recently used first out.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20, max_models: int = 100):
+        self.window = window
+        self.min_samples = min_samples
+        self.max_models = max_models
+        self._samples: OrderedDict[str, deque] = OrderedDict()
+
+    def record(self, model: str, seconds: float) -> None:
+        samples = self._samples.get(model)
+        if samples is None:
+            samples = self._samples[model] = deque(maxlen=self.window)
+            while len(self._samples) > self.max_models:
+                self._samples.popitem(last=False)
+        else:
+            self._samples.move_to_end(model)
+        samples.append(seconds)
+
+    def quantile(self, model: str, q: float) -> Optional[float]:
+        """q-quantile of the window, None until `min_samples` are collected"""
+        samples = self._samples.get(model)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class HedgeStats:
+    """Per-model launch/win counters and the share of hedged requests.
+
+    At most `max_models` models are counted, least recently used first out.
+    """
+
+    def __init__(self, max_models: int = 100):
+        self.requests = 0
+        self.hedged_requests = 0
+        self.max_models = max_models
+        self.models: OrderedDict[str, dict[str, int]] = OrderedDict()
+        self.evicted = 0
+
+    def counters(self, model: str) -> dict[str, int]:
+        counts = self.models.get(model)
+        if counts is None:
+            counts = self.models[model] = {"launched": 0, "hedges": 0, "fallbacks": 0, "wins": 0, "failures": 0}
+            while len(self.models) > self.max_models:
+                self.models.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.models.move_to_end(model)
+        return counts
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "hedged_requests": self.hedged_requests,
+            "hedge_rate": round(self.hedged_requests / self.requests, 4) if self.requests else 0.0,
+            "evicted": self.evicted,
+            "models": {
+                model: dict(counts, win_rate=round(counts["wins"] / counts["launched"], 4) if counts["launched"] else 0.0)
+                for model, counts in self.models.items()
+            },
+        }
+
+
+class HedgedExecutor:
+    """Runs a call against an ordered chain of models.
+
+    The primary model is called first. If it has not answered within the hedge
+    delay (the observed p90 latency of that model) the next model is started in
+    parallel; if a model fails, the next one is started immediately. Until a
+    model has `min_samples` latencies it is hedged after `default_delay`, or
+    not at all when that is None, so cold starts do not pay for a second call. The first success wins and the remaining
+    calls are cancelled. With `hedging=False` the chain is a plain sequential
+    fallback.
+    """
+
+    def __init__(
+        self,
+        latency: Optional[LatencyTracker] = None,
+        hedging: bool = True,
+        default_delay: Optional[float] = None,
+        quantile: float = 0.9,
+        min_delay: float = 0.2,
+        max_delay: float = 30.0,
+        max_models: int = 100,
+    ):
+        self.latency = latency or LatencyTracker(max_models=max_models)
+        self.hedging = hedging
+        self.default_delay = default_delay
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.stats = HedgeStats(max_models=max_models)
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """Seconds to wait before hedging `model`, None to wait for it without hedging"""
+        observed = self.latency.quantile(model, self.quantile)
+        if observed is None:
+            return self.default_delay
+        return min(max(observed, self.min_delay), self.max_delay)
+
+    async def run(self, models: list[str], call: Callable[[str], Awaitable[T]]) -> tuple[T, str]:
+        """Return the first successful result and the model that produced it"""
+        if not models:
+            raise ValueError("At least one model is required")
+
+        self.stats.requests += 1
+        pending: dict[asyncio.Task, tuple[str, float]] = {}
+        next_index = 0
+        hedged = False
+        last_error: Optional[BaseException] = None
+
+        def launch(kind: str) -> str:
+            nonlocal next_index
+            model = models[next_index]
+            next_index += 1
+            counters = self.stats.counters(model)
+            counters["launched"] += 1
+            if kind:
+                counters[kind] += 1
+            pending[asyncio.ensure_future(call(model))] = (model, time.monotonic())
+            return model
+
+        current = launch("")
+        try:
+            while pending:
+                can_hedge = self.hedging and next_index < len(models)
+                timeout = self.hedge_delay(current) if can_hedge else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Hedge timer fired: start the next model alongside the running ones
+                    if not hedged:
+                        hedged = True
+                        self.stats.hedged_requests += 1
+                    current = launch("hedges")
+                    continue
+
+                for task in done:
+                    model, started = pending.pop(task)
+                    if task.exception() is None:
+                        self.latency.record(model, time.monotonic() - started)
+                        self.stats.counters(model)["wins"] += 1
+                        return task.result(), model
+                    self.latency.record(model, time.monotonic() - started)
+                    self.stats.counters(model)["failures"] += 1
+                    last_error = task.exception()
+
+                if not pending and next_index < len(models):
+                    current = launch("fallbacks")
+        finally:
+            now = time.monotonic()
+            for task, (model, started) in pending.items():
+                task.cancel()
+                # Losers ran at least this long: without them the p90 drifts down
+                self.latency.record(model, now - started)
+
+        assert last_error is not None
+        raise last_error
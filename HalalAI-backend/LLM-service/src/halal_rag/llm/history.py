@@ -0,0 +1,259 @@
+"""Windowed conversation history with a cached rolling summary"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from halal_rag.observability.metrics import cache_lookup
+from halal_rag.observability.tracing import span
+
+from .interfaces import IHistorySummarizer, ILLMClient
+
+logger = logging.getLogger(__name__)
+
+DIALOG_ROLES = ("user", "assistant")
+SUMMARY_PREFIX = "Краткое содержание предыдущей части диалога:"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s")
+
+SUMMARY_SYSTEM_PROMPT = """
+            Ты сжимаешь историю диалога с HalalAI.
+            Обнови краткое содержание, добавив новые реплики.
+            Сохрани вопросы пользователя, упомянутые суры и аяты и выводы ответов.
+            Пиши кратко, на русском языке, не более 10 предложений.
+            """
+
+
+def _fingerprint(messages: list[dict[str, str]]) -> str:
+    digest = hashlib.sha1()
+    for message in messages:
+        digest.update(message.get("role", "").encode())
+        digest.update(b"\0")
+        digest.update(message.get("content", "").encode())
+        digest.update(b"\1")
+    return digest.hexdigest()
+
+
+def _render(messages: list[dict[str, str]]) -> str:
+    names = {"user": "Пользователь", "assistant": "HalalAI"}
+    return "\n".join(f"{names.get(m['role'], m['role'])}: {m.get('content', '').strip()}" for m in messages)
+
+
+class ExtractiveSummarizer(IHistorySummarizer):
+    """Keeps the first sentence of every folded turn; no upstream call"""
+
+    def __init__(self, max_chars: int = 1500, sentence_chars: int = 200):
+        self.max_chars = max_chars
+        self.sentence_chars = sentence_chars
+
+    def _first_sentence(self, text: str) -> str:
+        text = " ".join(text.split())
+        sentence = _SENTENCE_END.split(text, maxsplit=1)[0]
+        if len(sentence) > self.sentence_chars:
+            sentence = sentence[: self.sentence_chars - 1].rstrip() + "…"
+        return sentence
+
+    async def summarize(
+        self,
+        previous_summary: str,
+        messages: list[dict[str, str]],
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+    ) -> str:
+        lines = [previous_summary] if previous_summary else []
+        lines.extend(
+            _render([dict(m, content=self._first_sentence(m.get("content", "")))]) for m in messages
+        )
+        summary = "\n".join(lines)
+        # Oldest lines go first once the summary outgrows its budget
+        if len(summary) > self.max_chars:
+            summary = "…" + summary[-(self.max_chars - 1):]
+        return summary
+
+
+class LLMSummarizer(IHistorySummarizer):
+    """Asks the upstream model to fold new turns into the summary.
+
+    Falls back to the extractive summary when the call fails, so a broken
+    summarizer never fails the chat request itself.
+    """
+
+    def __init__(self, llm_client: ILLMClient, max_tokens: int = 300, fallback: Optional[IHistorySummarizer] = None):
+        self.llm_client = llm_client
+        self.max_tokens = max_tokens
+        self.fallback = fallback or ExtractiveSummarizer()
+
+    async def summarize(
+        self,
+        previous_summary: str,
+        messages: list[dict[str, str]],
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+    ) -> str:
+        query = f"Текущее краткое содержание:\n{previous_summary or '(пусто)'}\n\nНовые реплики:\n{_render(messages)}"
+        try:
+            summary = await self.llm_client.generate(
+                query=query,
+                sources="",
+                api_key=api_key,
+                system_prompt=SUMMARY_SYSTEM_PROMPT,
+                max_tokens=self.max_tokens,
+                temperature=0.2,
+                model=model,
+            )
+            if summary and summary.strip():
+                return summary.strip()
+        except Exception as e:
+            logger.warning("History summarization failed, using extractive summary: %s", e)
+        return await self.fallback.summarize(previous_summary, messages)
+
+
+@dataclass
+class _SummaryEntry:
+    summary: str
+    folded: int
+    fingerprint: str
+    touched: float
+
+
+@dataclass
+class WindowedHistory:
+    """Prompt-ready history: rolling summary of old turns plus recent turns verbatim"""
+
+    summary: str
+    recent: list[dict[str, str]]
+    folded_messages: int = 0
+    summarized_messages: int = 0
+
+    def as_messages(self) -> list[dict[str, str]]:
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": f"{SUMMARY_PREFIX}\n{self.summary}"})
+        messages.extend(self.recent)
+        return messages
+
+
+class ConversationMemory:
+    """Keeps the last `keep_turns` turns verbatim and folds older turns into a summary.
+
+    Summaries are cached per conversation id (LRU with TTL) together with the
+    number of folded messages and a fingerprint of them. On the next turn only
+    the messages that slid out of the window since then are summarized; if the
+    client rewrote the earlier history the fingerprint no longer matches and
+    the summary is rebuilt.
+    """
+
+    def __init__(
+        self,
+        summarizer: Optional[IHistorySummarizer] = None,
+        keep_turns: int = 3,
+        cache_size: int = 1024,
+        ttl_seconds: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.summarizer = summarizer or ExtractiveSummarizer()
+        self.keep_turns = keep_turns
+        self.cache_size = cache_size
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._cache: OrderedDict[str, _SummaryEntry] = OrderedDict()
+
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.messages_summarized = 0
+
+    @classmethod
+    def from_env(cls, llm_client: Optional[ILLMClient] = None) -> ConversationMemory:
+        """LLM_HISTORY_* settings; LLM_HISTORY_SUMMARIZER=llm uses the upstream model"""
+        max_chars = int(os.getenv("LLM_HISTORY_SUMMARY_CHARS", "1500"))
+        summarizer: IHistorySummarizer = ExtractiveSummarizer(max_chars=max_chars)
+        if os.getenv("LLM_HISTORY_SUMMARIZER", "extractive").strip().lower() == "llm" and llm_client is not None:
+            summarizer = LLMSummarizer(llm_client, fallback=summarizer)
+        return cls(
+            summarizer=summarizer,
+            keep_turns=int(os.getenv("LLM_HISTORY_TURNS", "3")),
+            cache_size=int(os.getenv("LLM_HISTORY_CACHE_SIZE", "1024")),
+            ttl_seconds=float(os.getenv("LLM_HISTORY_CACHE_TTL", "3600")),
+        )
+
+    def split(self, messages: list[dict[str, str]]) -> tuple[list[dict[str, str]], list[dict[str, str]]]:
+        """Dialog turns before the last user message -> (older, recent)"""
+        last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+        dialog = [
+            {"role": m["role"], "content": m.get("content", "")}
+            for m in messages[: max(last_user, 0)]
+            if m.get("role") in DIALOG_ROLES and m.get("content", "").strip()
+        ]
+        keep = max(self.keep_turns, 0) * 2
+        if len(dialog) <= keep:
+            return [], dialog
+        cut = len(dialog) - keep
+        return dialog[:cut], dialog[cut:]
+
+    def _cached(self, conversation_id: str, older: list[dict[str, str]]) -> Optional[_SummaryEntry]:
+        entry = self._cache.get(conversation_id)
+        if entry is None:
+            return None
+        now = self._clock()
+        if now - entry.touched > self.ttl_seconds:
+            del self._cache[conversation_id]
+            return None
+        if entry.folded > len(older) or _fingerprint(older[: entry.folded]) != entry.fingerprint:
+            return None
+        self._cache.move_to_end(conversation_id)
+        return entry
+
+    async def window(
+        self,
+        messages: list[dict[str, str]],
+        conversation_id: Optional[str] = None,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+    ) -> WindowedHistory:
+        older, recent = self.split(messages)
+        if not older:
+            return WindowedHistory(summary="", recent=recent)
+
+        with span("cache_lookup", cache="history_summary") as lookup:
+            entry = self._cached(conversation_id, older) if conversation_id else None
+            if lookup is not None:
+                lookup.set_attribute("hit", entry is not None)
+        if entry is not None:
+            self.cache_hits += 1
+            summary, delta = entry.summary, older[entry.folded:]
+        else:
+            self.cache_misses += 1
+            summary, delta = "", older
+        cache_lookup("history_summary", entry is not None)
+
+        if delta:
+            summary = await self.summarizer.summarize(summary, delta, api_key=api_key, model=model)
+            self.messages_summarized += len(delta)
+
+        if conversation_id:
+            self._cache[conversation_id] = _SummaryEntry(summary, len(older), _fingerprint(older), self._clock())
+            self._cache.move_to_end(conversation_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return WindowedHistory(
+            summary=summary,
+            recent=recent,
+            folded_messages=len(older),
+            summarized_messages=len(delta),
+        )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "conversations_cached": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "messages_summarized": self.messages_summarized,
+        }
@@ -0,0 +1,169 @@
+"""Tuned HTTP connection pool for upstream LLM providers"""
+
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# httpx keeps its httpcore pool in private attributes (`_transport._pool`);
+# they are read only on the releases this was checked against
+POOL_INTROSPECTION_VERSIONS = ((0, 24), (1, 0))
+
+
+def pool_introspection_supported(version: str = httpx.__version__) -> bool:
+    try:
+        major_minor = tuple(int(part) for part in version.split(".")[:2])
+    except ValueError:
+        return False
+    low, high = POOL_INTROSPECTION_VERSIONS
+    return low <= major_minor < high
+
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package (httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+@dataclass(frozen=True)
+class HttpPoolSettings:
+    """Pool size, keep-alive and timeouts of the upstream HTTP client.
+
+    `total_timeout` bounds a whole completion call (including retries), while
+    the connect/read/write/pool timeouts apply to every single HTTP exchange.
+    """
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = True
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    write_timeout: float = 10.0
+    pool_timeout: float = 5.0
+    total_timeout: float = 90.0
+
+    @classmethod
+    def from_env(cls) -> HttpPoolSettings:
+        """Read OPENROUTER_* overrides from the environment"""
+        return cls(
+            max_connections=_env_int("OPENROUTER_MAX_CONNECTIONS", cls.max_connections),
+            max_keepalive_connections=_env_int("OPENROUTER_MAX_KEEPALIVE", cls.max_keepalive_connections),
+            keepalive_expiry=_env_float("OPENROUTER_KEEPALIVE_EXPIRY", cls.keepalive_expiry),
+            http2=_env_bool("OPENROUTER_HTTP2", cls.http2),
+            connect_timeout=_env_float("OPENROUTER_CONNECT_TIMEOUT", cls.connect_timeout),
+            read_timeout=_env_float("OPENROUTER_READ_TIMEOUT", cls.read_timeout),
+            write_timeout=_env_float("OPENROUTER_WRITE_TIMEOUT", cls.write_timeout),
+            pool_timeout=_env_float("OPENROUTER_POOL_TIMEOUT", cls.pool_timeout),
+            total_timeout=_env_float("OPENROUTER_TOTAL_TIMEOUT", cls.total_timeout),
+        )
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout,
+        )
+
+
+def create_http_client(
+    base_url: str,
+    settings: HttpPoolSettings,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> httpx.AsyncClient:
+    """Build the application-wide AsyncClient for an upstream provider"""
+    use_http2 = settings.http2 and http2_available()
+    if settings.http2 and not use_http2:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed, falling back to HTTP/1.1")
+
+    return httpx.AsyncClient(
+        base_url=base_url,
+        limits=settings.limits,
+        timeout=settings.timeout,
+        http2=use_http2,
+        transport=transport,
+    )
+
+
+class PoolMonitor:
+    """Tracks utilization of an AsyncClient connection pool"""
+
+    def __init__(self, client: httpx.AsyncClient, settings: HttpPoolSettings):
+        self._client = client
+        self._settings = settings
+        self.http2 = settings.http2 and http2_available()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests_total = 0
+
+    def __enter__(self) -> PoolMonitor:
+        self.in_flight += 1
+        self.requests_total += 1
+        if self.in_flight > self.peak_in_flight:
+            self.peak_in_flight = self.in_flight
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.in_flight -= 1
+
+    def _connections(self) -> Optional[list[Any]]:
+        """Connections of the httpcore pool, None when they cannot be read safely"""
+        if not pool_introspection_supported():
+            return None
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        return list(connections) if isinstance(connections, (list, tuple)) else None
+
+    def stats(self) -> dict[str, Any]:
+        connections = self._connections()
+        idle = None
+        if connections is not None:
+            idle = sum(1 for c in connections if getattr(c, "is_idle", lambda: False)())
+        return {
+            "max_connections": self._settings.max_connections,
+            "max_keepalive_connections": self._settings.max_keepalive_connections,
+            "http2": self.http2,
+            "open_connections": len(connections) if connections is not None else None,
+            "idle_connections": idle,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "requests_total": self.requests_total,
+            "utilization": round(self.in_flight / max(self._settings.max_connections, 1), 4),
+        }
@@ -1,5 +1,6 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
+from typing import Any
 
 
 class ILLMClient(ABC):
@@ -10,10 +11,39 @@ class ILLMClient(ABC):
         self,
         query: str,
         sources: str,
+        api_key: str | None = None,
         system_prompt: str | None = None,
         max_tokens: int = 1000,
         temperature: float = 0.7,
-        model: str | None = None
+        model: str | None = None,
+        history: list[dict[str, str]] | None = None,
     ) -> str:
-        """Generate response using LLM"""
+        """Generate response using LLM; `history` goes between the system prompt and the question"""
+        ...
+
+    def stats(self) -> dict[str, Any]:
+        """Runtime statistics of the client (pool, retries, ...)"""
+        return {}
+
+    def usage_stats(self) -> dict[str, Any]:
+        """Usage and latency aggregates per model and per API key"""
+        return {}
+
+    async def close(self) -> None:
+        """Release network resources"""
+        return None
+
+
+class IHistorySummarizer(ABC):
+    """Interface for folding old dialog turns into a running summary"""
+
+    @abstractmethod
+    async def summarize(
+        self,
+        previous_summary: str,
+        messages: list[dict[str, str]],
+        api_key: str | None = None,
+        model: str | None = None,
+    ) -> str:
+        """Return `previous_summary` extended with `messages`"""
         ...
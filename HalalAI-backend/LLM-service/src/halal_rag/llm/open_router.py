@@ -1,32 +1,60 @@
 
+import asyncio
+import os
+import time
 import httpx
 import logging
-from typing import Optional
+from typing import Any, Optional
+from .circuit_breaker import CircuitBreakerRegistry, CircuitOpenError, counts_as_failure
+from .http_pool import HttpPoolSettings, PoolMonitor, create_http_client
+from .retry import RetryPolicy, RetryStats, call_with_retry
 from .interfaces import ILLMClient
+from .usage import UsageTracker, error_class
+from halal_rag.observability.logs import log_bodies
+from halal_rag.observability.tracing import TRACEPARENT_HEADER, current_traceparent, span
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
+# Set on the request by a response hook once the status line and headers arrive
+HEADERS_AT = "halal_rag.headers_at"
+
 
 class OpenRouterClient(ILLMClient):
 
     def __init__(
         self,
         model: str = "openrouter/auto",
-        base_url: str = "https://openrouter.ai/api/v1"
+        base_url: Optional[str] = None,
+        settings: Optional[HttpPoolSettings] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        breakers: Optional[CircuitBreakerRegistry] = None,
+        usage: Optional[UsageTracker] = None,
     ):
         self.model = model
-        self.base_url = base_url
-        self.client = httpx.AsyncClient(base_url=self.base_url)
+        self.base_url = base_url or os.getenv("OPENROUTER_BASE_URL", DEFAULT_BASE_URL)
+        self.settings = settings or HttpPoolSettings.from_env()
+        # One pooled client per process, shared by every request
+        self.client = create_http_client(self.base_url, self.settings, transport=transport)
+        self.pool = PoolMonitor(self.client, self.settings)
+        self.retry_policy = retry_policy or RetryPolicy.from_env()
+        self.retry_stats = RetryStats()
+        # One breaker per remote model: a model that is down fails fast
+        self.breakers = breakers or CircuitBreakerRegistry()
+        self.usage = usage or UsageTracker.from_env()
+        self.client.event_hooks["response"].append(self._mark_headers)
 
     async def generate(
         self,
         query: str,
         sources: str,
-        api_key: str,
+        api_key: Optional[str] = None,
         system_prompt: Optional[str] = None,
         max_tokens: int = 1000,
         temperature: float = 0.7,
-        model: Optional[str] = None
+        model: Optional[str] = None,
+        history: Optional[list[dict[str, str]]] = None,
     ) -> str:
         if not system_prompt:
             system_prompt = """
@@ -48,61 +76,160 @@ class OpenRouterClient(ILLMClient):
 
         try:
             effective_model = model if model else self.model
-            print(f"🤖 Используем llm-модель: {effective_model}")
-
-            print(f"=== SYSTEM PROMPT ===\n{system_prompt}")
-            print(f"=== USER PROMPT ===\n{prompt}")
-
-            response = await self.client.post(
-                "/chat/completions",
-                json={
-                    "model": effective_model,
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": system_prompt
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    "temperature": temperature,
-                    "max_tokens": max_tokens,
-                },
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "HTTP-Referer": "https://halalai.app",
-                    "X-Title": "HalalAI"
-                }
+            logger.debug(
+                "OpenRouter request",
+                extra={"model": effective_model, "history_messages": len(history or []), "prompt_chars": len(prompt)},
             )
-
-            response.raise_for_status()
+            if log_bodies():
+                logger.info("System prompt: %s", system_prompt, extra={"model": effective_model})
+                logger.info("User prompt: %s", prompt, extra={"model": effective_model})
+
+            # Retries share the request deadline with the first attempt
+            deadline = time.monotonic() + self.settings.total_timeout
+            breaker = self.breakers.get(effective_model)
+
+            timing: dict[str, Optional[float]] = {}
+
+            async def attempt() -> httpx.Response:
+                try:
+                    breaker.before_call()
+                except CircuitOpenError as e:
+                    self.usage.record(effective_model, api_key, error=error_class(e))
+                    raise
+                started = time.monotonic()
+                try:
+                    with self.pool, span("upstream_http", model=effective_model) as http_span:
+                        try:
+                            response = await asyncio.wait_for(self._post_completion(
+                                effective_model, system_prompt, prompt, api_key, max_tokens, temperature, history
+                            ), timeout=max(deadline - time.monotonic(), 0.0))
+                        except asyncio.TimeoutError as e:
+                            raise httpx.TimeoutException(
+                                f"OpenRouter request exceeded total timeout of {self.settings.total_timeout}s"
+                            ) from e
+                        if http_span is not None:
+                            http_span.set_attribute("status_code", response.status_code)
+                    response.raise_for_status()
+                except asyncio.CancelledError:
+                    # Hedge loser or client gone: neither success nor failure, but free a half-open probe
+                    breaker.release()
+                    # The upstream may still bill it
+                    self.usage.record(effective_model, api_key, latency=time.monotonic() - started, error="cancelled")
+                    raise
+                except Exception as e:
+                    latency = time.monotonic() - started
+                    breaker.record(latency, failed=counts_as_failure(e))
+                    self.usage.record(effective_model, api_key, latency=latency, error=error_class(e))
+                    raise
+                timing["latency"] = time.monotonic() - started
+                timing["ttft"] = self._headers_after(response, started)
+                breaker.record(timing["latency"], failed=False)
+                return response
+
+            response = await call_with_retry(attempt, self.retry_policy, deadline, self.retry_stats)
             data = response.json()
 
             try:
                 answer = data["choices"][0]["message"]["content"]
             except (KeyError, IndexError, TypeError) as e:
-                print(f"❌ Unexpected OpenRouter response format: {e}")
+                logger.error("Unexpected OpenRouter response format: %s", e, extra={"model": effective_model})
+                self.usage.record(effective_model, api_key, latency=timing["latency"], error="invalid_response")
                 raise ValueError(f"Invalid OpenRouter response: {e}") from e
 
             usage = data.get("usage") or {}
+            self.usage.record(
+                effective_model,
+                api_key,
+                latency=timing["latency"],
+                ttft=timing["ttft"],
+                usage=usage if isinstance(usage, dict) else None,
+            )
             total_tokens = usage.get("total_tokens", "n/a")
-            print(
-                f"✅ OpenRouter response: "
-                f"{len(answer)} chars, "
-                f"tokens: {total_tokens}"
+            logger.info(
+                "OpenRouter response",
+                extra={
+                    "model": effective_model,
+                    "answer_chars": len(answer),
+                    "total_tokens": total_tokens,
+                    "latency_ms": round(timing["latency"] * 1000, 1),
+                },
             )
-            print(f"=== LLM RESPONSE ===\n{answer}")
+            if log_bodies():
+                logger.info("LLM response: %s", answer, extra={"model": effective_model})
 
             return answer
 
         except httpx.HTTPError as e:
-            print(f"❌ OpenRouter API error: {e}")
+            logger.warning("OpenRouter API error: %s", e, extra={"model": effective_model})
             raise
 
-    async def close(self):
+    async def _post_completion(
+        self,
+        model: str,
+        system_prompt: str,
+        prompt: str,
+        api_key: Optional[str],
+        max_tokens: int,
+        temperature: float,
+        history: Optional[list[dict[str, str]]] = None,
+    ) -> httpx.Response:
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "HTTP-Referer": "https://halalai.app",
+            "X-Title": "HalalAI"
+        }
+        # Continue the request's trace in the upstream call when it is sampled
+        traceparent = current_traceparent()
+        if traceparent:
+            headers[TRACEPARENT_HEADER] = traceparent
+        return await self.client.post(
+            "/chat/completions",
+            json={
+                "model": model,
+                "messages": [
+                    {
+                        "role": "system",
+                        "content": system_prompt
+                    },
+                    *(history or []),
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+            },
+            headers=headers,
+        )
+
+    @staticmethod
+    async def _mark_headers(response: httpx.Response) -> None:
+        response.request.extensions[HEADERS_AT] = time.monotonic()
+
+    @staticmethod
+    def _headers_after(response: httpx.Response, started: float) -> Optional[float]:
+        """Time to response headers: the first-token time of a non-streaming call"""
+        try:
+            headers_at = response.request.extensions.get(HEADERS_AT)
+        except RuntimeError:
+            return None
+        return headers_at - started if isinstance(headers_at, float) else None
+
+    def usage_stats(self) -> dict[str, Any]:
+        """Tokens, latency, time to first token and errors per model and per hashed API key"""
+        return self.usage.snapshot()
+
+    def stats(self) -> dict[str, Any]:
+        """Connection pool, retry counters and circuit breakers of the upstream client"""
+        return {
+            "pool": self.pool.stats(),
+            "retries": self.retry_stats.as_dict(),
+            "circuit_breakers": self.breakers.stats(),
+        }
+
+    async def close(self) -> None:
         try:
             await self.client.aclose()
-        except Exception as e:
+        except Exception:
             pass  # Ignore close errors
@@ -0,0 +1,148 @@
+"""Retry policy for upstream completion calls"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+import httpx
+
+from halal_rag.observability.metrics import RETRIES
+
+T = TypeVar("T")
+
+# 408/425/429 and gateway-side 5xx: the upstream did not produce a completion
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+def parse_retry_after(value: Optional[str], now: Optional[datetime] = None) -> Optional[float]:
+    """Retry-After header as seconds: either delta-seconds or an HTTP-date"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max((when - now).total_seconds(), 0.0)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Exponential backoff with full jitter, honoring Retry-After.
+
+    `max_attempts` counts the first call. A retry is only scheduled when the
+    wait fits into what is left of the request deadline.
+    """
+
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    max_retry_after: float = 30.0
+    retry_statuses: frozenset = RETRYABLE_STATUSES
+
+    @classmethod
+    def from_env(cls) -> RetryPolicy:
+        """Read OPENROUTER_RETRY_* overrides from the environment"""
+        return cls(
+            max_attempts=int(os.getenv("OPENROUTER_RETRY_ATTEMPTS", cls.max_attempts)),
+            base_delay=float(os.getenv("OPENROUTER_RETRY_BASE_DELAY", cls.base_delay)),
+            max_delay=float(os.getenv("OPENROUTER_RETRY_MAX_DELAY", cls.max_delay)),
+            max_retry_after=float(os.getenv("OPENROUTER_RETRY_MAX_RETRY_AFTER", cls.max_retry_after)),
+        )
+
+    def is_retryable(self, exc: BaseException) -> bool:
+        if isinstance(exc, httpx.HTTPStatusError):
+            return exc.response.status_code in self.retry_statuses
+        # Connect/read/pool timeouts, resets, protocol errors
+        return isinstance(exc, (httpx.TransportError, httpx.TimeoutException))
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max_delay, base * 2^(attempt-1))]"""
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0.0, cap)
+
+    def delay_for(self, exc: BaseException, attempt: int) -> Optional[float]:
+        """Seconds to wait before the next attempt, None when the server asks for more than `max_retry_after`"""
+        if isinstance(exc, httpx.HTTPStatusError):
+            retry_after = parse_retry_after(exc.response.headers.get("Retry-After"))
+            if retry_after is not None:
+                # Retrying earlier than asked is just another rejected call
+                return retry_after if retry_after <= self.max_retry_after else None
+        return self.backoff(attempt)
+
+
+class RetryStats:
+    """Counters of attempts and final outcomes"""
+
+    def __init__(self):
+        self.attempts = 0
+        self.retries = 0
+        self.outcomes: Counter = Counter()
+        self.retried_statuses: Counter = Counter()
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "outcomes": dict(self.outcomes),
+            "retried_statuses": {str(k): v for k, v in self.retried_statuses.items()},
+        }
+
+
+async def call_with_retry(
+    func: Callable[[], Awaitable[T]],
+    policy: RetryPolicy,
+    deadline: float,
+    stats: Optional[RetryStats] = None,
+    sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+) -> T:
+    """Run `func` until it succeeds, the policy gives up or `deadline` (monotonic) is near.
+
+    Outcomes: `success` (first attempt), `recovered` (after retries),
+    `non_retryable`, `exhausted` (no attempts left), `budget_exhausted`
+    (the next wait would cross the deadline or exceed `max_retry_after`).
+    """
+    stats = stats or RetryStats()
+    attempt = 0
+    while True:
+        attempt += 1
+        stats.attempts += 1
+        try:
+            result = await func()
+        except Exception as exc:
+            if not policy.is_retryable(exc):
+                stats.outcomes["non_retryable"] += 1
+                raise
+            if attempt >= policy.max_attempts:
+                stats.outcomes["exhausted"] += 1
+                raise
+            delay = policy.delay_for(exc, attempt)
+            if delay is None or delay >= deadline - time.monotonic():
+                stats.outcomes["budget_exhausted"] += 1
+                raise
+            if isinstance(exc, httpx.HTTPStatusError):
+                stats.retried_statuses[exc.response.status_code] += 1
+                RETRIES.labels(f"http_{exc.response.status_code}").inc()
+            else:
+                RETRIES.labels("timeout" if isinstance(exc, httpx.TimeoutException) else "transport").inc()
+            stats.retries += 1
+            await sleep(delay)
+            continue
+
+        stats.outcomes["success" if attempt == 1 else "recovered"] += 1
+        return result
@@ -0,0 +1,216 @@
+"""Prompt token estimation and budgeting before the upstream call"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from halal_rag.rag.metadata import source_label
+
+logger = logging.getLogger(__name__)
+
+_CYRILLIC = re.compile(r"[Ѐ-ӿ]")
+
+# Tokens added by the chat template around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+DEFAULT_CONTEXT_WINDOW = 32768
+
+# Known context windows; anything else uses LLM_DEFAULT_CONTEXT_WINDOW
+CONTEXT_WINDOWS = {
+    "openai/gpt-4o-mini": 128000,
+    "anthropic/claude-3.5-haiku": 200000,
+}
+
+
+def _parse_mapping(value: str) -> dict[str, int]:
+    """'model=tokens,model2=tokens' -> dict"""
+    result = {}
+    for item in value.split(","):
+        if "=" in item:
+            model, tokens = item.rsplit("=", 1)
+            result[model.strip()] = int(tokens)
+    return result
+
+
+class TokenCounter:
+    """Counts prompt tokens.
+
+    With a Hugging Face tokenizer name (LLM_TOKENIZER) the exact count of that
+    tokenizer is used. Otherwise a character-based estimate calibrated for BPE
+    vocabularies: ~3 characters per token for Cyrillic text, ~4 for Latin.
+    """
+
+    def __init__(self, tokenizer_name: Optional[str] = None):
+        self._encode: Optional[Callable[[str], list]] = None
+        name = tokenizer_name or os.getenv("LLM_TOKENIZER")
+        if name:
+            try:
+                from transformers import AutoTokenizer
+
+                tokenizer = AutoTokenizer.from_pretrained(name)
+                self._encode = lambda text: tokenizer.encode(text, add_special_tokens=False)
+            except Exception as e:
+                logger.warning("Tokenizer %s unavailable, using estimate: %s", name, e)
+
+    @property
+    def exact(self) -> bool:
+        return self._encode is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encode is not None:
+            return len(self._encode(text))
+        cyrillic_share = len(_CYRILLIC.findall(text)) / len(text)
+        chars_per_token = 4.0 - cyrillic_share
+        return math.ceil(len(text) / chars_per_token)
+
+
+@dataclass
+class BudgetResult:
+    """Outcome of fitting sources into the prompt budget"""
+
+    sources: list[dict[str, Any]]
+    budget: int
+    prompt_tokens: int
+    original_tokens: int
+    dropped_sources: int = 0
+    truncated_sources: int = 0
+    history: list[dict[str, str]] = field(default_factory=list)
+    dropped_history: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.original_tokens - self.prompt_tokens, 0)
+
+
+class PromptBudgeter:
+    """Trims retrieved sources so the prompt fits a per-model token budget.
+
+    The budget is the model context window minus the requested `max_tokens`
+    and a safety margin, optionally capped by LLM_PROMPT_BUDGET (prompt tokens
+    drive both cost and upstream latency). Sources are kept best-score first;
+    the lowest-scoring ones are dropped and the last one that only partially
+    fits is truncated. When the system prompt, question and history alone
+    exceed the budget, the oldest history messages are dropped first.
+    """
+
+    def __init__(
+        self,
+        counter: Optional[TokenCounter] = None,
+        context_windows: Optional[dict[str, int]] = None,
+        default_context_window: Optional[int] = None,
+        prompt_cap: Optional[int] = None,
+        safety_margin: int = 64,
+        min_truncated_tokens: int = 48,
+    ):
+        self.counter = counter or TokenCounter()
+        self.context_windows = dict(CONTEXT_WINDOWS)
+        self.context_windows.update(context_windows or _parse_mapping(os.getenv("LLM_CONTEXT_WINDOWS", "")))
+        self.default_context_window = default_context_window or int(
+            os.getenv("LLM_DEFAULT_CONTEXT_WINDOW", DEFAULT_CONTEXT_WINDOW)
+        )
+        cap = prompt_cap if prompt_cap is not None else os.getenv("LLM_PROMPT_BUDGET")
+        self.prompt_cap = int(cap) if cap else None
+        self.safety_margin = safety_margin
+        self.min_truncated_tokens = min_truncated_tokens
+
+        self.prompts = 0
+        self.prompt_tokens_total = 0
+        self.tokens_saved_total = 0
+        self.sources_dropped_total = 0
+
+    def budget_for(self, models: list[str], max_tokens: int) -> int:
+        """Prompt budget of the most constrained model in the chain"""
+        window = min(self.context_windows.get(m, self.default_context_window) for m in models)
+        budget = window - max_tokens - self.safety_margin
+        if self.prompt_cap is not None:
+            budget = min(budget, self.prompt_cap)
+        return max(budget, 0)
+
+    @staticmethod
+    def source_text(source: dict[str, Any]) -> str:
+        return f"{source_label(source)}\n{source['text']}"
+
+    def fit(
+        self,
+        system_prompt: str,
+        query: str,
+        sources: list[dict[str, Any]],
+        models: list[str],
+        max_tokens: int,
+        history: Optional[list[dict[str, str]]] = None,
+    ) -> BudgetResult:
+        budget = self.budget_for(models, max_tokens)
+        history = list(history or [])
+        base = self.counter.count(system_prompt) + self.counter.count(query) + 2 * MESSAGE_OVERHEAD_TOKENS
+        history_costs = [self.counter.count(m.get("content", "")) + MESSAGE_OVERHEAD_TOKENS for m in history]
+        fixed = base + sum(history_costs)
+        ranked = sorted(sources, key=lambda s: s.get("score", 0.0), reverse=True)
+        costs = [self.counter.count(self.source_text(s)) + 2 for s in ranked]
+        original = fixed + sum(costs)
+
+        dropped_history = 0
+        while history and fixed > budget:
+            history.pop(0)
+            fixed -= history_costs.pop(0)
+            dropped_history += 1
+
+        kept: list[dict[str, Any]] = []
+        truncated = 0
+        used = fixed
+        for source, cost in zip(ranked, costs):
+            if used + cost <= budget:
+                kept.append(source)
+                used += cost
+                continue
+            head = self._truncate(source, cost, budget - used)
+            if head is not None:
+                kept.append(head[0])
+                used += head[1]
+                truncated += 1
+            break
+
+        result = BudgetResult(
+            sources=kept,
+            budget=budget,
+            prompt_tokens=used,
+            original_tokens=original,
+            dropped_sources=len(ranked) - len(kept),
+            truncated_sources=truncated,
+            history=history,
+            dropped_history=dropped_history,
+        )
+        self.prompts += 1
+        self.prompt_tokens_total += result.prompt_tokens
+        self.tokens_saved_total += result.tokens_saved
+        self.sources_dropped_total += result.dropped_sources
+        return result
+
+    def _truncate(self, source: dict[str, Any], cost: int, remaining: int) -> Optional[tuple[dict[str, Any], int]]:
+        """Head of the passage that fits in `remaining` tokens with its cost, None if too little fits"""
+        if remaining < self.min_truncated_tokens:
+            return None
+        text = source["text"]
+        ratio = 0.95 * remaining / cost
+        # Tokens are proportional to characters only on average: recount, shrink until it fits
+        for _ in range(5):
+            head = dict(source, text=text[: max(int(len(text) * ratio) - 1, 0)].rstrip() + "…")
+            head_cost = self.counter.count(self.source_text(head)) + 2
+            if head_cost <= remaining:
+                return head, head_cost
+            ratio *= 0.95 * remaining / head_cost
+        return None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "exact_tokenizer": self.counter.exact,
+            "prompts": self.prompts,
+            "prompt_tokens_total": self.prompt_tokens_total,
+            "prompt_tokens_saved_total": self.tokens_saved_total,
+            "sources_dropped_total": self.sources_dropped_total,
+        }
@@ -0,0 +1,192 @@
+"""Per-model and per-API-key accounting of upstream usage and latency"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import hashlib
+import os
+from collections import Counter, OrderedDict
+from typing import Any, Optional
+
+import httpx
+
+from halal_rag.observability.metrics import ERRORS
+
+from .circuit_breaker import CircuitOpenError
+
+ANONYMOUS_KEY = "anonymous"
+
+# Latency bucket upper bounds in seconds, roughly x1.5 apart from 10 ms to 2 min
+LATENCY_BUCKETS = (
+    0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.35, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0,
+    4.5, 6.0, 8.0, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0, 90.0, 120.0,
+)
+
+
+def hash_api_key(api_key: Optional[str], salt: Optional[str] = None) -> str:
+    """Stable, non-reversible label of an API key"""
+    if not api_key:
+        return ANONYMOUS_KEY
+    salt = salt if salt is not None else os.getenv("LLM_USAGE_KEY_SALT", "")
+    return "key_" + hashlib.sha256(f"{salt}{api_key}".encode()).hexdigest()[:16]
+
+
+def error_class(exc: BaseException) -> str:
+    """Coarse error label: http_<status>, timeout, transport, circuit_open, ..."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return f"http_{exc.response.status_code}"
+    if isinstance(exc, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(exc, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(exc, httpx.TransportError):
+        return "transport"
+    if isinstance(exc, asyncio.CancelledError):
+        return "cancelled"
+    if isinstance(exc, ValueError):
+        return "invalid_response"
+    return type(exc).__name__
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram: constant memory, approximate quantiles"""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (max for the overflow bucket)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self) -> dict[str, Any]:
+        def ms(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "count": self.count,
+            "avg_ms": ms(self.total / self.count) if self.count else None,
+            "p50_ms": ms(self.quantile(0.5)),
+            "p90_ms": ms(self.quantile(0.9)),
+            "p99_ms": ms(self.quantile(0.99)),
+            "max_ms": ms(self.max) if self.count else None,
+        }
+
+
+class UsageAggregate:
+    """Counters of one model or one API key"""
+
+    def __init__(self):
+        self.calls = 0
+        self.successes = 0
+        self.errors: Counter = Counter()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency = LatencyHistogram()
+        self.ttft = LatencyHistogram()
+
+    def add(
+        self,
+        latency: Optional[float],
+        ttft: Optional[float],
+        usage: Optional[dict[str, Any]],
+        error: Optional[str],
+    ) -> None:
+        self.calls += 1
+        if error:
+            self.errors[error] += 1
+        else:
+            self.successes += 1
+        if latency is not None:
+            self.latency.observe(latency)
+        if ttft is not None:
+            self.ttft.observe(ttft)
+        if usage:
+            self.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+            self.completion_tokens += int(usage.get("completion_tokens") or 0)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "successes": self.successes,
+            "error_rate": round(1 - self.successes / self.calls, 4) if self.calls else 0.0,
+            "errors": dict(self.errors),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "avg_prompt_tokens": round(self.prompt_tokens / self.successes, 1) if self.successes else None,
+            "latency": self.latency.summary(),
+            "ttft": self.ttft.summary(),
+        }
+
+
+class UsageTracker:
+    """Aggregates every upstream call by model and by hashed API key.
+
+    Memory is bounded: histograms have fixed buckets and at most `max_models`
+    models and `max_keys` keys are tracked, least recently used first out.
+    """
+
+    def __init__(self, max_models: int = 100, max_keys: int = 1000):
+        self.max_models = max_models
+        self.max_keys = max_keys
+        self.models: OrderedDict[str, UsageAggregate] = OrderedDict()
+        self.api_keys: OrderedDict[str, UsageAggregate] = OrderedDict()
+        self.evicted = 0
+
+    @classmethod
+    def from_env(cls) -> UsageTracker:
+        return cls(
+            max_models=int(os.getenv("LLM_USAGE_MAX_MODELS", "100")),
+            max_keys=int(os.getenv("LLM_USAGE_MAX_KEYS", "1000")),
+        )
+
+    def _bucket(self, table: OrderedDict, name: str, limit: int) -> UsageAggregate:
+        aggregate = table.get(name)
+        if aggregate is None:
+            aggregate = table[name] = UsageAggregate()
+            while len(table) > limit:
+                table.popitem(last=False)
+                self.evicted += 1
+        else:
+            table.move_to_end(name)
+        return aggregate
+
+    def record(
+        self,
+        model: str,
+        api_key: Optional[str],
+        latency: Optional[float] = None,
+        ttft: Optional[float] = None,
+        usage: Optional[dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        if error:
+            ERRORS.labels("upstream", error).inc()
+        self._bucket(self.models, model, self.max_models).add(latency, ttft, usage, error)
+        self._bucket(self.api_keys, hash_api_key(api_key), self.max_keys).add(latency, ttft, usage, error)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "models": {name: agg.as_dict() for name, agg in self.models.items()},
+            "api_keys": {name: agg.as_dict() for name, agg in self.api_keys.items()},
+            "evicted": self.evicted,
+        }
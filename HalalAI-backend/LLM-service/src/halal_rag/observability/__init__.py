@@ -0,0 +1 @@
+"""Logging, request correlation and runtime diagnostics"""
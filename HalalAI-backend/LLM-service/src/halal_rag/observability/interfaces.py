@@ -0,0 +1,16 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from typing import Any
+
+
+class ISpanExporter(ABC):
+    """Interface for destinations of finished trace spans"""
+
+    @abstractmethod
+    def export(self, spans: list[dict[str, Any]]) -> None:
+        """Hand over the spans of one finished trace; must not block on slow I/O"""
+        ...
+
+    def shutdown(self) -> None:
+        """Flush pending spans and release resources"""
+        return None
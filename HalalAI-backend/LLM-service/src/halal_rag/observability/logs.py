@@ -0,0 +1,169 @@
+"""Non-blocking structured logging with request ids.
+
+Records are put on an in-memory queue by the request path and written to
+stdout by a background `QueueListener` thread, so a slow log sink never
+blocks the event loop. Configure with::
+
+    LOG_LEVEL=INFO            root level
+    LOG_FORMAT=json|text      one JSON object per line (default) or plain text
+    LOG_BODIES=false          log full prompts and LLM responses for every request
+    LOG_BODY_SAMPLE_RATE=0    ...or for this share of requests
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+_bodies_var: ContextVar[Optional[bool]] = ContextVar("log_bodies", default=None)
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+_configured_pid: Optional[int] = None
+
+
+def get_request_id() -> str:
+    return request_id_var.get()
+
+
+def bind_request(request_id: Optional[str] = None) -> str:
+    """Set the request id (a new one if missing or malformed) and decide body sampling for this request"""
+    if not request_id or not _VALID_REQUEST_ID.match(request_id):
+        request_id = uuid.uuid4().hex
+    request_id_var.set(request_id)
+    _bodies_var.set(_sample_bodies())
+    return request_id
+
+
+def _truthy(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _sample_bodies() -> bool:
+    if _truthy(os.getenv("LOG_BODIES", "false")):
+        return True
+    rate = float(os.getenv("LOG_BODY_SAMPLE_RATE", "0"))
+    return rate > 0 and random.random() < rate
+
+
+def log_bodies() -> bool:
+    """Whether prompts and responses of the current request may be logged in full"""
+    decided = _bodies_var.get()
+    return decided if decided is not None else _truthy(os.getenv("LOG_BODIES", "false"))
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps every record with the id of the request being served"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra=` fields become top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and key not in payload:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Stamps the request id before the record leaves the request's context"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        RequestIdFilter().filter(record)
+        return super().prepare(record)
+
+
+_SINK_TAG = "_halal_rag_log_sink"
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None, stream=None) -> None:
+    """Route the root logger through a queue to a background writer thread.
+
+    Idempotent within a process; after os.fork() the child starts its own
+    writer thread (threads do not survive a fork).
+    """
+    global _listener, _queue_handler, _configured_pid
+    if _configured_pid == os.getpid():
+        return
+
+    fmt = (fmt or os.getenv("LOG_FORMAT", "json")).strip().lower()
+    sink = logging.StreamHandler(stream or sys.stdout)
+    # Tagged so a later configure_logging() removes only what this module installed
+    setattr(sink, _SINK_TAG, True)
+    sink.addFilter(RequestIdFilter())
+    if fmt == "text":
+        sink.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"))
+    else:
+        sink.setFormatter(JsonFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, _QueueHandler) or getattr(handler, _SINK_TAG, False):
+            root.removeHandler(handler)
+    _queue_handler = _QueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, sink, respect_handler_level=True)
+    _listener.start()
+    _configured_pid = os.getpid()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records, stop the writer thread and log synchronously from now on"""
+    global _listener, _queue_handler, _configured_pid
+    root = logging.getLogger()
+    if _queue_handler is not None:
+        root.removeHandler(_queue_handler)
+    if _listener is not None and _configured_pid == os.getpid():
+        _listener.stop()
+        for sink in _listener.handlers:
+            root.addHandler(sink)
+    _listener = None
+    _queue_handler = None
+    _configured_pid = None
+
+
+def _after_fork_in_child() -> None:
+    global _listener
+    if _configured_pid is not None:
+        _listener = None
+        configure_logging()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
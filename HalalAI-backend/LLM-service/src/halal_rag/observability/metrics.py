@@ -0,0 +1,285 @@
+"""In-process metrics registry rendered in the Prometheus text format.
+
+Counters, gauges and fixed-bucket histograms keep plain numbers behind a
+per-series lock, so recording costs a dict lookup and a few additions; the
+text is only built when `/metrics` is scraped. Series live per process: with
+the pre-fork server every worker reports its own values.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import math
+import threading
+import time
+from typing import Any, Callable, Optional, Sequence, TypeVar
+
+from .timing import record_stage
+from .tracing import span
+
+T = TypeVar("T")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; from sub-millisecond encoder cache hits to slow upstream completions
+STAGE_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Value:
+    """One counter or gauge series"""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+
+class _Buckets:
+    """One histogram series: per-bucket counts, cumulated at render time"""
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: dict[tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_series(self) -> Any:
+        return _Value()
+
+    def labels(self, *values: str) -> Any:
+        """Series for these label values (strings), created on first use"""
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                series = self._series.setdefault(tuple(str(v) for v in values), self._new_series())
+        return series
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series_list = sorted(self._series.items())
+        for key, series in series_list:
+            lines.extend(self._samples(key, series))
+        return lines
+
+    def _samples(self, key: tuple[str, ...], series: Any) -> list[str]:
+        return [f"{self.name}{_labels_text(self.labelnames, key)} {_format_value(series.value)}"]
+
+
+class Counter(_Metric):
+    """Monotonic total"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """Value that goes up and down"""
+
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    """Distribution over fixed upper bounds (`le` buckets are inclusive)"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = STAGE_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_series(self) -> _Buckets:
+        return _Buckets(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _samples(self, key: tuple[str, ...], series: _Buckets) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), series.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, key, le)} {cumulative}")
+        labels = _labels_text(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(series.sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics of one process; registering a name twice returns the existing metric"""
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls: type, name: str, *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = STAGE_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "halal_rag_stage_duration_seconds",
+    "Time spent in one stage of a chat request (history, retrieval, encode, search, rerank, prompt_build, llm, total)",
+    ["stage"],
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "halal_rag_cache_requests_total", "Cache lookups by cache and result (hit or miss)", ["cache", "result"]
+)
+ERRORS = REGISTRY.counter("halal_rag_errors_total", "Errors by where they happened and their class", ["source", "error"])
+RETRIES = REGISTRY.counter("halal_rag_upstream_retries_total", "Upstream calls retried, by the error that triggered them", ["error"])
+IN_FLIGHT = REGISTRY.gauge("halal_rag_requests_in_flight", "HTTP requests being served")
+QUEUE_DEPTH = REGISTRY.gauge("halal_rag_queue_depth", "Work items waiting for a worker", ["queue"])
+
+
+class timed:
+    """Observe the duration of the block in the stage histogram and the current request's timings (and trace)"""
+
+    __slots__ = ("stage", "_span", "_started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self) -> None:
+        self._span = span(self.stage)
+        self._span.__enter__()
+        self._started = time.perf_counter()
+
+    def __exit__(self, *exc: Any) -> bool:
+        elapsed = time.perf_counter() - self._started
+        STAGE_SECONDS.labels(self.stage).observe(elapsed)
+        record_stage(self.stage, elapsed)
+        return self._span.__exit__(*exc)
+
+
+def cache_lookup(cache: str, hit: bool, count: int = 1) -> None:
+    if count:
+        CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc(count)
+
+
+async def run_queued(queue: str, func: Callable[..., T], *args: Any) -> T:
+    """asyncio.to_thread that counts calls still waiting for a thread in queue_depth{queue}"""
+    depth = QUEUE_DEPTH.labels(queue)
+    # Whoever pops the token (the thread starting, or a cancelled caller) takes the call off the queue
+    token = [None]
+
+    def leave() -> None:
+        try:
+            token.pop()
+        except IndexError:
+            return
+        depth.dec()
+
+    def call() -> T:
+        leave()
+        return func(*args)
+
+    depth.inc()
+    try:
+        return await asyncio.to_thread(call)
+    finally:
+        leave()
+
+
+def observe_pool(stats: Optional[dict[str, Any]]) -> None:
+    """Upstream calls beyond the connection limit wait for a pooled connection"""
+    if stats:
+        QUEUE_DEPTH.labels("upstream_pool").set(max(stats.get("in_flight", 0) - stats.get("max_connections", 0), 0))
@@ -0,0 +1,146 @@
+"""On-demand sampling profiler for a live worker.
+
+Nothing runs while no profile is requested. During a profile a daemon
+thread wakes every `interval` seconds, reads the current frame of every
+other thread (`sys._current_frames()`) and counts the stacks. Retrieval runs
+in `asyncio.to_thread` workers, so `EmbeddingModel.encode` and
+`VectorStore.search` show up under their threads; suspended asyncio tasks are
+sampled too, by walking their coroutine chains, which shows where requests
+wait (upstream calls, the retrieval queue).
+
+The result is the collapsed ("folded") stack format: one line per distinct
+stack, frames root first separated by `;`, then the number of samples. It is
+the input of flamegraph.pl, inferno and speedscope.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Any, Optional
+
+MAX_DEPTH = 128
+
+
+class ProfilerBusyError(RuntimeError):
+    """A profile is already running in this process"""
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def _thread_stack(frame: Optional[FrameType]) -> list[str]:
+    """Frame labels of a thread, root first"""
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _task_stack(task: asyncio.Task) -> list[str]:
+    """Coroutine chain of a task, outermost first (where a suspended task is waiting)"""
+    labels = []
+    coro: Any = task.get_coro()
+    while coro is not None and len(labels) < MAX_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        labels.append(_frame_label(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return labels
+
+
+class SamplingProfiler:
+    """Collects stack samples of all threads (and asyncio tasks) until stopped"""
+
+    def __init__(self, interval: float = 0.005, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.interval = interval
+        self.loop = loop
+        self.samples: Counter = Counter()
+        self.ticks = 0
+        self.requests = 0
+        self.started = 0.0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample(skip=own)
+
+    def sample(self, skip: Optional[int] = None) -> None:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == skip:
+                continue
+            stack = _thread_stack(frame)
+            if stack:
+                self.samples[";".join([f"thread:{names.get(ident, ident)}", *stack])] += 1
+        if self.loop is not None:
+            try:
+                tasks = asyncio.all_tasks(self.loop)
+            except RuntimeError:
+                tasks = set()
+            for task in tasks:
+                stack = _task_stack(task)
+                if stack:
+                    self.samples[";".join(["asyncio-task", *stack])] += 1
+        self.ticks += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.samples.items()))
+
+
+_active: Optional[SamplingProfiler] = None
+
+
+def request_finished() -> None:
+    """Count a served request towards an active profile (a global read when none is running)"""
+    profiler = _active
+    if profiler is not None:
+        profiler.requests += 1
+
+
+async def profile(
+    seconds: float,
+    requests: int = 0,
+    interval: float = 0.005,
+    include_tasks: bool = True,
+    poll: float = 0.05,
+) -> SamplingProfiler:
+    """Sample this process for `seconds`, or until `requests` more requests were served if that comes first"""
+    global _active
+    if _active is not None:
+        raise ProfilerBusyError("A profile is already running in this worker")
+    profiler = SamplingProfiler(interval=interval, loop=asyncio.get_running_loop() if include_tasks else None)
+    _active = profiler
+    profiler.start()
+    try:
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline and not (requests and profiler.requests >= requests):
+            await asyncio.sleep(min(poll, max(deadline - time.monotonic(), 0.0)))
+    finally:
+        profiler.stop()
+        _active = None
+    return profiler
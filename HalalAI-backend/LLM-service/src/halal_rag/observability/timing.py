@@ -0,0 +1,61 @@
+"""Per-request stage timings for the Server-Timing response header.
+
+The request middleware binds a `RequestTimings` to the request's context;
+every `metrics.timed(stage)` block inside the request adds its duration to
+it. Threads started with `asyncio.to_thread` inherit the context, so stages
+timed during retrieval land on the same request. A stage that runs several
+times (one encode per corpus shard) is summed.
+"""
+
+from __future__ import annotations
+
+import time
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+SERVER_TIMING_HEADER = "Server-Timing"
+
+
+class RequestTimings:
+    """Stage durations of one request, measured with a monotonic clock"""
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self._clock = clock
+        self.started = clock()
+        self.stages: dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return self._clock() - self.started
+
+    def as_dict(self) -> dict[str, float]:
+        """Milliseconds per stage, in the order the stages first ran; `total` is the time so far unless timed"""
+        timings = {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()}
+        timings.setdefault("total", round(self.elapsed() * 1000, 2))
+        return timings
+
+    def header(self) -> str:
+        """Server-Timing value: `encode;dur=12.1, search;dur=3.4, ..., total;dur=912.5`"""
+        return ", ".join(f"{stage};dur={ms}" for stage, ms in self.as_dict().items())
+
+
+_timings_var: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def bind_timings() -> RequestTimings:
+    """Start timing a new request in the current context"""
+    timings = RequestTimings()
+    _timings_var.set(timings)
+    return timings
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _timings_var.get()
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    timings = _timings_var.get()
+    if timings is not None:
+        timings.add(stage, seconds)
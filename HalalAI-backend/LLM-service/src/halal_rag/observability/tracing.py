@@ -0,0 +1,300 @@
+"""Request tracing: nested spans with W3C trace context and pluggable exporters.
+
+Configure with::
+
+    TRACE_EXPORTER=off|console|file   where finished traces go (default off)
+    TRACE_FILE=traces.jsonl           output of the file exporter, one span per line
+    TRACE_SAMPLE_RATE=0.01            share of requests traced when the caller did not decide
+
+Sampling is decided once, when a request starts (head-based): an incoming
+`traceparent` header keeps the caller's decision and trace id, otherwise
+TRACE_SAMPLE_RATE applies. Requests that are not sampled create no span
+objects, so `span()` costs a context variable lookup. The spans of a sampled
+request are exported together when its root span ends.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Iterator, Optional
+
+from .interfaces import ISpanExporter
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = "traceparent"
+
+_TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+@dataclass(frozen=True)
+class TraceContext:
+    """Position in a trace received from the caller"""
+
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[TraceContext]:
+    """`00-<trace id>-<parent span id>-<flags>`; None when missing or malformed"""
+    match = _TRACEPARENT.match(value.strip().lower()) if value else None
+    if match is None:
+        return None
+    version, trace_id, span_id, flags = match.groups()
+    if version == "ff" or trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return TraceContext(trace_id=trace_id, span_id=span_id, sampled=bool(int(flags, 16) & 1))
+
+
+def format_traceparent(trace_id: str, span_id: str, sampled: bool = True) -> str:
+    return f"00-{trace_id}-{span_id}-{'01' if sampled else '00'}"
+
+
+class _Trace:
+    """Spans of one sampled request"""
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: list[Span] = []
+
+
+class Span:
+    """A timed operation; wall-clock start for ordering, perf_counter for the duration"""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "attributes", "status", "start_ns", "duration", "_started")
+
+    def __init__(self, trace: _Trace, name: str, parent_id: Optional[str], attributes: dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = "ok"
+        self.start_ns = time.time_ns()
+        self.duration: Optional[float] = None
+        self._started = time.perf_counter()
+        trace.spans.append(self)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.attributes["error"] = type(exc).__name__
+
+    def end(self) -> None:
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._started
+
+    @property
+    def traceparent(self) -> str:
+        return format_traceparent(self.trace.trace_id, self.span_id)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_unix_ms": round(self.start_ns / 1e6, 3),
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_traceparent() -> Optional[str]:
+    """traceparent for outgoing calls made inside a sampled span"""
+    active = _current_span.get()
+    return active.traceparent if active is not None else None
+
+
+@contextmanager
+def _activate(active: Span) -> Iterator[Span]:
+    token = _current_span.set(active)
+    try:
+        yield active
+    except BaseException as e:
+        active.record_error(e)
+        raise
+    finally:
+        active.end()
+        _current_span.reset(token)
+
+
+class _NoSpan:
+    """Shared context manager of spans outside a sampled trace"""
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc: Any) -> bool:
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **attributes: Any) -> ContextManager[Optional[Span]]:
+    """Child span of the current one; enters as None (and records nothing) outside a sampled trace"""
+    parent = _current_span.get()
+    if parent is None:
+        return _NO_SPAN
+    return _activate(Span(parent.trace, name, parent.span_id, attributes))
+
+
+class Tracer:
+    """Starts root spans, decides sampling and hands finished traces to the exporter"""
+
+    def __init__(
+        self,
+        exporter: Optional[ISpanExporter] = None,
+        sample_rate: float = 0.0,
+        rng: Callable[[], float] = random.random,
+    ):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self._rng = rng
+        self.traces_started = 0
+        self.traces_sampled = 0
+
+    @classmethod
+    def from_env(cls) -> Tracer:
+        kind = os.getenv("TRACE_EXPORTER", "off").strip().lower()
+        exporter: Optional[ISpanExporter] = None
+        if kind == "console":
+            exporter = ConsoleSpanExporter()
+        elif kind == "file":
+            exporter = FileSpanExporter(Path(os.getenv("TRACE_FILE", "traces.jsonl")))
+        return cls(exporter=exporter, sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.01")))
+
+    def sample(self, parent: Optional[TraceContext]) -> bool:
+        if self.exporter is None:
+            return False
+        if parent is not None:
+            return parent.sampled
+        return self.sample_rate > 0 and self._rng() < self.sample_rate
+
+    @contextmanager
+    def trace(self, name: str, traceparent: Optional[str] = None, **attributes: Any) -> Iterator[Optional[Span]]:
+        """Root span of a request, continuing the caller's trace when `traceparent` is valid"""
+        self.traces_started += 1
+        parent = parse_traceparent(traceparent)
+        if not self.sample(parent):
+            token = _current_span.set(None)
+            try:
+                yield None
+            finally:
+                _current_span.reset(token)
+            return
+
+        self.traces_sampled += 1
+        trace = _Trace(parent.trace_id if parent else os.urandom(16).hex())
+        root = Span(trace, name, parent.span_id if parent else None, attributes)
+        try:
+            with _activate(root):
+                yield root
+        finally:
+            try:
+                self.exporter.export([s.as_dict() for s in trace.spans])
+            except Exception as e:
+                logger.warning("Span export failed: %s", e)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "exporter": type(self.exporter).__name__ if self.exporter else None,
+            "sample_rate": self.sample_rate,
+            "traces_started": self.traces_started,
+            "traces_sampled": self.traces_sampled,
+        }
+
+    def shutdown(self) -> None:
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+
+class ConsoleSpanExporter(ISpanExporter):
+    """Spans as structured log records, written by the non-blocking log writer"""
+
+    def __init__(self, log: Optional[logging.Logger] = None):
+        self.log = log or logging.getLogger("halal_rag.traces")
+
+    def export(self, spans: list[dict[str, Any]]) -> None:
+        for record in spans:
+            self.log.info("span %s", record["name"], extra={"span": record})
+
+
+class FileSpanExporter(ISpanExporter):
+    """JSON lines appended to a file by a background thread, for offline analysis.
+
+    Pre-fork workers share TRACE_FILE: each span is one unbuffered write() to
+    an O_APPEND descriptor, so lines of different processes never interleave.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, spans: list[dict[str, Any]]) -> None:
+        self._queue.put(spans)
+
+    def _run(self) -> None:
+        while True:
+            spans = self._queue.get()
+            if spans is None:
+                return
+            try:
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    for record in spans:
+                        os.write(fd, (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                logger.warning("Cannot write spans to %s: %s", self.path, e)
+
+    def shutdown(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def configure_tracing(tracer: Optional[Tracer] = None) -> Tracer:
+    """Install the process-wide tracer (from the environment by default)"""
+    global _tracer
+    _tracer = tracer or Tracer.from_env()
+    return _tracer
+
+
+def shutdown_tracing() -> None:
+    """Flush the exporter and turn tracing off"""
+    global _tracer
+    _tracer.shutdown()
+    _tracer = Tracer()
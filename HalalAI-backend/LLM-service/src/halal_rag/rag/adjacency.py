@@ -0,0 +1,87 @@
+"""Verse adjacency and context-window expansion over a verse-level index"""
+
+from __future__ import annotations
+
+from typing import Any, Sequence
+
+import numpy as np
+
+from .metadata import verse_bounds
+
+
+class VerseAdjacency:
+    """Previous/next verse ids within a sura, precomputed from store order.
+
+    Rows are sorted by corpus, sura and verse (see `document_order_key`), so
+    a verse's neighbours are the adjacent rows whenever they continue the
+    same sura without a gap. Each row also knows the bounds of its run of
+    consecutive verses, which turns a ±radius window into two clamps.
+    """
+
+    def __init__(self, documents: Sequence[dict[str, Any]]):
+        self.documents = documents
+        n = len(documents)
+        bounds = [verse_bounds(doc) for doc in documents]
+        follows = np.zeros(n, dtype=bool)
+        for i in range(1, n):
+            prev, cur = documents[i - 1], documents[i]
+            follows[i] = (
+                cur.get("sura") == prev.get("sura")
+                and cur.get("corpus") == prev.get("corpus")
+                and bounds[i][0] == bounds[i - 1][1] + 1
+                and bounds[i][0] >= 0
+            )
+        rows = np.arange(n, dtype=np.int64)
+        self.prev = np.where(follows, rows - 1, -1)
+        self.next = np.full(n, -1, dtype=np.int64)
+        self.next[:-1] = np.where(follows[1:], rows[1:], -1)
+        # First row of each run, propagated forward; last row, propagated backward
+        self.run_start = np.maximum.accumulate(np.where(follows, 0, rows)) if n else rows
+        run_end = np.where(self.next >= 0, n, rows)
+        self.run_end = np.minimum.accumulate(run_end[::-1])[::-1] if n else rows
+
+    def window(self, row: int, radius: int) -> tuple[int, int]:
+        """Row range [start, stop) of the verse and up to `radius` neighbours on each side"""
+        return max(row - radius, int(self.run_start[row])), min(row + radius, int(self.run_end[row])) + 1
+
+    def expand(self, hits: Sequence[dict[str, Any]], radius: int) -> list[dict[str, Any]]:
+        """Replace each hit by its surrounding window, merging windows that overlap or touch.
+
+        A merged passage takes the rank and scores of its best-ranked hit;
+        `hit_ids` lists the rows that were actually retrieved.
+        """
+        if radius <= 0 or not hits:
+            return list(hits)
+
+        windows = sorted((*self.window(hit["doc_id"], radius), rank) for rank, hit in enumerate(hits))
+        spans: list[list[Any]] = []  # [start, stop, best rank, hit ranks]
+        for start, stop, rank in windows:
+            last = spans[-1] if spans else None
+            # Overlapping or touching ranges within one run of verses merge into one passage
+            if last and start <= last[1] and self.run_start[start] == self.run_start[last[0]]:
+                last[1] = max(last[1], stop)
+                last[2] = min(last[2], rank)
+                last[3].append(rank)
+            else:
+                spans.append([start, stop, rank, [rank]])
+
+        spans.sort(key=lambda span: span[2])
+        return [
+            self._passage(start, stop, hits[best], [hits[r]["doc_id"] for r in ranks])
+            for start, stop, best, ranks in spans
+        ]
+
+    def _passage(self, start: int, stop: int, best: dict[str, Any], rows: list[int]) -> dict[str, Any]:
+        if stop - start == 1:
+            return dict(best)
+        verses = self.documents[start:stop]
+        first, last = verse_bounds(verses[0])[0], verse_bounds(verses[-1])[1]
+        passage = dict(best)
+        passage.update(
+            text="\n".join(doc["text"] for doc in verses),
+            verse=f"{first}-{last}",
+            verse_start=first,
+            verse_end=last,
+            hit_ids=sorted(rows),
+        )
+        return passage
@@ -0,0 +1,97 @@
+"""Score-aware source selection: threshold, drop-off detection and a depth cap"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+
+@dataclass
+class CutoffResult:
+    """Sources kept for the prompt and why the others were left out"""
+
+    sources: list[dict[str, Any]] = field(default_factory=list)
+    retrieved: int = 0
+    below_threshold: int = 0
+    after_drop_off: int = 0
+
+    @property
+    def used(self) -> int:
+        return len(self.sources)
+
+
+class SourceCutoff:
+    """Keeps only sources that are relevant enough to be worth prompt tokens.
+
+    Retrieval asks for `max_depth` candidates; sources scoring below
+    `min_score` (cosine similarity) are dropped, then sources below the
+    largest drop between consecutive scores are dropped when that drop is at
+    least `min_gap`. The cosine `score` is used in every retrieval mode, so
+    thresholds keep one meaning; since hybrid fusion, reranking and MMR order
+    the list by other keys, drops are found on the scores sorted apart from
+    the list, and the kept sources stay in retrieval order. Explicit
+    reference matches (pinned at score 1.0) always stay and take no part in
+    the drop-off.
+    """
+
+    def __init__(self, min_score: float = 0.3, max_depth: int = 5, min_gap: Optional[float] = 0.15):
+        self.min_score = min_score
+        self.max_depth = max(1, max_depth)
+        self.min_gap = min_gap
+        self.requests = 0
+        self.retrieved_total = 0
+        self.used_total = 0
+        self.below_threshold_total = 0
+        self.after_drop_off_total = 0
+
+    @classmethod
+    def from_env(cls) -> "SourceCutoff":
+        gap = os.getenv("RAG_SCORE_GAP", "0.15")
+        return cls(
+            min_score=float(os.getenv("RAG_MIN_SCORE", "0.3")),
+            max_depth=int(os.getenv("RAG_MAX_SOURCES", "5")),
+            min_gap=float(gap) if gap.strip() else None,
+        )
+
+    def apply(self, sources: list[dict[str, Any]]) -> CutoffResult:
+        result = CutoffResult(retrieved=len(sources))
+        candidates = sources[: self.max_depth]
+
+        kept = [s for s in candidates if _pinned(s) or s.get("score", 0.0) >= self.min_score]
+        result.below_threshold = len(candidates) - len(kept)
+
+        ranked = sorted((s.get("score", 0.0) for s in kept if not _pinned(s)), reverse=True)
+        if self.min_gap is not None and len(ranked) > 1:
+            gaps = [ranked[i] - ranked[i + 1] for i in range(len(ranked) - 1)]
+            cut = max(range(len(gaps)), key=gaps.__getitem__)
+            if gaps[cut] >= self.min_gap:
+                floor = ranked[cut]
+                before = len(kept)
+                kept = [s for s in kept if _pinned(s) or s.get("score", 0.0) >= floor]
+                result.after_drop_off = before - len(kept)
+
+        result.sources = kept
+        self.requests += 1
+        self.retrieved_total += result.retrieved
+        self.used_total += result.used
+        self.below_threshold_total += result.below_threshold
+        self.after_drop_off_total += result.after_drop_off
+        return result
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "min_score": self.min_score,
+            "max_depth": self.max_depth,
+            "min_gap": self.min_gap,
+            "requests": self.requests,
+            "sources_retrieved_total": self.retrieved_total,
+            "sources_used_total": self.used_total,
+            "dropped_below_threshold_total": self.below_threshold_total,
+            "dropped_after_drop_off_total": self.after_drop_off_total,
+            "avg_sources_used": round(self.used_total / self.requests, 3) if self.requests else 0.0,
+        }
+
+
+def _pinned(source: dict[str, Any]) -> bool:
+    return source.get("match") == "reference"
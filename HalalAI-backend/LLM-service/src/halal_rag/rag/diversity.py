@@ -0,0 +1,50 @@
+"""Maximal marginal relevance selection over a candidate pool"""
+
+from __future__ import annotations
+
+from typing import Any, Sequence
+
+import numpy as np
+
+
+def relevance_of(candidates: Sequence[dict[str, Any]]) -> np.ndarray:
+    """Relevance used by MMR: the score that ordered the candidates, min-max scaled to [0, 1].
+
+    That is the cross-encoder score after reranking, the fused score in
+    hybrid mode and the cosine similarity otherwise, so lambda trades the
+    same [0, 1] relevance against cosine redundancy in every mode.
+    """
+    if not candidates:
+        return np.zeros(0, dtype=np.float32)
+    key = next(k for k in ("rerank_score", "rrf_score", "score") if k in candidates[0])
+    values = np.asarray([doc.get(key, 0.0) for doc in candidates], dtype=np.float32)
+    spread = float(values.max() - values.min())
+    if spread <= 0:
+        return np.ones_like(values)
+    return (values - values.min()) / spread
+
+
+def mmr_order(relevance: np.ndarray, vectors: np.ndarray, k: int, lambda_: float = 0.5) -> list[int]:
+    """Greedy MMR: argmax of lambda * rel(d) - (1 - lambda) * max sim(d, selected).
+
+    `vectors` are unit-length rows, so one matrix product gives every
+    pairwise cosine similarity; each step is then a vectorised argmax and
+    a running element-wise maximum, k steps in total.
+    """
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    similarity = vectors @ vectors.T
+    available = np.ones(n, dtype=bool)
+    max_similarity = np.zeros(n, dtype=np.float32)
+    order: list[int] = []
+    for step in range(k):
+        mmr = lambda_ * relevance - (1 - lambda_) * max_similarity
+        mmr[~available] = -np.inf
+        best = int(np.argmax(mmr))
+        order.append(best)
+        available[best] = False
+        column = similarity[:, best]
+        max_similarity = column.copy() if step == 0 else np.maximum(max_similarity, column)
+    return order
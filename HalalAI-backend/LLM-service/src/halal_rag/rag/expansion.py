@@ -0,0 +1,176 @@
+"""Query expansion with colloquial-term synonyms and multi-vector query fusion"""
+
+from __future__ import annotations
+
+import os
+import re
+from typing import Any, Optional
+
+import torch
+from torch import nn
+
+from .interfaces import IEmbeddingEncoder
+from .lexical import tokenize
+
+# Word stem -> phrasings used by the translation. Stems match inflected forms
+# («свинину», «свининой»); the first synonym is the canonical replacement.
+# The corpus's own topic («Коран») is left out: it is in almost every query
+# and would add a generic variant to every search.
+SYNONYMS: dict[str, tuple[str, ...]] = {
+    "свинин": ("мясо свиньи", "свинья"),
+    "свинь": ("мясо свиньи",),
+    "алкогол": ("опьяняющие напитки", "вино", "хамр"),
+    "спиртн": ("опьяняющие напитки", "вино"),
+    "пьянств": ("опьяняющие напитки", "вино"),
+    "намаз": ("молитва", "салят"),
+    "салят": ("молитва", "намаз"),
+    "ураз": ("пост", "саум"),
+    "рамадан": ("пост", "месяц рамадан"),
+    "закят": ("закят", "очистительная милостыня"),
+    "садак": ("милостыня", "подаяние"),
+    "хадж": ("паломничество", "хадж к дому"),
+    "дуа": ("мольба", "взывать к аллаху"),
+    "хиджаб": ("покрывало", "накидка"),
+    "никах": ("брак", "жениться"),
+    "развод": ("развод", "талак"),
+    "процент": ("лихоимство", "рост"),
+    "ростовщ": ("лихоимство",),
+    "азарт": ("азартные игры", "майсир"),
+    "казино": ("азартные игры",),
+    "мертвечин": ("мертвечина", "падаль"),
+}
+
+MAX_VARIANTS = 5
+
+_PORK = re.compile(r"свинин[а-яё]*", re.IGNORECASE)
+_ALCOHOL = re.compile(r"алкогол[а-яё]*|спиртн[а-яё]*", re.IGNORECASE)
+
+
+def _matches(query: str) -> list[tuple[str, str]]:
+    """(surface token, stem) pairs of the query that have synonyms"""
+    found = []
+    for token in tokenize(query):
+        for stem in SYNONYMS:
+            if token.startswith(stem) and (token, stem) not in found:
+                found.append((token, stem))
+                break
+    return found
+
+
+def expand_query(query: str, max_variants: int = MAX_VARIANTS) -> list[str]:
+    """The query plus copies with one known term replaced by a synonym"""
+    variants = [query]
+    lowered = query.lower().replace("ё", "е")
+    for token, stem in _matches(query):
+        for synonym in SYNONYMS[stem]:
+            variant = lowered.replace(token, synonym)
+            if variant != lowered and variant not in variants:
+                variants.append(variant)
+            if len(variants) >= max_variants:
+                return variants
+    return variants
+
+
+def normalize_food_query(query: str) -> str:
+    """Rewrite food questions in the translation's wording («свинину» -> «мясо свиньи») with prohibition context"""
+    normalized = _PORK.sub("мясо свиньи", query)
+    normalized = _ALCOHOL.sub("опьяняющие напитки (хамр)", normalized)
+    if normalized != query and "запрет" not in normalized.lower():
+        normalized = f"{normalized} запрет"
+    return normalized
+
+
+def generate_query_variants(query: str, max_variants: int = MAX_VARIANTS) -> list[str]:
+    """Distinct variants, original first: the normalised food query, then synonym expansions"""
+    variants = [query, normalize_food_query(query), *expand_query(query, max_variants)]
+    return list(dict.fromkeys(variants))[:max_variants]
+
+
+def synonym_terms(query: str, limit: int = MAX_VARIANTS) -> list[str]:
+    """Synonym phrases for the known terms of a query"""
+    terms: list[str] = []
+    for _, stem in _matches(query):
+        terms.extend(s for s in SYNONYMS[stem] if s not in terms)
+    return terms[:limit]
+
+
+class QueryExpander:
+    """Turns a query into several query vectors for multi-vector search.
+
+    mode "offset" (default) costs no extra forward pass: every synonym
+    phrase is encoded once at startup, and a variant is the query embedding
+    shifted towards the synonym, normalize(q + weight * s). mode "text"
+    encodes the query and its rewritten variants in one batched forward.
+    fusion "max" keeps one row per variant (documents are scored by their
+    best-matching variant); "mean" averages them into a single vector.
+    """
+
+    def __init__(
+        self,
+        encoder: IEmbeddingEncoder,
+        mode: str = "offset",
+        fusion: str = "max",
+        max_variants: int = 4,
+        weight: float = 0.5,
+    ):
+        self.encoder = encoder
+        self.mode = mode
+        self.fusion = fusion
+        self.max_variants = max_variants
+        self.weight = weight
+        self.expanded = 0
+        self.queries = 0
+        self.term_vectors: dict[str, torch.Tensor] = {}
+        if mode == "offset":
+            phrases = sorted({s for synonyms in SYNONYMS.values() for s in synonyms})
+            vectors = nn.functional.normalize(encoder.encode(phrases), p=2, dim=1)
+            self.term_vectors = dict(zip(phrases, vectors))
+
+    @classmethod
+    def from_env(cls, encoder: IEmbeddingEncoder) -> Optional["QueryExpander"]:
+        """RAG_EXPANSION=offset|text enables expansion; None when off (default)"""
+        mode = os.getenv("RAG_EXPANSION", "off").strip().lower()
+        if mode not in ("offset", "text"):
+            return None
+        return cls(
+            encoder,
+            mode=mode,
+            fusion=os.getenv("RAG_EXPANSION_FUSION", "max").strip().lower(),
+            max_variants=int(os.getenv("RAG_EXPANSION_VARIANTS", "4")),
+        )
+
+    def lexical_query(self, query: str) -> str:
+        """Query text with synonym phrases appended, for term-matching search"""
+        terms = synonym_terms(query, self.max_variants)
+        return " ".join([query, *terms]) if terms else query
+
+    def query_vectors(self, query: str) -> torch.Tensor:
+        """Query embedding(s): 1-D for a single vector, 2-D (variants x dim) for max fusion"""
+        self.queries += 1
+        if self.mode == "text":
+            variants = generate_query_variants(query, self.max_variants + 1)
+            if len(variants) == 1:
+                return self.encoder.encode_single(query)
+            vectors = self.encoder.encode(variants)
+        else:
+            query_vector = self.encoder.encode_single(query)
+            terms = [t for t in synonym_terms(query, self.max_variants) if t in self.term_vectors]
+            if not terms:
+                return query_vector
+            q = nn.functional.normalize(query_vector, p=2, dim=0)
+            shifted = torch.stack([q + self.weight * self.term_vectors[t] for t in terms])
+            vectors = torch.cat([q.unsqueeze(0), shifted])
+        self.expanded += 1
+        vectors = nn.functional.normalize(vectors, p=2, dim=1)
+        if self.fusion == "mean":
+            return vectors.mean(dim=0)
+        return vectors
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "fusion": self.fusion,
+            "queries": self.queries,
+            "expanded": self.expanded,
+            "precomputed_terms": len(self.term_vectors),
+        }
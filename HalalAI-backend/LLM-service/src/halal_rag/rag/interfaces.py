@@ -1,7 +1,10 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, Optional, Sequence
+import numpy as np
 import torch
 
+from .metadata import SearchFilter, Selection
+
 
 class IEmbeddingEncoder(ABC):
     """Interface for embedding dto"""
@@ -26,8 +29,61 @@ class IVectorSearcher(ABC):
         ...
 
     @abstractmethod
-    def search(self, query_embedding: torch.Tensor, top_k: int = 3) -> list[dict[str, Any]]:
-        """Search for similar documents"""
+    def search(
+        self,
+        query_embedding: torch.Tensor,
+        top_k: int = 3,
+        search_filter: Optional[SearchFilter] = None,
+    ) -> list[dict[str, Any]]:
+        """Search for similar documents, scoring only rows matching the filter"""
+        ...
+
+    @abstractmethod
+    def scores(self, query_embedding: torch.Tensor) -> torch.Tensor:
+        """Similarity of the query to every stored document, in insertion order.
+
+        A 2-D query (one row per query variant) scores each document by its best row.
+        """
+        ...
+
+    @abstractmethod
+    def select(self, search_filter: Optional[SearchFilter]) -> Optional[Selection]:
+        """Rows matching a filter (None: no filtering)"""
+        ...
+
+    @abstractmethod
+    def scores_for(
+        self, query_embedding: torch.Tensor, selection: Optional[Selection] = None
+    ) -> tuple[torch.Tensor, Optional[np.ndarray]]:
+        """Similarity to the selected rows only, with their ascending row ids"""
+        ...
+
+    @abstractmethod
+    def vectors(self, rows: list[int]) -> np.ndarray:
+        """Unit-length embeddings of the given rows"""
+        ...
+
+
+class ILexicalSearcher(ABC):
+    """Interface for keyword (term-matching) search over document texts"""
+
+    @abstractmethod
+    def add_documents(self, texts: list[str]) -> None:
+        """Index document texts; ids are positions in insertion order"""
+        ...
+
+    @abstractmethod
+    def search(self, query: str, top_k: int = 10, rows: Optional[np.ndarray] = None) -> list[tuple[int, float]]:
+        """Return (document id, score) pairs, best first, restricted to `rows` if given"""
+        ...
+
+
+class IPassageScorer(ABC):
+    """Interface for query-passage relevance models (cross-encoders)"""
+
+    @abstractmethod
+    def score(self, query: str, passages: Sequence[str]) -> list[float]:
+        """Relevance of each passage to the query, scored as one batch"""
         ...
 
 
@@ -35,6 +91,19 @@ class IRAGPipeline(ABC):
     """Interface for RAG pipeline"""
 
     @abstractmethod
-    def search(self, query: str, top_k: int = 3) -> list[dict[str, Any]]:
-        """Search for relevant documents based on query"""
+    def search(
+        self,
+        query: str,
+        top_k: int = 3,
+        search_filter: Optional[SearchFilter] = None,
+        mmr_lambda: Optional[float] = None,
+        context_window: Optional[int] = None,
+    ) -> list[dict[str, Any]]:
+        """Search for relevant documents based on query.
+
+        `mmr_lambda` diversifies the results by maximal marginal relevance
+        (1.0: pure relevance, lower: fewer near-duplicates). `context_window`
+        expands each hit to that many neighbouring verses on each side,
+        merging overlapping passages.
+        """
         ...
@@ -0,0 +1,123 @@
+"""In-memory BM25 inverted index and reciprocal-rank fusion"""
+
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, Callable, Optional, Sequence
+
+import numpy as np
+
+from .interfaces import ILexicalSearcher
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word tokens; `ё` is folded into `е` as Russian texts use both"""
+    return _WORD.findall(text.lower().replace("ё", "е"))
+
+
+class BM25Index(ILexicalSearcher):
+    """Okapi BM25 over an inverted index with array postings.
+
+    For every term the index stores the ids of the documents containing it
+    and the precomputed BM25 contribution of the term to each of them
+    (IDF, term frequency and length normalisation folded into one float32).
+    A query is then a handful of vectorised scatter-adds into a score array,
+    followed by a partial sort.
+    """
+
+    def __init__(self, analyzer: Callable[[str], list[str]] = tokenize, k1: float = 1.5, b: float = 0.75):
+        self.analyzer = analyzer
+        self.k1 = k1
+        self.b = b
+        self._texts: list[str] = []
+        self.vocabulary: dict[str, int] = {}
+        self.postings_docs: list[np.ndarray] = []
+        self.postings_weights: list[np.ndarray] = []
+        self.idf: np.ndarray = np.zeros(0, dtype=np.float32)
+        self.doc_lengths: np.ndarray = np.zeros(0, dtype=np.int32)
+        self.avg_doc_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def add_documents(self, texts: Sequence[str]) -> None:
+        self._texts.extend(texts)
+        self._build()
+
+    def _build(self) -> None:
+        term_docs: dict[str, list[int]] = defaultdict(list)
+        term_freqs: dict[str, list[int]] = defaultdict(list)
+        lengths = np.zeros(len(self._texts), dtype=np.int32)
+        for doc_id, text in enumerate(self._texts):
+            tokens = self.analyzer(text)
+            lengths[doc_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                term_docs[term].append(doc_id)
+                term_freqs[term].append(tf)
+
+        n_docs = len(self._texts)
+        self.doc_lengths = lengths
+        self.avg_doc_length = float(lengths.mean()) if n_docs else 0.0
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(self.avg_doc_length, 1e-9))
+
+        self.vocabulary = {}
+        self.postings_docs = []
+        self.postings_weights = []
+        idf = []
+        for term in sorted(term_docs):
+            docs = np.asarray(term_docs[term], dtype=np.int32)
+            tf = np.asarray(term_freqs[term], dtype=np.float32)
+            df = len(docs)
+            term_idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            self.vocabulary[term] = len(idf)
+            self.postings_docs.append(docs)
+            self.postings_weights.append((term_idf * tf * (self.k1 + 1) / (tf + norm[docs])).astype(np.float32))
+            idf.append(term_idf)
+        self.idf = np.asarray(idf, dtype=np.float32)
+
+    def scores(self, query: str) -> Optional[np.ndarray]:
+        """BM25 score of every document, None if no query term is in the vocabulary"""
+        term_ids = [self.vocabulary[t] for t in self.analyzer(query) if t in self.vocabulary]
+        if not term_ids:
+            return None
+        scores = np.zeros(len(self._texts), dtype=np.float32)
+        for term_id in term_ids:
+            # Document ids are unique within a posting list, so fancy-index add is exact
+            scores[self.postings_docs[term_id]] += self.postings_weights[term_id]
+        return scores
+
+    def search(self, query: str, top_k: int = 10, rows: Optional[np.ndarray] = None) -> list[tuple[int, float]]:
+        scores = self.scores(query)
+        if scores is None:
+            return []
+        hits = np.flatnonzero(scores) if rows is None else rows[scores[rows] > 0]
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(int(i), float(scores[i])) for i in hits]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "documents": len(self._texts),
+            "terms": len(self.vocabulary),
+            "postings": int(sum(len(p) for p in self.postings_docs)),
+            "avg_doc_length": round(self.avg_doc_length, 2),
+        }
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[int]],
+    k: int = 60,
+    weights: Optional[Sequence[float]] = None,
+) -> list[tuple[int, float]]:
+    """Fuse ranked id lists: score(d) = sum_i w_i / (k + rank_i(d)), ranks from 1"""
+    weights = weights or [1.0] * len(rankings)
+    fused: dict[int, float] = defaultdict(float)
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] += weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,204 @@
+"""Metadata filter index: sura row ranges and bitmaps for other fields"""
+
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+_LEADING_INT = re.compile(r"\d+")
+
+# Low-cardinality fields indexed as bitmaps when documents carry them
+BITMAP_FIELDS = ("corpus", "translation", "lang")
+
+
+def verse_bounds(doc: dict[str, Any]) -> tuple[int, int]:
+    """First and last verse covered by a document (verse '173', '1-3' or verse_start/verse_end)"""
+    if "verse_start" in doc:
+        start = _to_int(doc["verse_start"])
+        return start, _to_int(doc.get("verse_end", doc["verse_start"]), start)
+    numbers = _LEADING_INT.findall(str(doc.get("verse", "")))
+    if not numbers:
+        return -1, -1
+    return int(numbers[0]), int(numbers[-1])
+
+
+def _to_int(value: Any, default: int = -1) -> int:
+    match = _LEADING_INT.search(str(value))
+    return int(match.group()) if match else default
+
+
+def source_label(doc: dict[str, Any]) -> str:
+    """Citation line: «Сура 2:173» for Quran verses, the document's own reference otherwise"""
+    if "sura" in doc:
+        return f"Сура {doc['sura']}:{doc.get('verse', '')}"
+    return str(doc.get("reference") or doc.get("corpus") or "Источник")
+
+
+def document_order_key(doc: dict[str, Any]) -> tuple:
+    """Sort key that groups documents by corpus and sura, verses ascending"""
+    sura = doc.get("sura")
+    return (str(doc.get("corpus", "")), sura if isinstance(sura, int) else _to_int(sura, 1 << 30), verse_bounds(doc)[0])
+
+
+@dataclass
+class SearchFilter:
+    """Constraints on retrieved documents; empty fields do not constrain.
+
+    `verse_from`/`verse_to` keep documents overlapping that verse range in
+    each selected sura. `metadata` maps a bitmap-indexed field to the allowed
+    values, e.g. {"corpus": ["quran_ru"]}.
+    """
+
+    suras: Optional[Sequence[int]] = None
+    verse_from: Optional[int] = None
+    verse_to: Optional[int] = None
+    metadata: dict[str, Sequence[str]] = field(default_factory=dict)
+
+    def is_empty(self) -> bool:
+        return not self.suras and self.verse_from is None and self.verse_to is None and not self.metadata
+
+
+@dataclass
+class Selection:
+    """Rows matching a filter: contiguous row ranges, or explicit row ids"""
+
+    slices: list[tuple[int, int]] = field(default_factory=list)
+    rows: Optional[np.ndarray] = None
+
+    @property
+    def size(self) -> int:
+        if self.rows is not None:
+            return len(self.rows)
+        return sum(stop - start for start, stop in self.slices)
+
+    def row_ids(self) -> np.ndarray:
+        if self.rows is not None:
+            return self.rows
+        if not self.slices:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([np.arange(start, stop, dtype=np.int64) for start, stop in self.slices])
+
+
+class MetadataIndex:
+    """Precomputed row ranges per sura plus bitmaps for other metadata.
+
+    Documents are expected grouped by sura with verses ascending (see
+    `document_order_key`); each maximal run of one sura is stored as a
+    (start, stop) row range with the verse bounds of its rows, so a
+    sura + verse-range filter resolves to contiguous slices by binary search
+    and the store scores only those rows. Fields in `bitmap_fields` get one
+    boolean row mask per value.
+    """
+
+    def __init__(self, bitmap_fields: Sequence[str] = BITMAP_FIELDS):
+        self.bitmap_fields = tuple(bitmap_fields)
+        self.size = 0
+        self.sura_runs: dict[int, list[tuple[int, int]]] = {}
+        self.starts = np.zeros(0, dtype=np.int32)
+        self.ends = np.zeros(0, dtype=np.int32)
+        self._sorted_runs: set[tuple[int, int]] = set()
+        self.bitmaps: dict[str, dict[str, np.ndarray]] = {}
+
+    def build(self, documents: Sequence[dict[str, Any]]) -> None:
+        n = len(documents)
+        self.size = n
+        bounds = [verse_bounds(doc) for doc in documents]
+        self.starts = np.fromiter((b[0] for b in bounds), dtype=np.int32, count=n)
+        self.ends = np.fromiter((b[1] for b in bounds), dtype=np.int32, count=n)
+
+        runs: dict[int, list[tuple[int, int]]] = defaultdict(list)
+        self._sorted_runs = set()
+        start = 0
+        for i in range(1, n + 1):
+            if i == n or documents[i].get("sura") != documents[start].get("sura"):
+                sura = _to_int(documents[start].get("sura"))
+                runs[sura].append((start, i))
+                # Binary search needs both verse starts and ends ascending in the run
+                if np.all(np.diff(self.starts[start:i]) >= 0) and np.all(np.diff(self.ends[start:i]) >= 0):
+                    self._sorted_runs.add((start, i))
+                start = i
+        self.sura_runs = dict(runs)
+
+        self.bitmaps = {}
+        for name in self.bitmap_fields:
+            values: dict[str, np.ndarray] = {}
+            for row, doc in enumerate(documents):
+                if name in doc:
+                    key = str(doc[name])
+                    if key not in values:
+                        values[key] = np.zeros(n, dtype=bool)
+                    values[key][row] = True
+            if values:
+                self.bitmaps[name] = values
+
+    def _narrow(self, start: int, stop: int, verse_from: Optional[int], verse_to: Optional[int]) -> tuple[int, int]:
+        """Rows of a sorted run overlapping [verse_from, verse_to]"""
+        lo, hi = start, stop
+        if verse_to is not None:
+            hi = start + int(np.searchsorted(self.starts[start:stop], verse_to, side="right"))
+        if verse_from is not None:
+            lo = start + int(np.searchsorted(self.ends[start:stop], verse_from, side="left"))
+        return lo, max(lo, hi)
+
+    def select(self, search_filter: SearchFilter) -> Selection:
+        verse_from, verse_to = search_filter.verse_from, search_filter.verse_to
+        if search_filter.suras:
+            runs = [run for sura in sorted(set(search_filter.suras)) for run in self.sura_runs.get(int(sura), [])]
+        else:
+            runs = [(0, self.size)] if verse_from is None and verse_to is None else sorted(
+                run for sura_runs in self.sura_runs.values() for run in sura_runs
+            )
+
+        slices: list[tuple[int, int]] = []
+        exact = True
+        for start, stop in runs:
+            if verse_from is None and verse_to is None:
+                slices.append((start, stop))
+            elif (start, stop) in self._sorted_runs:
+                lo, hi = self._narrow(start, stop, verse_from, verse_to)
+                if hi > lo:
+                    slices.append((lo, hi))
+            else:
+                slices.append((start, stop))
+                exact = False
+
+        slices.sort()
+        mask = self._metadata_mask(search_filter.metadata)
+        if mask is None and exact:
+            return Selection(slices=slices)
+
+        rows = Selection(slices=slices).row_ids()
+        keep = np.ones(len(rows), dtype=bool)
+        if mask is not None:
+            keep &= mask[rows]
+        if not exact:
+            # Unsorted runs: check verse overlap row by row
+            if verse_from is not None:
+                keep &= self.ends[rows] >= verse_from
+            if verse_to is not None:
+                keep &= self.starts[rows] <= verse_to
+        return Selection(rows=rows[keep])
+
+    def _metadata_mask(self, metadata: dict[str, Sequence[str]]) -> Optional[np.ndarray]:
+        mask: Optional[np.ndarray] = None
+        for name, allowed in metadata.items():
+            # No document carries the field (or it is not indexed): nothing matches
+            field_mask = np.zeros(self.size, dtype=bool)
+            for value in ([allowed] if isinstance(allowed, str) else allowed):
+                bitmap = self.bitmaps.get(name, {}).get(str(value))
+                if bitmap is not None:
+                    field_mask |= bitmap
+            mask = field_mask if mask is None else mask & field_mask
+        return mask
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "documents": self.size,
+            "suras": len(self.sura_runs),
+            "sura_runs": sum(len(runs) for runs in self.sura_runs.values()),
+            "bitmaps": {name: len(values) for name, values in self.bitmaps.items()},
+        }
@@ -0,0 +1,110 @@
+"""Russian lemmatization with a token -> lemma memo for lexical search"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+from collections import defaultdict
+from typing import Any, Iterable, Optional
+
+from .lexical import tokenize
+
+logger = logging.getLogger(__name__)
+
+_CYRILLIC_WORD = re.compile(r"^[а-я]+(?:-[а-я]+)*$")
+
+try:
+    import pymorphy3
+except ImportError:  # optional: pip install halal-ai-llm-service[hybrid]
+    pymorphy3 = None
+
+
+def pymorphy_available() -> bool:
+    return pymorphy3 is not None
+
+
+class Lemmatizer:
+    """Maps word tokens to their dictionary form («свинину» -> «свинина»).
+
+    pymorphy3 costs ~0.2 ms per analysis, so every result is memoised: the
+    whole corpus vocabulary is analysed once at index build time (`warm`) and
+    query tokens are dictionary lookups after their first occurrence. Only
+    Cyrillic words are analysed; numbers and Latin tokens pass through. The
+    memo stops growing at `cache_size` entries to bound memory under
+    adversarial queries. Without pymorphy3 tokens are returned unchanged.
+    """
+
+    def __init__(self, cache_size: int = 200_000):
+        self.cache_size = cache_size
+        self._memo: dict[str, str] = {}
+        self._morph = None
+        self.hits = 0
+        self.misses = 0
+        if pymorphy3 is not None:
+            self._morph = pymorphy3.MorphAnalyzer()
+        else:
+            logger.warning("pymorphy3 is not installed, lexical search will match inflected forms verbatim")
+
+    @property
+    def available(self) -> bool:
+        return self._morph is not None
+
+    def _analyze(self, token: str) -> str:
+        if self._morph is None or not _CYRILLIC_WORD.match(token):
+            return token
+        parses = self._morph.parse(token)
+        # Surname/patronymic readings («Свинин») hijack common nouns; use them
+        # only when the word has no other reading
+        common = [p for p in parses if not ({"Surn", "Patr"} & p.tag.grammemes)] or parses
+        # Parses sharing a normal form vote with their scores
+        votes: dict[str, float] = defaultdict(float)
+        for parse in common:
+            votes[parse.normal_form] += parse.score
+        return max(votes, key=votes.get).replace("ё", "е")
+
+    def lemma(self, token: str) -> str:
+        lemma = self._memo.get(token)
+        if lemma is not None:
+            self.hits += 1
+            return lemma
+        self.misses += 1
+        lemma = self._analyze(token)
+        if len(self._memo) < self.cache_size:
+            self._memo[token] = lemma
+        return lemma
+
+    def warm(self, tokens: Iterable[str]) -> int:
+        """Precompute lemmas for a vocabulary; returns the number of new entries"""
+        before = len(self._memo)
+        for token in set(tokens):
+            if token not in self._memo and len(self._memo) < self.cache_size:
+                self._memo[token] = self._analyze(token)
+        return len(self._memo) - before
+
+    def analyze(self, text: str) -> list[str]:
+        """Tokenize and lemmatize: the analyzer used by the BM25 index"""
+        return [self.lemma(token) for token in tokenize(text)]
+
+    def query_key(self, text: str) -> str:
+        """Inflection-insensitive key for caching per-query work"""
+        return " ".join(self.analyze(text))
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "available": self.available,
+            "memo_size": len(self._memo),
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_shared: Optional[Lemmatizer] = None
+
+
+def get_lemmatizer() -> Lemmatizer:
+    """Process-wide lemmatizer: the analyzer dictionaries and the memo are loaded once"""
+    global _shared
+    if _shared is None:
+        _shared = Lemmatizer(cache_size=int(os.getenv("RAG_LEMMA_CACHE_SIZE", "200000")))
+    return _shared
@@ -0,0 +1,227 @@
+"""Explicit scripture references in queries: «2:173», «сура 5 аят 90», «сура Аль-Бакара»"""
+
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Optional, Sequence
+
+from .lexical import tokenize
+from .metadata import verse_bounds
+
+MAX_SURA = 114
+
+# Transliterated sura names, index + 1 is the sura number
+SURA_NAMES = (
+    "Аль-Фатиха", "Аль-Бакара", "Аль Имран", "Ан-Ниса", "Аль-Маида", "Аль-Анам", "Аль-Араф",
+    "Аль-Анфаль", "Ат-Тауба", "Юнус", "Худ", "Юсуф", "Ар-Рад", "Ибрахим", "Аль-Хиджр", "Ан-Нахль",
+    "Аль-Исра", "Аль-Кахф", "Марьям", "Та Ха", "Аль-Анбия", "Аль-Хадж", "Аль-Муминун", "Ан-Нур",
+    "Аль-Фуркан", "Аш-Шуара", "Ан-Намль", "Аль-Касас", "Аль-Анкабут", "Ар-Рум", "Лукман",
+    "Ас-Саджда", "Аль-Ахзаб", "Саба", "Фатир", "Йа Син", "Ас-Саффат", "Сад", "Аз-Зумар", "Гафир",
+    "Фуссилат", "Аш-Шура", "Аз-Зухруф", "Ад-Духан", "Аль-Джасия", "Аль-Ахкаф", "Мухаммад",
+    "Аль-Фатх", "Аль-Худжурат", "Каф", "Аз-Зарият", "Ат-Тур", "Ан-Наджм", "Аль-Камар", "Ар-Рахман",
+    "Аль-Вакиа", "Аль-Хадид", "Аль-Муджадила", "Аль-Хашр", "Аль-Мумтахана", "Ас-Сафф",
+    "Аль-Джумуа", "Аль-Мунафикун", "Ат-Тагабун", "Ат-Талак", "Ат-Тахрим", "Аль-Мульк", "Аль-Калам",
+    "Аль-Хакка", "Аль-Мааридж", "Нух", "Аль-Джинн", "Аль-Муззаммиль", "Аль-Муддассир", "Аль-Кияма",
+    "Аль-Инсан", "Аль-Мурсалят", "Ан-Наба", "Ан-Назиат", "Абаса", "Ат-Таквир", "Аль-Инфитар",
+    "Аль-Мутаффифин", "Аль-Иншикак", "Аль-Бурудж", "Ат-Тарик", "Аль-Аля", "Аль-Гашия", "Аль-Фаджр",
+    "Аль-Балад", "Аш-Шамс", "Аль-Лайль", "Ад-Духа", "Аш-Шарх", "Ат-Тин", "Аль-Алак", "Аль-Кадр",
+    "Аль-Баййина", "Аз-Зальзаля", "Аль-Адият", "Аль-Кариа", "Ат-Такасур", "Аль-Аср", "Аль-Хумаза",
+    "Аль-Филь", "Курайш", "Аль-Маун", "Аль-Каусар", "Аль-Кафирун", "Ан-Наср", "Аль-Масад",
+    "Аль-Ихлас", "Аль-Фалак", "Ан-Нас",
+)
+
+# Alternative spellings and the Russian titles of the Kuliev translation. Titles such
+# as «Люди» or «Время» are everyday words, so names count only right after «сура»
+EXTRA_ALIASES = {
+    "Фатиха": 1, "Открывающая Коран": 1, "Бакара": 2, "Корова": 2, "Али Имран": 3, "Семейство Имрана": 3,
+    "Женщины": 4, "Трапеза": 5, "Скот": 6, "Преграды": 7, "Трофеи": 8, "Покаяние": 9, "Тауба": 9,
+    "Пчелы": 16, "Ночной перенос": 17, "Пещера": 18, "Мариам": 19, "Пророки": 21, "Хадж": 22,
+    "Верующие": 23, "Свет": 24, "Различение": 25, "Поэты": 26, "Муравьи": 27, "Рассказ": 28,
+    "Паук": 29, "Римляне": 30, "Земной поклон": 32, "Сонмы": 33, "Ясин": 36, "Я Син": 36,
+    "Толпы": 39, "Прощающий": 40, "Совет": 42, "Украшения": 43, "Дым": 44, "Победа": 48,
+    "Комнаты": 49, "Гора": 52, "Звезда": 53, "Месяц": 54, "Милостивый": 55, "Событие": 56,
+    "Железо": 57, "Сбор": 59, "Пятница": 62, "Лицемеры": 63, "Развод": 65, "Запрещение": 66,
+    "Власть": 67, "Письменная трость": 68, "Джинны": 72, "Человек": 76, "Весть": 78,
+    "Нахмурился": 80, "Заря": 89, "Город": 90, "Солнце": 91, "Ночь": 92, "Утро": 93,
+    "Смоковница": 95, "Сгусток": 96, "Предопределение": 97, "Ясное знамение": 98,
+    "Землетрясение": 99, "Время": 103, "Слон": 105, "Курейшиты": 106, "Изобилие": 108,
+    "Неверующие": 109, "Помощь": 110, "Пальмовые волокна": 111, "Искренность": 112,
+    "Очищение веры": 112, "Рассвет": 113, "Люди": 114,
+}
+
+_ARTICLE = re.compile(r"^а[лнстдзшр]ь?[\s-]+")
+_NON_LETTER = re.compile(r"[^а-я]")
+
+
+def normalize_name(name: str) -> str:
+    """Alias key: lowercase, no Arabic article, letters only («Аль-Бакара» -> «бакара»)"""
+    name = name.strip().lower().replace("ё", "е")
+    return _NON_LETTER.sub("", _ARTICLE.sub("", name))
+
+
+SURA_ALIASES: dict[str, int] = {normalize_name(name): i + 1 for i, name in enumerate(SURA_NAMES)}
+SURA_ALIASES.update({normalize_name(name): sura for name, sura in EXTRA_ALIASES.items()})
+_MAX_ALIAS_WORDS = max(len(name.replace("-", " ").split()) for name in (*SURA_NAMES, *EXTRA_ALIASES))
+
+# Whole words only: «ресурсы 5» and «перестихотворение» hold no reference
+_SURA_WORD = r"(?<![а-я])сур[а-я]*"
+_VERSE_WORD = r"(?<![а-я])(?:аят[а-я]*|стих[а-я]*)"
+_RANGE = r"(?:\s*[-–—]\s*(\d{1,3}))?"
+# 2:173, 5:90-93 without a sura word; accepted by _bare_reference()
+_BARE = re.compile(rf"\b(\d{{1,3}})\s*:\s*(\d{{1,3}}){_RANGE}(?![:\d])")
+# Quran vocabulary that makes a bare «10:30» read as a verse, not a clock time
+_CONTEXT = re.compile(rf"{_SURA_WORD}|{_VERSE_WORD}|коран")
+# «в 10:30», «до 05:45»: a preposition of time right before it settles it as a time
+_TIME_PREPOSITION = re.compile(r"\b(?:в|во|до|после|с|со|к|около|от|между|на)\s*$")
+_NUMERIC = [
+    # сура 2:173
+    (re.compile(rf"{_SURA_WORD}\s+(\d{{1,3}})\s*:\s*(\d{{1,3}}){_RANGE}"), (1, 2, 3)),
+    # сура 5 аят 90, суры 5, аяты 90-93
+    (re.compile(rf"{_SURA_WORD}\s+(\d{{1,3}})[\s,]+{_VERSE_WORD}\s+(\d{{1,3}}){_RANGE}"), (1, 2, 3)),
+    # 90 аят суры 5, аят 90 суры 5
+    (re.compile(rf"(?:\b(\d{{1,3}})\s*(?:-?[а-я]{{1,2}}\s+)?{_VERSE_WORD}|{_VERSE_WORD}\s+(\d{{1,3}}))\s+{_SURA_WORD}\s+(\d{{1,3}})"), None),
+    # сура 112
+    (re.compile(rf"{_SURA_WORD}\s+(\d{{1,3}})\b"), (1, None, None)),
+]
+_NAMED = re.compile(rf"{_SURA_WORD}\s+((?:[а-я]+[\s-]+){{0,{_MAX_ALIAS_WORDS - 1}}}[а-я]+)")
+_NAMED_VERSE = re.compile(rf"(?:\s*:\s*|[\s,]+{_VERSE_WORD}\s+)(\d{{1,3}}){_RANGE}")
+
+# Words that may surround a reference without making the query semantic
+_FILLER = {"и", "а", "также", "из", "в", "коран", "корана", "покажи", "прочитай", "открой", "текст"}
+
+
+@dataclass(frozen=True)
+class VerseRef:
+    """A sura with an optional verse range; verse_from None means the whole sura"""
+
+    sura: int
+    verse_from: Optional[int] = None
+    verse_to: Optional[int] = None
+
+
+@dataclass
+class ParsedQuery:
+    """References found in a query and the text left after removing them"""
+
+    refs: list[VerseRef] = field(default_factory=list)
+    remainder: str = ""
+
+    @property
+    def is_pure(self) -> bool:
+        """Nothing but references (and filler words): the semantic search can be skipped"""
+        return bool(self.refs) and _only_filler(self.remainder)
+
+
+def _only_filler(text: str) -> bool:
+    return all(t in _FILLER or t.isdigit() or t.startswith(("сур", "аят", "стих")) for t in tokenize(text))
+
+
+def _bare_reference(match: re.Match, text: str, context: bool) -> bool:
+    """Whether a bare «N:M» is a verse reference.
+
+    «2:173» and «5:90-93» cannot be clock times and are taken as they are;
+    «10:30» could be either: it is a time after «в», «до», ..., and otherwise
+    counts only when the query talks about suras, verses or the Quran, or is
+    nothing but the reference.
+    """
+    hours, minutes, range_end = match.groups()
+    if range_end is not None or len(minutes) != 2 or int(hours) > 23 or int(minutes) > 59:
+        return True
+    if _TIME_PREPOSITION.search(text, 0, match.start()):
+        return False
+    return context or _only_filler(text[:match.start()] + " " + text[match.end():])
+
+
+def _ref(sura: str, verse_from: Optional[str], verse_to: Optional[str]) -> Optional[VerseRef]:
+    sura_n = int(sura)
+    if not 1 <= sura_n <= MAX_SURA:
+        return None
+    if verse_from is None:
+        return VerseRef(sura_n)
+    start = int(verse_from)
+    end = int(verse_to) if verse_to else start
+    return VerseRef(sura_n, min(start, end), max(start, end))
+
+
+def parse_references(query: str) -> ParsedQuery:
+    """Find explicit references; spans are removed from the text so each is parsed once"""
+    text = query.lower().replace("ё", "е")
+    refs: list[VerseRef] = []
+
+    def take(match: re.Match, ref: Optional[VerseRef]) -> str:
+        if ref is not None and ref not in refs:
+            refs.append(ref)
+        return " "
+
+    for pattern, groups in _NUMERIC:
+        if groups is None:
+            text = pattern.sub(lambda m: take(m, _ref(m.group(3), m.group(1) or m.group(2), None)), text)
+        else:
+            text = pattern.sub(
+                lambda m: take(m, _ref(*(m.group(g) if g else None for g in groups))), text
+            )
+    context = bool(_CONTEXT.search(query.lower()))
+    text = _BARE.sub(lambda m: take(m, _ref(*m.groups())) if _bare_reference(m, text, context) else m.group(), text)
+
+    for match in list(_NAMED.finditer(text)):
+        words = re.split(r"[\s-]+", match.group(1))
+        # Longest alias first: «семейство имрана» before «семейство»
+        for n in range(len(words), 0, -1):
+            sura = SURA_ALIASES.get(normalize_name(" ".join(words[:n])))
+            if sura is None:
+                continue
+            name_end = match.start(1) + _span_of_words(match.group(1), n)
+            verse = _NAMED_VERSE.match(text, name_end)
+            stop = verse.end() if verse else name_end
+            ref = _ref(str(sura), verse.group(1), verse.group(2)) if verse else VerseRef(sura)
+            if ref not in refs:
+                refs.append(ref)
+            text = text[:match.start()] + " " * (stop - match.start()) + text[stop:]
+            break
+
+    return ParsedQuery(refs=refs, remainder=" ".join(text.split()))
+
+
+def _span_of_words(text: str, n: int) -> int:
+    """Length of the prefix of `text` holding its first n words"""
+    matches = list(re.finditer(r"[а-я]+", text))
+    return matches[n - 1].end()
+
+
+class VerseLookup:
+    """(sura, verse) -> store rows, built once from the documents.
+
+    Documents covering a verse range (chunks) are listed under every verse
+    they cover, and documents from several corpora share a key.
+    """
+
+    def __init__(self, documents: Sequence[dict[str, Any]]):
+        self._rows: dict[tuple[int, int], list[int]] = defaultdict(list)
+        self._suras: dict[int, list[int]] = defaultdict(list)
+        for row, doc in enumerate(documents):
+            try:
+                sura = int(doc.get("sura"))
+            except (TypeError, ValueError):
+                continue
+            first, last = verse_bounds(doc)
+            if first < 0:
+                continue
+            self._suras[sura].append(row)
+            for verse in range(first, last + 1):
+                self._rows[(sura, verse)].append(row)
+
+    def rows(self, ref: VerseRef, limit: Optional[int] = None) -> list[int]:
+        """Rows of the referenced verses in verse order (whole sura: from its first verse)"""
+        if ref.verse_from is None:
+            rows = self._suras.get(ref.sura, [])
+        else:
+            rows = []
+            for verse in range(ref.verse_from, ref.verse_to + 1):
+                for row in self._rows.get((ref.sura, verse), ()):
+                    if row not in rows:
+                        rows.append(row)
+                if limit is not None and len(rows) >= limit:
+                    break
+        return rows[:limit] if limit is not None else list(rows)
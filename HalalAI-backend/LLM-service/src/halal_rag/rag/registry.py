@@ -0,0 +1,269 @@
+"""Named corpora served from one process: one shared encoder, per-corpus sharded indexes"""
+
+from __future__ import annotations
+
+import json
+import logging
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence
+
+import numpy as np
+import torch
+
+from halal_rag.observability.metrics import cache_lookup
+from halal_rag.observability.tracing import span
+
+from .diversity import mmr_order, relevance_of
+from .interfaces import IEmbeddingEncoder, IRAGPipeline
+from .lexical import reciprocal_rank_fusion
+from .metadata import SearchFilter, document_order_key
+
+logger = logging.getLogger(__name__)
+
+
+class SharedEncoder(IEmbeddingEncoder):
+    """One loaded encoder for every corpus and shard.
+
+    A search fans out to several shards with the same query text; the last
+    few query embeddings are memoised so the transformer runs once per query.
+    """
+
+    def __init__(self, encoder: IEmbeddingEncoder, cache_size: int = 64):
+        self.encoder = encoder
+        self.cache_size = cache_size
+        self._queries: OrderedDict[str, torch.Tensor] = OrderedDict()
+        # Retrieval threads share the memo; the encoder itself runs unlocked
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        return getattr(self.encoder, "model", None)
+
+    def encode(self, texts: list[str]) -> torch.Tensor:
+        return self.encoder.encode(texts)
+
+    def encode_single(self, text: str) -> torch.Tensor:
+        with span("cache_lookup", cache="query_embedding") as lookup:
+            with self._lock:
+                vector = self._queries.get(text)
+                if vector is not None:
+                    self._queries.move_to_end(text)
+            if lookup is not None:
+                lookup.set_attribute("hit", vector is not None)
+        cache_lookup("query_embedding", vector is not None)
+        if vector is None:
+            vector = self.encoder.encode_single(text)
+            with self._lock:
+                self._queries[text] = vector
+                while len(self._queries) > self.cache_size:
+                    self._queries.popitem(last=False)
+        return vector
+
+
+@dataclass
+class CorpusSpec:
+    """A corpus to load: JSONL file with one document per line"""
+
+    name: str
+    path: Path
+    shards: int = 1
+
+
+def parse_corpora(value: str, default_shards: int = 1) -> list[CorpusSpec]:
+    """RAG_CORPORA format: "quran_ru=data/quran_ru.jsonl,hadith=data/hadith.jsonl:4" (":N" = shards)"""
+    specs = []
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, location = item.partition("=")
+        path, shards = location, default_shards
+        head, sep, tail = location.rpartition(":")
+        if sep and tail.isdigit():
+            path, shards = head, int(tail)
+        specs.append(CorpusSpec(name=name.strip(), path=Path(path.strip()), shards=max(1, shards)))
+    return specs
+
+
+def load_jsonl(path: Path) -> list[dict[str, Any]]:
+    if not path.exists():
+        raise FileNotFoundError(f"Corpus data not found at {path}")
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def shard_documents(documents: Sequence[dict[str, Any]], shards: int) -> list[list[dict[str, Any]]]:
+    """Split into contiguous shards of about equal size without splitting a sura"""
+    ordered = sorted(documents, key=document_order_key)
+    if shards <= 1 or len(ordered) <= 1:
+        return [ordered]
+    target = len(ordered) / shards
+    parts: list[list[dict[str, Any]]] = [[]]
+    for i, doc in enumerate(ordered):
+        # i documents are already placed; open the next shard at a sura boundary once this one is full
+        boundary = i and doc.get("sura") != ordered[i - 1].get("sura")
+        if boundary and len(parts) < shards and i >= target * len(parts):
+            parts.append([])
+        parts[-1].append(doc)
+    return parts
+
+
+def merge_ranked(hits: Sequence[dict[str, Any]], rrf_k: int = 60) -> list[tuple[int, dict[str, Any]]]:
+    """Order hits from several shards as a single index would: (position in `hits`, hit) pairs.
+
+    Cross-encoder and cosine scores are comparable across shards and sort
+    directly. Fused scores are not: each shard's RRF reflects its own ranks,
+    so hybrid hits are fused again over the merged dense and BM25 rankings.
+    """
+    positions = range(len(hits))
+    if hits and all("rerank_score" in doc for doc in hits):
+        return [(i, hits[i]) for i in sorted(positions, key=lambda i: hits[i]["rerank_score"], reverse=True)]
+    if hits and all("rrf_score" in doc for doc in hits):
+        dense = sorted(positions, key=lambda i: hits[i]["score"], reverse=True)
+        lexical = sorted(
+            (i for i in positions if hits[i].get("bm25_score", 0.0) > 0), key=lambda i: hits[i]["bm25_score"], reverse=True
+        )
+        return [(i, {**hits[i], "rrf_score": fused}) for i, fused in reciprocal_rank_fusion([dense, lexical], k=rrf_k)]
+    return [(i, hits[i]) for i in sorted(positions, key=lambda i: hits[i].get("score", 0.0), reverse=True)]
+
+
+class IndexRegistry(IRAGPipeline):
+    """Routes searches to named corpora, each a list of shard pipelines.
+
+    Requests pick corpora through the `corpus` metadata filter; the names
+    are consumed here, so documents need not carry the field. Without one
+    the `default` corpora are searched. Shard results are merged as one
+    ranking (`merge_ranked`); MMR then runs once over the merged pool.
+    """
+
+    def __init__(self, embeddings: Optional[IEmbeddingEncoder] = None, default: Optional[Sequence[str]] = None):
+        self.embeddings = embeddings
+        self.corpora: "OrderedDict[str, list[IRAGPipeline]]" = OrderedDict()
+        self.default = list(default) if default else None
+
+    def add(self, name: str, shards: Sequence[IRAGPipeline]) -> None:
+        self.corpora[name] = list(shards)
+
+    def pipelines(self) -> list[IRAGPipeline]:
+        return [shard for shards in self.corpora.values() for shard in shards]
+
+    @classmethod
+    def build(
+        cls,
+        specs: Sequence[CorpusSpec],
+        pipeline_factory: Callable[[list[dict[str, Any]], IEmbeddingEncoder], IRAGPipeline],
+        encoder: IEmbeddingEncoder,
+        default: Optional[Sequence[str]] = None,
+        loader: Optional[Callable[[Path], list[dict[str, Any]]]] = None,
+    ) -> "IndexRegistry":
+        loader = loader or load_jsonl
+        registry = cls(encoder if isinstance(encoder, SharedEncoder) else SharedEncoder(encoder), default)
+        for spec in specs:
+            documents = loader(spec.path)
+            for doc in documents:
+                doc.setdefault("corpus", spec.name)
+            shards = [pipeline_factory(part, registry.embeddings) for part in shard_documents(documents, spec.shards)]
+            registry.add(spec.name, shards)
+            logger.info(
+                "✓ Corpus loaded", extra={"corpus": spec.name, "documents": len(documents), "shards": len(shards)}
+            )
+        return registry
+
+    def route(self, search_filter: Optional[SearchFilter]) -> tuple[list[str], Optional[SearchFilter]]:
+        """Corpora to search and the filter to pass to their shards"""
+        requested = (search_filter.metadata.get("corpus") if search_filter else None) or []
+        requested = [requested] if isinstance(requested, str) else list(requested)
+        names = [name for name in requested if name in self.corpora] if requested else (
+            [name for name in self.default if name in self.corpora] if self.default else list(self.corpora)
+        )
+        if search_filter is not None and "corpus" in search_filter.metadata:
+            metadata = {k: v for k, v in search_filter.metadata.items() if k != "corpus"}
+            search_filter = replace(search_filter, metadata=metadata)
+            if search_filter.is_empty():
+                search_filter = None
+        return names, search_filter
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 3,
+        search_filter: Optional[SearchFilter] = None,
+        mmr_lambda: Optional[float] = None,
+        context_window: Optional[int] = None,
+    ) -> list[dict[str, Any]]:
+        names, shard_filter = self.route(search_filter)
+        shards = [shard for name in names for shard in self.corpora[name]]
+        if len(shards) == 1:
+            return shards[0].search(
+                query, top_k=top_k, search_filter=shard_filter, mmr_lambda=mmr_lambda, context_window=context_window
+            )
+        lambda_ = mmr_lambda if mmr_lambda is not None else getattr(shards[0], "mmr_lambda", None)
+        pool_k = top_k if lambda_ is None else max(top_k, getattr(shards[0], "mmr_pool", top_k))
+        # Shards return their pool by relevance alone (lambda 1.0); diversity is decided over the merged pool
+        shard_lambda = None if lambda_ is None else 1.0
+        pinned: list[dict[str, Any]] = []
+        hits: list[dict[str, Any]] = []
+        owners: list[IRAGPipeline] = []
+        for shard in shards:
+            for doc in shard.search(
+                query, top_k=pool_k, search_filter=shard_filter, mmr_lambda=shard_lambda, context_window=context_window
+            ):
+                if doc.get("match") == "reference":
+                    pinned.append(doc)
+                else:
+                    hits.append(doc)
+                    owners.append(shard)
+        ranked = merge_ranked(hits, rrf_k=getattr(shards[0], "rrf_k", 60))
+        if lambda_ is not None and len(ranked) > 1:
+            # Stored embeddings of the merged pool, gathered from each hit's own shard
+            vectors = np.stack([owners[i].store.vectors([doc["doc_id"]])[0] for i, doc in ranked])
+            candidates = [doc for _, doc in ranked]
+            order = mmr_order(relevance_of(candidates), vectors, top_k - len(pinned), lambda_)
+            return pinned[:top_k] + [candidates[i] for i in order]
+        return (pinned + [doc for _, doc in ranked])[:top_k]
+
+    def stats(self) -> dict[str, Any]:
+        """Documents, shards and resident index memory per corpus"""
+        corpora = {}
+        for name, shards in self.corpora.items():
+            memory: dict[str, int] = {}
+            documents = 0
+            for shard in shards:
+                documents += len(getattr(getattr(shard, "store", None), "documents", []))
+                for part, size in memory_usage(shard).items():
+                    memory[part] = memory.get(part, 0) + size
+            corpora[name] = {
+                "documents": documents,
+                "shards": len(shards),
+                "memory_bytes": memory,
+                "memory_bytes_total": sum(memory.values()),
+            }
+        return {"corpora": corpora, "default": self.default or list(self.corpora)}
+
+
+def _tensor_bytes(tensor: Optional[torch.Tensor]) -> int:
+    return 0 if tensor is None else tensor.element_size() * tensor.nelement()
+
+
+def memory_usage(pipeline: Any) -> dict[str, int]:
+    """Approximate resident bytes of one pipeline's index structures (the shared encoder excluded)"""
+    store = getattr(pipeline, "store", None)
+    # The whole embedding buffer, rows reserved for appends included
+    buffer = getattr(store, "_buffer", None)
+    usage = {"embeddings": _tensor_bytes(buffer if buffer is not None else getattr(store, "embeddings", None))}
+    # Shallow size of the document dicts plus their texts
+    documents = getattr(store, "documents", [])
+    usage["documents"] = sum(sys.getsizeof(doc) + sys.getsizeof(doc.get("text", "")) for doc in documents)
+    lexical = getattr(pipeline, "lexical", None)
+    if lexical is not None:
+        usage["lexical"] = int(
+            sum(p.nbytes for p in lexical.postings_docs) + sum(p.nbytes for p in lexical.postings_weights)
+        )
+    metadata = getattr(store, "metadata", None)
+    if metadata is not None:
+        usage["metadata"] = int(
+            metadata.starts.nbytes + metadata.ends.nbytes
+            + sum(b.nbytes for values in metadata.bitmaps.values() for b in values.values())
+        )
+    return usage
@@ -0,0 +1,223 @@
+"""Second-stage cross-encoder reranking under a per-request latency budget"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Sequence
+
+from halal_rag.observability.metrics import cache_lookup
+
+from .interfaces import IPassageScorer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RERANK_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+
+def rerank_enabled() -> bool:
+    return os.getenv("RAG_RERANK", "false").strip().lower() in ("1", "true", "yes", "on")
+
+
+class CrossEncoderScorer(IPassageScorer):
+    """sentence-transformers CrossEncoder, loaded on first use"""
+
+    def __init__(self, model_name: str = DEFAULT_RERANK_MODEL, max_length: int = 256):
+        self.model_name = model_name
+        self.max_length = max_length
+        self._model = None
+
+    def _load(self):
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+
+            try:
+                self._model = CrossEncoder(
+                    self.model_name, device="cpu", max_length=self.max_length, local_files_only=True
+                )
+            except Exception:
+                logger.info("Downloading rerank model", extra={"model": self.model_name})
+                self._model = CrossEncoder(self.model_name, device="cpu", max_length=self.max_length)
+        return self._model
+
+    def score(self, query: str, passages: Sequence[str]) -> list[float]:
+        if not passages:
+            return []
+        scores = self._load().predict(
+            [(query, passage) for passage in passages], batch_size=len(passages), show_progress_bar=False
+        )
+        return [float(s) for s in scores]
+
+
+class PairCostModel:
+    """Running estimate of cross-encoder latency: fixed cost per batch plus cost per pair.
+
+    Both terms are exponentially weighted averages fitted from observed
+    batches, so the candidate count follows the actual hardware and load.
+    """
+
+    def __init__(self, pair_ms: float = 4.0, batch_ms: float = 2.0, alpha: float = 0.2):
+        self.pair_ms = pair_ms
+        self.batch_ms = batch_ms
+        self.alpha = alpha
+
+    def predict(self, pairs: int, batch_size: int) -> float:
+        if pairs <= 0:
+            return 0.0
+        batches = -(-pairs // batch_size)
+        return batches * self.batch_ms + pairs * self.pair_ms
+
+    def affordable(self, budget_ms: float, batch_size: int) -> int:
+        """Largest number of pairs predicted to fit in the budget"""
+        per_batch = self.batch_ms + batch_size * self.pair_ms
+        full = int(budget_ms // per_batch)
+        left = budget_ms - full * per_batch - self.batch_ms
+        return full * batch_size + max(0, min(batch_size - 1, int(left // self.pair_ms)))
+
+    def observe(self, pairs: int, elapsed_ms: float) -> None:
+        if pairs <= 0:
+            return
+        per_pair = max(0.0, elapsed_ms - self.batch_ms) / pairs
+        self.pair_ms += self.alpha * (per_pair - self.pair_ms)
+
+
+class Reranker:
+    """Reorders first-stage candidates by cross-encoder relevance.
+
+    Given candidates in first-stage order, the top N are rescored where N is
+    the largest count whose predicted cost fits `budget_ms` (clamped to
+    [`min_candidates`, `max_candidates`]). Pairs already in the score cache
+    cost nothing and are always included. Uncached pairs are scored in
+    batches of `batch_size`; if the deadline is reached mid-way the remaining
+    candidates keep their first-stage order after the rescored ones.
+    """
+
+    def __init__(
+        self,
+        scorer: IPassageScorer,
+        budget_ms: float = 150.0,
+        max_candidates: int = 20,
+        min_candidates: int = 3,
+        batch_size: int = 8,
+        cache_size: int = 10_000,
+        query_key: Optional[Callable[[str], str]] = None,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.scorer = scorer
+        self.budget_ms = budget_ms
+        self.max_candidates = max_candidates
+        self.min_candidates = min_candidates
+        self.batch_size = max(1, batch_size)
+        self.cache_size = cache_size
+        self.query_key = query_key or (lambda q: " ".join(q.lower().split()))
+        self.clock = clock
+        self.cost = PairCostModel()
+        self._cache: OrderedDict[tuple[str, int], float] = OrderedDict()
+        # Searches run in worker threads and share the cache
+        self._cache_lock = threading.Lock()
+        self.requests = 0
+        self.pairs_scored = 0
+        self.cache_hits = 0
+        self.budget_cuts = 0
+
+    @classmethod
+    def from_env(cls, query_key: Optional[Callable[[str], str]] = None) -> Optional["Reranker"]:
+        """RAG_RERANK=true enables reranking; None otherwise"""
+        if not rerank_enabled():
+            return None
+        return cls(
+            CrossEncoderScorer(os.getenv("RAG_RERANK_MODEL", DEFAULT_RERANK_MODEL)),
+            budget_ms=float(os.getenv("RAG_RERANK_BUDGET_MS", "150")),
+            max_candidates=int(os.getenv("RAG_RERANK_CANDIDATES", "20")),
+            batch_size=int(os.getenv("RAG_RERANK_BATCH", "8")),
+            cache_size=int(os.getenv("RAG_RERANK_CACHE_SIZE", "10000")),
+            query_key=query_key,
+        )
+
+    def _cached(self, key: tuple[str, int]) -> Optional[float]:
+        with self._cache_lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _store(self, key: tuple[str, int], score: float) -> None:
+        with self._cache_lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def plan(self, keys: Sequence[tuple[str, int]], budget_ms: float) -> list[int]:
+        """Indices of the candidates to rescore, in first-stage order"""
+        limit = min(len(keys), self.max_candidates)
+        affordable = max(self.min_candidates, self.cost.affordable(budget_ms, self.batch_size))
+        chosen, uncached = [], 0
+        for i in range(limit):
+            if keys[i] in self._cache:
+                chosen.append(i)
+            elif uncached < affordable:
+                chosen.append(i)
+                uncached += 1
+        return chosen
+
+    def rerank(
+        self, query: str, candidates: Sequence[dict[str, Any]], top_k: int, budget_ms: Optional[float] = None
+    ) -> list[dict[str, Any]]:
+        if not candidates:
+            return []
+        self.requests += 1
+        budget = self.budget_ms if budget_ms is None else budget_ms
+        started = self.clock()
+        query_key = self.query_key(query)
+        keys = [(query_key, hash(doc["text"])) for doc in candidates]
+
+        scores: dict[int, float] = {}
+        pending = []
+        for i in self.plan(keys, budget):
+            cached = self._cached(keys[i])
+            if cached is not None:
+                scores[i] = cached
+                self.cache_hits += 1
+            else:
+                pending.append(i)
+        cache_lookup("rerank", True, len(scores))
+        cache_lookup("rerank", False, len(pending))
+
+        for offset in range(0, len(pending), self.batch_size):
+            batch = pending[offset:offset + self.batch_size]
+            elapsed = (self.clock() - started) * 1000
+            # The first batch always runs: min_candidates is a floor, not a wish
+            if offset and elapsed + self.cost.predict(len(batch), self.batch_size) > budget:
+                self.budget_cuts += 1
+                break
+            batch_started = self.clock()
+            batch_scores = self.scorer.score(query, [candidates[i]["text"] for i in batch])
+            self.cost.observe(len(batch), (self.clock() - batch_started) * 1000)
+            self.pairs_scored += len(batch)
+            for i, score in zip(batch, batch_scores):
+                scores[i] = score
+                self._store(keys[i], score)
+
+        rescored = sorted(scores, key=lambda i: scores[i], reverse=True)
+        order = rescored + [i for i in range(len(candidates)) if i not in scores]
+        results = []
+        for i in order[:top_k]:
+            doc = dict(candidates[i])
+            if i in scores:
+                doc["rerank_score"] = scores[i]
+            results.append(doc)
+        return results
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "pairs_scored": self.pairs_scored,
+            "cache_hits": self.cache_hits,
+            "cache_size": len(self._cache),
+            "budget_cuts": self.budget_cuts,
+            "pair_ms": round(self.cost.pair_ms, 3),
+        }
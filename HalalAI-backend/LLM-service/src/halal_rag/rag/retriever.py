@@ -1,9 +1,37 @@
+import os
+from dataclasses import replace
+from typing import Any, Callable, Optional
 
-from typing import Any
+import numpy as np
 
+from halal_rag.observability.metrics import timed
+
+from .adjacency import VerseAdjacency
+from .diversity import mmr_order, relevance_of
 from .embeddings import EmbeddingModel
+from .expansion import QueryExpander
+from .lexical import BM25Index, reciprocal_rank_fusion, tokenize
+from .metadata import SearchFilter, document_order_key
+from .morphology import get_lemmatizer
+from .references import ParsedQuery, VerseLookup, parse_references
+from .rerank import Reranker
 from .vector_store import VectorStore
-from .interfaces import IRAGPipeline, IEmbeddingEncoder, IVectorSearcher
+from .interfaces import IRAGPipeline, IEmbeddingEncoder, ILexicalSearcher, IVectorSearcher
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ("0", "false", "no", "off")
+
+
+def lemma_query_key(lemmatize: Optional[bool] = None) -> Optional[Callable[[str], str]]:
+    """Inflection-insensitive cache key for per-query work (RAG_LEMMATIZE and pymorphy3), None otherwise"""
+    if not (lemmatize if lemmatize is not None else _env_flag("RAG_LEMMATIZE", True)):
+        return None
+    lemmatizer = get_lemmatizer()
+    return lemmatizer.query_key if lemmatizer.available else None
 
 
 class SimpleRAG(IRAGPipeline):
@@ -12,20 +40,184 @@ class SimpleRAG(IRAGPipeline):
         documents: list[dict[str, Any]],
         model_type: str = "paraphrase",  # "paraphrase" или "sbert"
         use_finetuned: bool = False,
+        hybrid: Optional[bool] = None,
+        rrf_k: Optional[int] = None,
+        candidates: Optional[int] = None,
+        lemmatize: Optional[bool] = None,
+        reranker: Optional[Reranker] = None,
+        mmr_lambda: Optional[float] = None,
+        mmr_pool: Optional[int] = None,
+        context_window: Optional[int] = None,
+        references: Optional[bool] = None,
+        expander: Optional[QueryExpander] = None,
+        embeddings: Optional[IEmbeddingEncoder] = None,
     ):
 
-        self.embeddings: IEmbeddingEncoder = EmbeddingModel(model_type=model_type, use_finetuned=use_finetuned)
+        # An encoder shared between pipelines (one per corpus or shard) is loaded once
+        self.embeddings: IEmbeddingEncoder = embeddings or EmbeddingModel(
+            model_type=model_type, use_finetuned=use_finetuned
+        )
         self.store: IVectorSearcher = VectorStore()
 
+        # Rows grouped by sura, verses ascending: filters resolve to contiguous slices
+        documents = sorted(documents, key=document_order_key)
         texts = [doc['text'] for doc in documents]
         embeddings = self.embeddings.encode(texts)
 
         self.store.add_documents(documents, embeddings)
+        # Neighbouring verses come from the same index: no separate chunk embeddings
+        self.adjacency = VerseAdjacency(self.store.documents)
+        self.context_window = context_window if context_window is not None else int(
+            os.getenv("RAG_CONTEXT_WINDOW", "0")
+        )
+        # Explicit references («2:173», «сура Аль-Бакара») resolve by dictionary lookup
+        self.references = references if references is not None else _env_flag("RAG_REFERENCES", True)
+        self.verse_lookup = VerseLookup(self.store.documents)
+        # Synonym expansion of colloquial terms (RAG_EXPANSION); synonym vectors are encoded here, once
+        self.expander = expander if expander is not None else QueryExpander.from_env(self.embeddings)
 
-    def search(self, query: str, top_k: int = 3) -> list[dict[str, Any]]:
+        # Lexical BM25 path fused with the dense one; opt-in (RAG_HYBRID=true), it changes the ranking
+        self.hybrid = hybrid if hybrid is not None else _env_flag("RAG_HYBRID", False)
+        self.rrf_k = rrf_k or int(os.getenv("RAG_RRF_K", "60"))
+        self.candidates = candidates or int(os.getenv("RAG_HYBRID_CANDIDATES", "50"))
+        self.lexical: Optional[ILexicalSearcher] = None
+        query_key = None
+        if self.hybrid:
+            analyzer = tokenize
+            if lemmatize if lemmatize is not None else _env_flag("RAG_LEMMATIZE", True):
+                lemmatizer = get_lemmatizer()
+                if lemmatizer.available:
+                    # Analyse every distinct corpus word once, before indexing
+                    lemmatizer.warm(token for text in texts for token in tokenize(text))
+                    analyzer = lemmatizer.analyze
+                    query_key = lemmatizer.query_key
+            self.lexical = BM25Index(analyzer=analyzer)
+            self.lexical.add_documents(texts)
+
+        # Optional cross-encoder stage over the first-stage candidates (RAG_RERANK);
+        # inflections of one query share rerank cache entries when lemmatizing
+        self.reranker = reranker if reranker is not None else Reranker.from_env(query_key=query_key)
+
+        # Default MMR trade-off for search() (RAG_MMR_LAMBDA unset: no diversification)
+        env_lambda = os.getenv("RAG_MMR_LAMBDA")
+        self.mmr_lambda = mmr_lambda if mmr_lambda is not None else (float(env_lambda) if env_lambda else None)
+        self.mmr_pool = mmr_pool or int(os.getenv("RAG_MMR_POOL", "20"))
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 3,
+        search_filter: Optional[SearchFilter] = None,
+        mmr_lambda: Optional[float] = None,
+        context_window: Optional[int] = None,
+    ) -> list[dict[str, Any]]:
         if not query or not query.strip():
             return []
+        radius = context_window if context_window is not None else self.context_window
+
+        parsed = parse_references(query) if self.references else ParsedQuery()
+        exact = self.reference_hits(parsed, top_k, search_filter)
+        if parsed.is_pure:
+            # Nothing but references: no embedding, no index scan
+            return self.adjacency.expand(exact, radius)
+
+        if parsed.refs and not (search_filter and search_filter.suras):
+            # «о посте в суре Аль-Бакара»: search within the named suras
+            suras = [ref.sura for ref in parsed.refs if ref.verse_from is None]
+            if suras:
+                search_filter = replace(search_filter or SearchFilter(), suras=suras)
+
+        hits = self._semantic_search(query, top_k, search_filter, mmr_lambda)
+        if exact:
+            seen = {doc['doc_id'] for doc in exact}
+            hits = (exact + [doc for doc in hits if doc['doc_id'] not in seen])[:top_k]
+        return self.adjacency.expand(hits, radius)
+
+    def reference_hits(
+        self, parsed: ParsedQuery, top_k: int, search_filter: Optional[SearchFilter] = None
+    ) -> list[dict[str, Any]]:
+        """Documents named by explicit references, in reference order.
+
+        Whole-sura references yield the sura's opening verses only when the
+        query is nothing but references; otherwise they narrow the search.
+        """
+        selection = self.store.select(search_filter)
+        allowed = None if selection is None else set(selection.row_ids().tolist())
+        hits: list[dict[str, Any]] = []
+        seen: set[int] = set()
+        for ref in parsed.refs:
+            if ref.verse_from is None and not parsed.is_pure:
+                continue
+            for row in self.verse_lookup.rows(ref, limit=top_k):
+                if row in seen or (allowed is not None and row not in allowed):
+                    continue
+                seen.add(row)
+                doc = self.store.documents[row].copy()
+                doc.update(score=1.0, doc_id=row, match='reference')
+                hits.append(doc)
+        return hits[:top_k]
+
+    def _semantic_search(
+        self, query: str, top_k: int, search_filter: Optional[SearchFilter], mmr_lambda: Optional[float]
+    ) -> list[dict[str, Any]]:
+        """Dense or hybrid first stage, then the optional rerank and MMR stages"""
+        with timed("encode"):
+            if self.expander is None:
+                query_embedding = self.embeddings.encode_single(query)
+                lexical_query = query
+            else:
+                query_embedding = self.expander.query_vectors(query)
+                lexical_query = self.expander.lexical_query(query)
+        mmr_lambda = mmr_lambda if mmr_lambda is not None else self.mmr_lambda
+
+        # Reranking and MMR both work on a wider candidate pool than top_k
+        pool_k = top_k if mmr_lambda is None else max(top_k, self.mmr_pool)
+        first_k = pool_k if self.reranker is None else max(pool_k, self.reranker.max_candidates)
+        with timed("search"):
+            if self.lexical is None:
+                candidates = self.store.search(query_embedding, top_k=first_k, search_filter=search_filter)
+            else:
+                candidates = self._hybrid_search(lexical_query, query_embedding, first_k, search_filter)
+        if self.reranker is not None:
+            with timed("rerank"):
+                candidates = self.reranker.rerank(query, candidates, pool_k)
+        return candidates[:top_k] if mmr_lambda is None else self.diversify(candidates, top_k, mmr_lambda)
+
+    def diversify(self, candidates: list[dict[str, Any]], top_k: int, mmr_lambda: float) -> list[dict[str, Any]]:
+        """Pick top_k candidates by maximal marginal relevance over their stored embeddings"""
+        if len(candidates) <= 1:
+            return candidates[:top_k]
+        vectors = self.store.vectors([doc['doc_id'] for doc in candidates])
+        order = mmr_order(relevance_of(candidates), vectors, top_k, mmr_lambda)
+        return [candidates[i] for i in order]
+
+    def _hybrid_search(
+        self, query: str, query_embedding, top_k: int, search_filter: Optional[SearchFilter] = None
+    ) -> list[dict[str, Any]]:
+        """Reciprocal-rank fusion of the dense and BM25 candidate lists.
+
+        `score` stays the cosine similarity so downstream thresholds keep their
+        meaning; the fused and lexical scores are reported alongside it.
+        """
+        documents = self.store.documents
+        dense_scores, rows = self.store.scores_for(query_embedding, self.store.select(search_filter))
+        if not len(dense_scores):
+            return []
 
-        query_embedding = self.embeddings.encode_single(query)
+        n = min(max(self.candidates, top_k), len(dense_scores))
+        positions = dense_scores.topk(n).indices.tolist()
+        dense = positions if rows is None else [int(rows[p]) for p in positions]
+        lexical = self.lexical.search(query, top_k=n, rows=rows)
+        bm25 = dict(lexical)
 
-        return self.store.search(query_embedding, top_k=top_k)
+        results = []
+        for idx, fused in reciprocal_rank_fusion([dense, [i for i, _ in lexical]], k=self.rrf_k)[:top_k]:
+            # Rows of a filtered search are ascending, so the dense score is a binary search away
+            position = idx if rows is None else int(np.searchsorted(rows, idx))
+            doc = documents[idx].copy()
+            doc['score'] = float(dense_scores[position])
+            doc['rrf_score'] = fused
+            doc['bm25_score'] = bm25.get(idx, 0.0)
+            doc['doc_id'] = idx
+            results.append(doc)
+        return results
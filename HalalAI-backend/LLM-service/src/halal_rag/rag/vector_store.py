@@ -1,44 +1,114 @@
 from __future__ import annotations
 from typing import Any, Optional
+import numpy as np
 import torch
 from torch import nn
 
 from .interfaces import IVectorSearcher
+from .metadata import MetadataIndex, SearchFilter, Selection
 
 
 class VectorStore(IVectorSearcher):
+    """Documents and their unit-length embeddings.
+
+    Rows are normalized once, when added, and kept in a single matrix:
+    `embeddings` is a view of the first len(documents) rows of a buffer that
+    grows by half its size when full, so an append copies only its own rows
+    (amortised). The metadata index is rebuilt on first use after an append.
+    """
 
     def __init__(self):
         self.documents: list[dict[str, Any]] = []
         self.embeddings: Optional[torch.Tensor] = None
+        self._buffer: Optional[torch.Tensor] = None
+        self._metadata = MetadataIndex()
+
+    @property
+    def metadata(self) -> MetadataIndex:
+        index = self._metadata
+        if index.size != len(self.documents):
+            # Built aside and swapped in: concurrent searches never see a half-built index
+            index = MetadataIndex(self._metadata.bitmap_fields)
+            index.build(self.documents)
+            self._metadata = index
+        return index
 
     def add_documents(self, documents: list[dict[str, Any]], embeddings: torch.Tensor):
         self.documents.extend(documents)
-
-        if self.embeddings is None:
-            self.embeddings = embeddings
+        rows = nn.functional.normalize(embeddings, p=2, dim=1)
+        start = 0 if self.embeddings is None else self.embeddings.shape[0]
+        stop = start + rows.shape[0]
+        if self._buffer is None:
+            self._buffer = rows
         else:
-            self.embeddings = torch.cat([self.embeddings, embeddings], dim=0)
+            if stop > self._buffer.shape[0]:
+                grown = self._buffer.new_empty((max(stop, self._buffer.shape[0] * 3 // 2), self._buffer.shape[1]))
+                grown[:start] = self._buffer[:start]
+                self._buffer = grown
+            self._buffer[start:stop] = rows
+        self.embeddings = self._buffer[:stop]
 
-    def search(self, query_embedding: torch.Tensor, top_k: int = 3) -> list[dict[str, Any]]:
-        if self.embeddings is None or not self.documents:
-            return []
+    def select(self, search_filter: Optional[SearchFilter]) -> Optional[Selection]:
+        """Rows matching the filter, None when nothing is filtered"""
+        if search_filter is None or search_filter.is_empty():
+            return None
+        return self.metadata.select(search_filter)
 
+    def _unit_query(self, query_embedding: torch.Tensor) -> torch.Tensor:
         if query_embedding.dim() == 1:
             query_embedding = query_embedding.unsqueeze(0)
+        return nn.functional.normalize(query_embedding, p=2, dim=1)
+
+    def scores(self, query_embedding: torch.Tensor) -> torch.Tensor:
+        """Cosine similarity of the query to every document.
+
+        A 2-D query holds several query variants; each document gets the
+        similarity of its best-matching variant (max fusion).
+        """
+        return torch.matmul(self.embeddings, self._unit_query(query_embedding).T).amax(dim=1)
 
-        query = nn.functional.normalize(query_embedding, p=2, dim=1)
-        doc_embeddings = nn.functional.normalize(self.embeddings, p=2, dim=1)
+    def scores_for(
+        self, query_embedding: torch.Tensor, selection: Optional[Selection] = None
+    ) -> tuple[torch.Tensor, Optional[np.ndarray]]:
+        """Cosine scores of the selected rows only, with their row ids (None: all rows)"""
+        if selection is None:
+            return self.scores(query_embedding), None
 
-        scores = torch.matmul(doc_embeddings, query.T).squeeze(1)
+        query = self._unit_query(query_embedding).T
+        if selection.rows is not None:
+            matrix = self.embeddings[torch.from_numpy(selection.rows)]
+            return torch.matmul(matrix, query).amax(dim=1), selection.rows
+        # Contiguous slices are views: no gather copy of the embedding rows
+        parts = [torch.matmul(self.embeddings[start:stop], query).amax(dim=1) for start, stop in selection.slices]
+        scores = torch.cat(parts) if parts else torch.zeros(0, dtype=self.embeddings.dtype)
+        return scores, selection.row_ids()
 
-        k = min(top_k, len(self.documents))
+    def vectors(self, rows: list[int]) -> np.ndarray:
+        """Unit-length embeddings of the given rows"""
+        return self.embeddings[torch.as_tensor(rows, dtype=torch.long)].numpy()
+
+    def search(
+        self,
+        query_embedding: torch.Tensor,
+        top_k: int = 3,
+        search_filter: Optional[SearchFilter] = None,
+    ) -> list[dict[str, Any]]:
+        if self.embeddings is None or not self.documents:
+            return []
+
+        scores, rows = self.scores_for(query_embedding, self.select(search_filter))
+
+        k = min(top_k, len(scores))
+        if k == 0:
+            return []
         top_scores, indices = torch.topk(scores, k=k)
 
         results = []
         for score, idx in zip(top_scores.tolist(), indices.tolist()):
-            doc = self.documents[idx].copy()
+            row = int(rows[idx]) if rows is not None else idx
+            doc = self.documents[row].copy()
             doc['score'] = float(score)
+            doc['doc_id'] = row
             results.append(doc)
 
         return results
@@ -0,0 +1 @@
+"""Test utilities shipped with the service (fake upstreams for load tests)"""
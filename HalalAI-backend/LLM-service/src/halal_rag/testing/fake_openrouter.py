@@ -0,0 +1,268 @@
+"""OpenRouter-compatible stand-in server for offline load and latency testing.
+
+Serves `POST /chat/completions` (and `/api/v1/chat/completions`) with
+configurable latency distributions, token rates, 429/5xx injection and usage
+fields, both as plain JSON and as an SSE stream. Run it from a test with
+`FakeOpenRouterServer` or from the command line::
+
+    python -m halal_rag.testing.fake_openrouter --port 8900 --latency lognormal --latency-ms 800
+    OPENROUTER_BASE_URL=http://127.0.0.1:8900 python -m uvicorn halal_rag.api.main:app --port 8001
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import asdict, dataclass, replace
+from typing import Any, AsyncIterator, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal", "exponential")
+DEFAULT_REPLY = (
+    "Свинина запрещена в исламе. В Коране сказано: «Он запретил вам мертвечину, кровь, "
+    "мясо свиньи» (сура 2:173). Этот запрет повторяется в сурах 5:3, 6:145 и 16:115."
+)
+
+
+@dataclass(frozen=True)
+class FakeServerConfig:
+    """Behaviour of the stand-in server.
+
+    `latency_ms` is the time to first token: the fixed value, the centre of a
+    uniform range (± `jitter_ms`), the median of a lognormal distribution
+    (shape `sigma`) or the mean of an exponential one. Completion tokens are
+    then produced at `tokens_per_second`; 0 disables generation time.
+    """
+
+    latency: str = "fixed"
+    latency_ms: float = 50.0
+    jitter_ms: float = 0.0
+    sigma: float = 0.5
+    tokens_per_second: float = 0.0
+    completion_tokens: int = 64
+    rate_429: float = 0.0
+    rate_5xx: float = 0.0
+    retry_after: Optional[float] = 1.0
+    reply: str = DEFAULT_REPLY
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        if self.latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency must be one of {LATENCY_DISTRIBUTIONS}, got {self.latency!r}")
+
+
+class FakeUpstream:
+    """State shared by the routes: config, RNG and counters"""
+
+    def __init__(self, config: FakeServerConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.counters: Counter = Counter()
+
+    def sample_latency(self) -> float:
+        c = self.config
+        if c.latency == "uniform":
+            ms = self.rng.uniform(c.latency_ms - c.jitter_ms, c.latency_ms + c.jitter_ms)
+        elif c.latency == "lognormal":
+            ms = self.rng.lognormvariate(math.log(max(c.latency_ms, 1e-3)), c.sigma)
+        elif c.latency == "exponential":
+            ms = self.rng.expovariate(1.0 / max(c.latency_ms, 1e-3))
+        else:
+            ms = c.latency_ms
+        return max(ms, 0.0) / 1000.0
+
+    def injected_error(self) -> Optional[JSONResponse]:
+        roll = self.rng.random()
+        if roll < self.config.rate_429:
+            self.counters["injected_429"] += 1
+            headers = {"Retry-After": f"{self.config.retry_after:g}"} if self.config.retry_after is not None else {}
+            return JSONResponse({"error": {"code": 429, "message": "Rate limit exceeded"}}, 429, headers=headers)
+        if roll < self.config.rate_429 + self.config.rate_5xx:
+            status = self.rng.choice((500, 502, 503))
+            self.counters[f"injected_{status}"] += 1
+            return JSONResponse({"error": {"code": status, "message": "Upstream error"}}, status)
+        return None
+
+    def tokens(self) -> list[str]:
+        """Reply split into `completion_tokens` pieces (words, cycled if needed)"""
+        words = self.config.reply.split(" ")
+        count = max(self.config.completion_tokens, 1)
+        pieces = [words[i % len(words)] for i in range(count)]
+        return [p if i == 0 else " " + p for i, p in enumerate(pieces)]
+
+    def usage(self, body: dict[str, Any], completion_tokens: int) -> dict[str, int]:
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+        prompt_tokens = max(prompt_chars // 4, 1)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+
+def create_app(config: Optional[FakeServerConfig] = None) -> FastAPI:
+    """Build the fake upstream; `app.state.upstream.config` may be replaced at runtime"""
+    app = FastAPI(title="Fake OpenRouter")
+    upstream = FakeUpstream(config or FakeServerConfig())
+    app.state.upstream = upstream
+
+    async def completions(request: Request):
+        body = await request.json()
+        upstream.counters["requests"] += 1
+        ttft = upstream.sample_latency()
+
+        error = upstream.injected_error()
+        if error is not None:
+            await asyncio.sleep(ttft)
+            return error
+
+        tokens = upstream.tokens()
+        tps = upstream.config.tokens_per_second
+        per_token = 1.0 / tps if tps > 0 else 0.0
+        completion_id = f"gen-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "fake/model")
+        usage = upstream.usage(body, len(tokens))
+
+        if not body.get("stream"):
+            upstream.counters["completions"] += 1
+            await asyncio.sleep(ttft + per_token * len(tokens))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        async def events() -> AsyncIterator[str]:
+            upstream.counters["streams"] += 1
+            await asyncio.sleep(ttft)
+            for token in tokens:
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                if per_token:
+                    await asyncio.sleep(per_token)
+            final = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+            yield f"data: {json.dumps(final, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    app.add_api_route("/chat/completions", completions, methods=["POST"])
+    app.add_api_route("/api/v1/chat/completions", completions, methods=["POST"])
+
+    @app.get("/fake/stats")
+    async def stats() -> dict[str, Any]:
+        return {"config": asdict(upstream.config), "counters": dict(upstream.counters)}
+
+    return app
+
+
+class FakeOpenRouterServer:
+    """Runs the fake upstream on a real socket in a background thread.
+
+        with FakeOpenRouterServer(FakeServerConfig(latency_ms=5)) as server:
+            client = OpenRouterClient(base_url=server.url)
+    """
+
+    def __init__(self, config: Optional[FakeServerConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.app = create_app(config)
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning"))
+        self._thread: Optional[threading.Thread] = None
+        self.host = host
+        self.port = port
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def upstream(self) -> FakeUpstream:
+        return self.app.state.upstream
+
+    def reconfigure(self, **changes: Any) -> None:
+        self.upstream.config = replace(self.upstream.config, **changes)
+
+    def start(self, timeout: float = 10.0) -> FakeOpenRouterServer:
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("Fake OpenRouter server did not start")
+            time.sleep(0.01)
+        self.port = self._server.servers[0].sockets[0].getsockname()[1]
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+    def __enter__(self) -> FakeOpenRouterServer:
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Fake OpenRouter /chat/completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--latency-ms", type=float, default=FakeServerConfig.latency_ms, help="time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=FakeServerConfig.jitter_ms)
+    parser.add_argument("--sigma", type=float, default=FakeServerConfig.sigma)
+    parser.add_argument("--tokens-per-second", type=float, default=FakeServerConfig.tokens_per_second)
+    parser.add_argument("--completion-tokens", type=int, default=FakeServerConfig.completion_tokens)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="share of requests answered with 500/502/503")
+    parser.add_argument("--retry-after", type=float, default=FakeServerConfig.retry_after)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    config = FakeServerConfig(
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        sigma=args.sigma,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    print(f"🧪 Fake OpenRouter on http://{args.host}:{args.port} ({config.latency}, {config.latency_ms} ms)")
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
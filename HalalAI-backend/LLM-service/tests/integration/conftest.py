@@ -1,25 +1,35 @@
 """Общие фикстуры для нефункциональных интеграционных тестов.
 
-Фикстура `client` поднимает TestClient с замоканными файловой системой и RAG,
-чтобы lifespan не требовал наличия реального файла quran_ru.jsonl.
+Фикстура `client` поднимает TestClient с замоканным RAG и минимальным корпусом
+во временном файле, чтобы lifespan не требовал наличия реального файла quran_ru.jsonl.
 """
-import io
-from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 from fastapi.testclient import TestClient
 
 import halal_rag.api.main as main_module
+from halal_rag.rag.registry import CorpusSpec
 
 
 @pytest.fixture
-def client(monkeypatch):
+def quran_corpus(monkeypatch, tmp_path):
+    """Корпус из одного аята вместо data/quran_ru.jsonl"""
+    path = tmp_path / "quran_ru.jsonl"
+    path.write_text('{"text": "Во имя Аллаха", "sura": 1, "verse": 1}\n', encoding="utf-8")
+    monkeypatch.setattr(main_module, "corpus_specs", lambda: [CorpusSpec(name="quran_ru", path=path)])
+    return path
+
+
+@pytest.fixture
+def client(monkeypatch, quran_corpus):
     mock_rag = MagicMock()
     mock_rag.search = MagicMock(return_value=[])
 
     # Патчим SimpleRAG, чтобы не требовалась sentence-transformers
     monkeypatch.setattr(main_module, "SimpleRAG", lambda *a, **kw: mock_rag)
+    # Общий энкодер корпусов создаётся в load_rag до SimpleRAG
+    monkeypatch.setattr(main_module, "EmbeddingModel", MagicMock())
 
     # Патчим OpenRouter, чтобы не нужен был API-ключ
     monkeypatch.setattr(
@@ -27,25 +37,5 @@ def client(monkeypatch):
         AsyncMock(return_value="Тестовый ответ."),
     )
 
-    # Патчим Path.exists, чтобы lifespan "нашёл" файл с данными
-    real_exists = Path.exists
-
-    def fake_exists(self):
-        if "quran_ru.jsonl" in str(self):
-            return True
-        return real_exists(self)
-
-    monkeypatch.setattr(Path, "exists", fake_exists)
-
-    # Патчим open, чтобы lifespan прочитал минимальный JSONL без реального файла
-    real_open = open
-
-    def fake_open(file, *args, **kwargs):
-        if "quran_ru.jsonl" in str(file):
-            return io.StringIO('{"text": "Во имя Аллаха", "sura": 1, "verse": 1}\n')
-        return real_open(file, *args, **kwargs)
-
-    monkeypatch.setattr("builtins.open", fake_open)
-
     with TestClient(main_module.app) as c:
         yield c
@@ -0,0 +1,97 @@
+"""Полный HTTP-путь к OpenRouter через локальный fake-сервер (без сети и моков generate)."""
+
+import json
+from unittest.mock import MagicMock
+
+import httpx
+import pytest
+
+from halal_rag.api.dto import ChatRequest
+from halal_rag.api.services import ChatService
+from halal_rag.llm.open_router import OpenRouterClient
+from halal_rag.llm.retry import RetryPolicy
+from halal_rag.testing.fake_openrouter import FakeOpenRouterServer, FakeServerConfig, FakeUpstream
+
+
+@pytest.fixture(scope="module")
+def fake_server():
+    with FakeOpenRouterServer(FakeServerConfig(latency_ms=5, completion_tokens=8, seed=1)) as server:
+        yield server
+
+
+@pytest.fixture(autouse=True)
+def reset_fake(fake_server):
+    fake_server.reconfigure(rate_429=0.0, rate_5xx=0.0, latency_ms=5, completion_tokens=8)
+    yield
+
+
+@pytest.mark.asyncio
+async def test_client_goes_through_real_socket_and_pool(fake_server):
+    client = OpenRouterClient(base_url=fake_server.url)
+    try:
+        for _ in range(3):
+            reply = await client.generate("Свинина?", "", api_key="k", model="fake/model")
+            assert "Свинина" in reply
+        pool = client.stats()["pool"]
+        assert pool["requests_total"] == 3
+        assert pool["open_connections"] == 1  # keep-alive: one connection reused
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_streaming_response_has_chunks_and_usage(fake_server):
+    async with httpx.AsyncClient(base_url=fake_server.url) as http:
+        async with http.stream("POST", "/api/v1/chat/completions", json={
+            "model": "fake/model", "stream": True, "messages": [{"role": "user", "content": "вопрос"}],
+        }) as response:
+            assert response.headers["content-type"].startswith("text/event-stream")
+            events = [line[6:] async for line in response.aiter_lines() if line.startswith("data: ")]
+
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(e) for e in events[:-1]]
+    assert len(chunks) == 9  # 8 tokens + финальный чанк с usage
+    assert chunks[-1]["usage"]["completion_tokens"] == 8
+
+
+@pytest.mark.asyncio
+async def test_injected_429_is_retried_then_surfaces(fake_server):
+    fake_server.reconfigure(rate_429=1.0, retry_after=0)
+    client = OpenRouterClient(base_url=fake_server.url, retry_policy=RetryPolicy(max_attempts=2, base_delay=0))
+    try:
+        with pytest.raises(httpx.HTTPStatusError) as exc:
+            await client.generate("q", "", api_key="k", model="fake/model")
+        assert exc.value.response.status_code == 429
+        assert client.stats()["retries"]["attempts"] == 2
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_chat_service_end_to_end_against_fake_upstream(fake_server):
+    fake_server.reconfigure(completion_tokens=40)
+    rag = MagicMock()
+    rag.search = MagicMock(return_value=[{"sura": 2, "verse": 173, "text": "Запрет свинины", "score": 0.9}])
+    client = OpenRouterClient(base_url=fake_server.url)
+    try:
+        service = ChatService(rag=rag, llm_client=client)
+        resp = await service.process_chat(ChatRequest(
+            messages=[{"role": "user", "content": "Можно ли есть свинину?"}], api_key="k",
+        ))
+        assert resp.used_remote is True
+        assert "2:173" in resp.reply
+    finally:
+        await client.close()
+
+
+def test_latency_distributions_are_sampled():
+    for latency in ("fixed", "uniform", "lognormal", "exponential"):
+        up = FakeUpstream(FakeServerConfig(latency=latency, latency_ms=100, jitter_ms=50, seed=3))
+        samples = [up.sample_latency() for _ in range(200)]
+        assert all(s >= 0 for s in samples)
+        assert 0.03 < sum(samples) / len(samples) < 0.3
+
+
+def test_unknown_latency_distribution_rejected():
+    with pytest.raises(ValueError):
+        FakeServerConfig(latency="pareto")
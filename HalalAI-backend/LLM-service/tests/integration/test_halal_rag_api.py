@@ -9,11 +9,12 @@ import halal_rag.api.main as main_module
 
 
 @pytest.fixture
-def client(monkeypatch):
+def client(monkeypatch, quran_corpus):
     mock_rag = MagicMock()
     mock_rag.search = MagicMock(return_value=[])
 
     monkeypatch.setattr(main_module, "SimpleRAG", lambda *a, **kw: mock_rag)
+    monkeypatch.setattr(main_module, "EmbeddingModel", MagicMock())
     monkeypatch.setattr(
         "halal_rag.llm.open_router.OpenRouterClient.generate",
         AsyncMock(return_value="Тестовый ответ без внешнего API."),
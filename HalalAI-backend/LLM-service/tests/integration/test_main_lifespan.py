@@ -1,7 +1,7 @@
 """Ветки startup lifespan в halal_rag.api.main (без полной загрузки RAG где возможно)."""
 
 from pathlib import Path
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import pytest
 
@@ -24,8 +24,44 @@ async def test_lifespan_raises_when_quran_file_missing(monkeypatch):
 
 
 @pytest.mark.asyncio
-async def test_lifespan_propagates_when_json_invalid():
+async def test_lifespan_propagates_when_json_invalid(monkeypatch, quran_corpus):
+    monkeypatch.setattr(main, "EmbeddingModel", MagicMock())
     with patch.object(main.json, "loads", side_effect=ValueError("corrupt jsonl")):
         with pytest.raises(ValueError, match="corrupt jsonl"):
             async with main.lifespan(main.app):
                 pass
+
+
+@pytest.mark.asyncio
+async def test_lifespan_reuses_rag_preloaded_by_parent(monkeypatch):
+    """В pre-fork воркере RAG уже загружен родителем — файл данных не читается."""
+    preloaded = object()
+    monkeypatch.setattr(main.dependencies.DependencyContainer, "_rag", preloaded)
+
+    def fail_load(*_a, **_kw):
+        raise AssertionError("load_rag must not be called in a pre-forked worker")
+
+    monkeypatch.setattr(main, "load_rag", fail_load)
+    async with main.lifespan(main.app):
+        assert main.dependencies.get_rag() is preloaded
+    # При остановке воркер отпускает RAG вместе с клиентом
+    assert main.dependencies.get_rag() is None
+
+
+def test_load_rag_shares_a_lemmatized_rerank_cache_key(monkeypatch, tmp_path):
+    """Общий reranker сервиса кэширует оценки по леммам запроса, как и отдельный SimpleRAG."""
+    from halal_rag.rag.morphology import get_lemmatizer
+    from halal_rag.rag.registry import CorpusSpec
+
+    corpus = tmp_path / "quran.jsonl"
+    corpus.write_text('{"text": "Во имя Аллаха", "sura": 1, "verse": 1}\n', encoding="utf-8")
+    built = []
+    monkeypatch.setenv("RAG_RERANK", "true")
+    monkeypatch.setattr(main, "EmbeddingModel", MagicMock())
+    monkeypatch.setattr(main, "SimpleRAG", lambda **kw: built.append(kw) or MagicMock())
+
+    main.load_rag([CorpusSpec(name="quran_ru", path=corpus)])
+
+    reranker = built[0]["reranker"]
+    assert reranker.query_key("Свинину") == reranker.query_key("свинина")
+    assert reranker.query_key("Свинину") == get_lemmatizer().query_key("свинина")
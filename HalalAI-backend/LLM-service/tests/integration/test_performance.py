@@ -54,6 +54,19 @@ def test_chat_endpoint_responds_within_sla(client):
     )
 
 
+def test_chat_reports_stage_breakdown_in_server_timing(client):
+    r = client.post(
+        "/llm/chat",
+        json={"messages": [{"role": "user", "content": "Вопрос о халяле"}], "api_key": "test-key", "debug": True},
+    )
+
+    assert r.status_code == 200
+    stages = dict(part.split(";dur=") for part in r.headers["Server-Timing"].split(", "))
+    assert {"retrieval", "prompt_build", "llm", "total"} <= set(stages)
+    assert all(float(ms) >= 0 for ms in stages.values())
+    assert set(r.json()["timings"]) >= {"retrieval", "llm", "total"}
+
+
 def test_root_redirect_responds_within_sla(client):
     start = time.perf_counter()
     r = client.get("/")
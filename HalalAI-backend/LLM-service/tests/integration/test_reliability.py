@@ -3,6 +3,7 @@
 Проверяет корректную деградацию, восстановление после сбоев и устойчивость
 к некорректным входным данным.
 """
+import json
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
@@ -152,3 +153,42 @@ def test_repeated_health_checks_all_succeed(client):
         r = client.get("/llm/health")
         assert r.status_code == 200
         assert r.json()["status"] == "ok"
+
+
+def test_stats_exposes_upstream_pool(client):
+    """Статистика общего пула соединений к OpenRouter доступна через /llm/stats."""
+    r = client.get("/llm/stats")
+    assert r.status_code == 200
+    pool = r.json()["upstream"]["pool"]
+    assert pool["max_connections"] > 0
+    assert pool["in_flight"] == 0
+
+
+def test_health_reports_circuit_breaker_states(client):
+    """Состояние circuit breaker по моделям видно в /llm/health."""
+    from halal_rag.api import dependencies
+
+    dependencies.get_llm_client().breakers.get("qwen/qwen3.6-plus:free")
+    r = client.get("/llm/health")
+    assert r.status_code == 200
+    assert r.json()["circuit_breakers"] == {"qwen/qwen3.6-plus:free": "closed"}
+
+
+def test_usage_endpoint_returns_aggregates(client):
+    """Учёт токенов и задержек по моделям и ключам доступен через /llm/usage."""
+    from halal_rag.api import dependencies
+
+    dependencies.get_llm_client().usage.record("x/y", "secret", latency=0.5, usage={"prompt_tokens": 10})
+    r = client.get("/llm/usage")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["models"]["x/y"]["prompt_tokens"] == 10
+    assert "secret" not in json.dumps(body["api_keys"])
+
+
+def test_request_id_header_is_echoed_or_generated(client):
+    """Каждый ответ содержит X-Request-ID: переданный клиентом или сгенерированный."""
+    r = client.get("/llm/health", headers={"X-Request-ID": "trace-123"})
+    assert r.headers["X-Request-ID"] == "trace-123"
+    generated = client.get("/llm/health").headers["X-Request-ID"]
+    assert len(generated) == 32
@@ -0,0 +1,54 @@
+"""Тесты соседства аятов и расширения попаданий до окна контекста."""
+
+from halal_rag.rag.adjacency import VerseAdjacency
+
+
+def _docs():
+    # Сура 1: аяты 1-5; сура 2: аяты 1-3 и (после пропуска) 7
+    verses = [(1, v) for v in range(1, 6)] + [(2, 1), (2, 2), (2, 3), (2, 7)]
+    return [{"sura": s, "verse": str(v), "text": f"{s}:{v}"} for s, v in verses]
+
+
+def _hit(row, score=1.0):
+    doc = dict(_docs()[row])
+    doc.update(doc_id=row, score=score)
+    return doc
+
+
+def test_prev_next_stay_within_sura_and_gaps():
+    adj = VerseAdjacency(_docs())
+    assert adj.prev.tolist() == [-1, 0, 1, 2, 3, -1, 5, 6, -1]
+    assert adj.next.tolist() == [1, 2, 3, 4, -1, 6, 7, -1, -1]
+
+
+def test_window_is_clamped_to_run():
+    adj = VerseAdjacency(_docs())
+    assert adj.window(0, 1) == (0, 2)
+    assert adj.window(2, 1) == (1, 4)
+    assert adj.window(5, 2) == (5, 8)
+    assert adj.window(8, 3) == (8, 9)
+
+
+def test_expand_builds_passage():
+    passage = VerseAdjacency(_docs()).expand([_hit(2, 0.9)], radius=1)[0]
+    assert passage["text"] == "1:2\n1:3\n1:4"
+    assert (passage["verse"], passage["verse_start"], passage["verse_end"]) == ("2-4", 2, 4)
+    assert passage["score"] == 0.9 and passage["hit_ids"] == [2]
+
+
+def test_overlapping_windows_merge_keeping_best_rank():
+    adj = VerseAdjacency(_docs())
+    passages = adj.expand([_hit(6, 0.9), _hit(3, 0.8), _hit(1, 0.7)], radius=1)
+    assert [p["verse"] for p in passages] == ["1-3", "1-5"]
+    assert passages[1]["score"] == 0.8 and passages[1]["hit_ids"] == [1, 3]
+
+
+def test_touching_windows_in_different_suras_do_not_merge():
+    adj = VerseAdjacency(_docs())
+    passages = adj.expand([_hit(4), _hit(5)], radius=1)
+    assert [(p["sura"], p["verse"]) for p in passages] == [(1, "4-5"), (2, "1-2")]
+
+
+def test_radius_zero_returns_hits_unchanged():
+    hits = [_hit(0)]
+    assert VerseAdjacency(_docs()).expand(hits, 0) == hits
@@ -17,10 +17,15 @@ def mock_rag():
 
 
 @pytest.fixture
-def service(mock_rag):
-    s = ChatService(rag=mock_rag, llm_client=None)
-    s.openrouter_client.generate = AsyncMock(return_value="Краткий ответ с ссылкой на аят.")
-    return s
+def mock_llm():
+    llm = MagicMock()
+    llm.generate = AsyncMock(return_value="Краткий ответ с ссылкой на аят.")
+    return llm
+
+
+@pytest.fixture
+def service(mock_rag, mock_llm):
+    return ChatService(rag=mock_rag, llm_client=mock_llm)
 
 
 def test_extract_user_message_last_user_wins(service):
@@ -81,9 +86,26 @@ async def test_generate_response_no_api_key(service):
     assert err == "API key is required"
 
 
+@pytest.mark.asyncio
+async def test_generate_response_without_llm_client(mock_rag):
+    service = ChatService(rag=mock_rag, llm_client=None)
+    reply, used, err = await service.generate_response("q", "src", api_key="k", model="m", max_tokens=10)
+    assert reply == ""
+    assert used is False
+    assert "not initialized" in err
+
+
+@pytest.mark.asyncio
+async def test_generate_response_uses_injected_client(service, mock_llm):
+    reply, used, _ = await service.generate_response("q", "src", api_key="k", model="m", max_tokens=10)
+    assert used is True
+    assert reply == "Краткий ответ с ссылкой на аят."
+    assert mock_llm.generate.await_args.kwargs["model"] == "m"
+
+
 @pytest.mark.asyncio
 async def test_generate_response_openrouter_failure(service):
-    service.openrouter_client.generate = AsyncMock(side_effect=RuntimeError("network down"))
+    service.llm_client.generate = AsyncMock(side_effect=RuntimeError("network down"))
     reply, used, err = await service.generate_response(
         "q", "src", api_key="k", model="m", max_tokens=10
     )
@@ -125,7 +147,7 @@ async def test_process_chat_rag_disabled_skips_search(service, mock_rag):
 
 @pytest.mark.asyncio
 async def test_process_chat_empty_llm_reply_triggers_handle_error(service, mock_rag):
-    service.openrouter_client.generate = AsyncMock(return_value="")
+    service.llm_client.generate = AsyncMock(return_value="")
     req = ChatRequest(
         messages=[{"role": "user", "content": "Вопрос"}],
         api_key="k",
@@ -145,3 +167,126 @@ def test_build_prompt_with_and_without_sources(service):
     _, usr2 = service.build_prompt("Вопрос", "   ")
     assert "Вопрос" in usr2
     assert "Соответствующие аяты" not in usr2
+
+
+def test_model_chain_dedupes_and_prefers_request_override(mock_rag, mock_llm):
+    svc = ChatService(rag=mock_rag, llm_client=mock_llm, fallback_models=["paid/a", "free/x", "paid/b"])
+    assert svc.model_chain("free/x") == ["free/x", "paid/a", "paid/b"]
+    assert svc.model_chain("free/x", ["other/c"]) == ["free/x", "other/c"]
+
+
+@pytest.mark.asyncio
+async def test_process_chat_falls_back_to_next_model(mock_rag, mock_llm):
+    async def generate(**kwargs):
+        if kwargs["model"] == "free/x":
+            raise RuntimeError("429 Too Many Requests")
+        return "ответ запасной модели"
+
+    mock_llm.generate = AsyncMock(side_effect=generate)
+    svc = ChatService(rag=mock_rag, llm_client=mock_llm, fallback_models=["paid/a"])
+    req = ChatRequest(messages=[{"role": "user", "content": "Вопрос"}], api_key="k", remote_model="free/x")
+
+    resp = await svc.process_chat(req)
+
+    assert resp.reply == "ответ запасной модели"
+    assert resp.used_remote is True
+    assert svc.stats()["hedging"]["models"]["paid/a"]["wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_process_chat_trims_sources_to_prompt_budget(mock_rag, mock_llm):
+    from halal_rag.llm.token_budget import PromptBudgeter
+
+    mock_rag.search.return_value = [
+        {"sura": 2, "verse": "173", "text": "Запрет свинины", "score": 0.9},
+        {"sura": 5, "verse": "3", "text": "Запрещена вам мертвечина " * 200, "score": 0.85},
+    ]
+    service = ChatService(rag=mock_rag, llm_client=mock_llm, budgeter=PromptBudgeter(prompt_cap=400))
+    request = ChatRequest(messages=[{"role": "user", "content": "Можно ли есть свинину?"}], api_key="k")
+
+    await service.process_chat(request)
+
+    sources_text = mock_llm.generate.call_args.kwargs["sources"]
+    assert "Сура 2:173" in sources_text
+    assert sources_text.endswith("…")
+    assert len(sources_text) < 2000
+    assert service.stats()["prompt_budget"]["prompt_tokens_saved_total"] > 0
+
+
+@pytest.mark.asyncio
+async def test_process_chat_passes_windowed_history(mock_rag, mock_llm):
+    from halal_rag.llm.history import ConversationMemory
+
+    service = ChatService(rag=mock_rag, llm_client=mock_llm, memory=ConversationMemory(keep_turns=1))
+    messages = [
+        {"role": "user", "content": "Что такое намаз?"},
+        {"role": "assistant", "content": "Намаз — молитва."},
+        {"role": "user", "content": "Когда его совершают?"},
+        {"role": "assistant", "content": "Пять раз в день."},
+        {"role": "user", "content": "А в пути?"},
+    ]
+    request = ChatRequest(messages=messages, api_key="k", conversation_id="conv-1")
+
+    await service.process_chat(request)
+
+    kwargs = mock_llm.generate.call_args.kwargs
+    assert kwargs["query"] == "А в пути?"
+    history = kwargs["history"]
+    assert history[0]["role"] == "system" and "Что такое намаз?" in history[0]["content"]
+    assert history[1:] == messages[2:4]
+    assert service.stats()["history"]["conversations_cached"] == 1
+
+
+def test_to_search_filter_maps_request_fields():
+    from halal_rag.api.dto import SourceFilter
+
+    assert ChatService.to_search_filter(None) is None
+    assert ChatService.to_search_filter(SourceFilter()) is None
+    search_filter = ChatService.to_search_filter(SourceFilter(suras=[2], verse_to=10, corpus=["quran_ru"]))
+    assert search_filter.suras == [2]
+    assert search_filter.verse_to == 10
+    assert search_filter.metadata == {"corpus": ["quran_ru"]}
+
+
+@pytest.mark.asyncio
+async def test_process_chat_leaves_weak_sources_out(mock_rag, mock_llm):
+    from halal_rag.rag.cutoff import SourceCutoff
+
+    mock_rag.search.return_value = [
+        {"sura": 2, "verse": "173", "text": "Запрет свинины", "score": 0.82},
+        {"sura": 6, "verse": "145", "text": "Скажи: «Я не нахожу...»", "score": 0.78},
+        {"sura": 5, "verse": "3", "text": "Запрещена вам мертвечина", "score": 0.41},
+        {"sura": 20, "verse": "1", "text": "Та Ха", "score": 0.2},
+    ]
+    service = ChatService(rag=mock_rag, llm_client=mock_llm, cutoff=SourceCutoff(max_depth=4))
+    request = ChatRequest(messages=[{"role": "user", "content": "Можно ли есть свинину?"}], api_key="k")
+
+    resp = await service.process_chat(request)
+
+    assert mock_rag.search.call_args.kwargs["top_k"] == 4
+    sources_text = mock_llm.generate.call_args.kwargs["sources"]
+    assert "Сура 6:145" in sources_text and "Сура 5:3" not in sources_text
+    assert resp.sources_used == 2
+    stats = service.stats()["source_cutoff"]
+    assert stats["dropped_below_threshold_total"] == 1
+    assert stats["dropped_after_drop_off_total"] == 1
+
+
+def test_format_sources_labels_non_quran_documents(service):
+    text = service.format_sources([
+        {"sura": 2, "verse": "173", "text": "Запрет"},
+        {"corpus": "hadith", "reference": "Бухари 5590", "text": "Хадис"},
+    ])
+    assert text == "Сура 2:173\nЗапрет\n\nБухари 5590\nХадис"
+
+
+@pytest.mark.asyncio
+async def test_process_chat_returns_stage_timings_for_debug_requests(service):
+    messages = [{"role": "user", "content": "Свинина дозволена?"}]
+
+    plain = await service.process_chat(ChatRequest(messages=messages, api_key="sk-test"))
+    debug = await service.process_chat(ChatRequest(messages=messages, api_key="sk-test", debug=True))
+
+    assert plain.timings is None
+    assert list(debug.timings) == ["history", "retrieval", "prompt_build", "llm", "total"]
+    assert all(ms >= 0 for ms in debug.timings.values())
@@ -0,0 +1,157 @@
+"""Circuit breaker по моделям: closed -> open -> half_open."""
+
+import httpx
+import pytest
+
+from halal_rag.llm.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    BreakerSettings,
+    CircuitBreaker,
+    CircuitBreakerRegistry,
+    CircuitOpenError,
+    counts_as_failure,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+SETTINGS = BreakerSettings(window_seconds=60, min_calls=4, failure_rate_threshold=0.5, slow_call_seconds=5, open_seconds=30)
+
+
+def _breaker():
+    clock = FakeClock()
+    return CircuitBreaker("m", SETTINGS, clock=clock), clock
+
+
+def test_opens_when_failure_rate_crosses_threshold():
+    b, _ = _breaker()
+    for failed in (False, True, False, True):
+        b.before_call()
+        b.record(0.1, failed=failed)
+    assert b.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        b.before_call()
+    assert b.rejected == 1
+
+
+def test_stays_closed_below_min_calls():
+    b, _ = _breaker()
+    for _ in range(3):
+        b.record(0.1, failed=True)
+    assert b.state == CLOSED
+
+
+def test_slow_calls_count_as_failures():
+    b, _ = _breaker()
+    for _ in range(4):
+        b.record(10.0, failed=False)
+    assert b.state == OPEN
+
+
+def test_half_open_probe_success_closes():
+    b, clock = _breaker()
+    for _ in range(4):
+        b.record(0.1, failed=True)
+    clock.now += 31
+    assert b.state == HALF_OPEN
+
+    b.before_call()
+    with pytest.raises(CircuitOpenError):
+        b.before_call()  # only one probe at a time
+    b.record(0.1, failed=False)
+    assert b.state == CLOSED
+
+
+def test_half_open_probe_failure_reopens():
+    b, clock = _breaker()
+    for _ in range(4):
+        b.record(0.1, failed=True)
+    clock.now += 31
+    b.before_call()
+    b.record(0.1, failed=True)
+    assert b.state == OPEN
+    assert b.times_opened == 2
+
+
+def test_released_probe_frees_the_half_open_slot():
+    b, clock = _breaker()
+    for _ in range(4):
+        b.record(0.1, failed=True)
+    clock.now += 31
+
+    b.before_call()
+    b.release()  # пробный вызов отменён: ни успех, ни ошибка
+    assert b.state == HALF_OPEN
+    b.before_call()
+    b.record(0.1, failed=False)
+    assert b.state == CLOSED
+
+
+def test_lost_probe_expires_after_probe_timeout():
+    b, clock = _breaker()
+    for _ in range(4):
+        b.record(0.1, failed=True)
+    clock.now += 31
+    b.before_call()  # пробный вызов, который не вернул результат
+
+    clock.now += SETTINGS.probe_timeout_seconds - 1
+    with pytest.raises(CircuitOpenError) as exc:
+        b.before_call()
+    assert exc.value.retry_in == pytest.approx(1.0)
+
+    clock.now += 1
+    b.before_call()
+    b.record(0.1, failed=False)
+    assert b.state == CLOSED
+
+
+def test_old_calls_leave_the_window():
+    b, clock = _breaker()
+    for _ in range(3):
+        b.record(0.1, failed=True)
+    clock.now += 61
+    b.record(0.1, failed=True)
+    assert b.state == CLOSED
+    assert b.failure_rate() == 1.0
+
+
+def test_failure_classification():
+    request = httpx.Request("POST", "http://x")
+    def err(status):
+        return httpx.HTTPStatusError("x", request=request, response=httpx.Response(status, request=request))
+
+    assert counts_as_failure(err(503))
+    assert counts_as_failure(err(429))
+    assert counts_as_failure(httpx.ConnectTimeout("t"))
+    assert not counts_as_failure(err(401))
+    assert not counts_as_failure(ValueError("bad json"))
+
+
+def test_registry_creates_one_breaker_per_model():
+    reg = CircuitBreakerRegistry(SETTINGS)
+    assert reg.get("a") is reg.get("a")
+    reg.get("b")
+    assert reg.states() == {"a": CLOSED, "b": CLOSED}
+    assert reg.stats()["a"]["failure_rate"] == 0.0
+
+
+def test_registry_evicts_closed_breakers_first():
+    clock = FakeClock()
+    reg = CircuitBreakerRegistry(BreakerSettings(min_calls=1, open_seconds=30, max_models=2), clock=clock)
+    reg.get("down").record(0.1, failed=True)
+    reg.get("ok")
+    reg.get("new")  # вытесняется закрытый «ok», а не более давний открытый «down»
+    assert reg.states() == {"down": OPEN, "new": CLOSED}
+    assert reg.evicted == 1
+
+    reg.get("down")
+    reg.get("other")
+    assert list(reg.states()) == ["down", "other"]
@@ -0,0 +1,66 @@
+"""Тесты отбора источников по порогу, провалу оценок и глубине."""
+
+from halal_rag.rag.cutoff import SourceCutoff
+
+
+def _sources(*scores):
+    return [{"sura": 1, "verse": str(i), "score": s} for i, s in enumerate(scores, start=1)]
+
+
+def test_threshold_drops_weak_sources():
+    result = SourceCutoff(min_score=0.3, min_gap=None).apply(_sources(0.6, 0.5, 0.25, 0.2))
+    assert [s["score"] for s in result.sources] == [0.6, 0.5]
+    assert result.below_threshold == 2 and result.used == 2
+
+
+def test_drop_off_cuts_at_largest_gap():
+    result = SourceCutoff(min_score=0.0, min_gap=0.15).apply(_sources(0.8, 0.78, 0.5, 0.45))
+    assert [s["score"] for s in result.sources] == [0.8, 0.78]
+    assert result.after_drop_off == 2
+
+
+def test_small_gaps_keep_everything():
+    result = SourceCutoff(min_score=0.0, min_gap=0.15).apply(_sources(0.7, 0.62, 0.55))
+    assert result.used == 3 and result.after_drop_off == 0
+
+
+def test_max_depth_caps_sources():
+    cutoff = SourceCutoff(min_score=0.0, max_depth=2, min_gap=None)
+    result = cutoff.apply(_sources(0.9, 0.9, 0.9))
+    assert result.used == 2 and result.retrieved == 3
+
+
+def test_reference_matches_are_never_dropped():
+    sources = _sources(1.0, 0.2, 0.6)
+    sources[1]["match"] = "reference"
+    result = SourceCutoff(min_score=0.3, min_gap=0.15).apply(sources)
+    assert [s["verse"] for s in result.sources] == ["1", "2"]
+
+
+def test_pinned_reference_does_not_cut_semantic_hits():
+    # Ссылка «2:173» закреплена с score=1.0 — провал 1.0 → 0.72 не должен отбросить остальное
+    sources = _sources(1.0, 0.72, 0.70, 0.66)
+    sources[0]["match"] = "reference"
+    result = SourceCutoff(min_score=0.3, min_gap=0.15).apply(sources)
+    assert [s["score"] for s in result.sources] == [1.0, 0.72, 0.70, 0.66]
+    assert result.after_drop_off == 0
+
+
+def test_drop_off_on_non_monotone_scores_keeps_retrieval_order():
+    # После RRF / rerank / MMR косинусные оценки идут не по убыванию
+    result = SourceCutoff(min_score=0.3, min_gap=0.15).apply(_sources(0.71, 0.45, 0.69, 0.68))
+    assert [s["score"] for s in result.sources] == [0.71, 0.69, 0.68]
+    assert result.after_drop_off == 1
+
+
+def test_stats_accumulate(monkeypatch):
+    monkeypatch.setenv("RAG_MAX_SOURCES", "4")
+    monkeypatch.setenv("RAG_SCORE_GAP", "")
+    cutoff = SourceCutoff.from_env()
+    assert cutoff.max_depth == 4 and cutoff.min_gap is None
+    cutoff.apply(_sources(0.9, 0.1))
+    cutoff.apply([])
+    stats = cutoff.stats()
+    assert stats["requests"] == 2
+    assert stats["sources_used_total"] == 1
+    assert stats["avg_sources_used"] == 0.5
@@ -25,18 +25,12 @@ def test_set_llm_client_clears_chat_service():
     assert dependencies.DependencyContainer._chat_service is None
 
 
-def test_get_llm_client_without_key_returns_none(monkeypatch):
-    monkeypatch.delenv("OPEN_ROUTER_KEY", raising=False)
+def test_get_llm_client_does_not_build_a_client_outside_lifespan(monkeypatch):
+    # Второй пул соединений, который никто не закроет, не создаётся
+    monkeypatch.setenv("OPEN_ROUTER_KEY", "test-key-openrouter")
     dependencies.DependencyContainer._llm_client = None
     assert dependencies.get_llm_client() is None
-
-
-def test_get_llm_client_with_env_creates_openrouter(monkeypatch):
-    dependencies.DependencyContainer._llm_client = None
-    monkeypatch.setenv("OPEN_ROUTER_KEY", "test-key-openrouter")
-    client = dependencies.get_llm_client()
-    assert client is not None
-    assert dependencies.DependencyContainer._llm_client is client
+    assert dependencies.DependencyContainer._llm_client is None
 
 
 def test_get_chat_service_requires_rag():
@@ -0,0 +1,36 @@
+"""Тесты MMR-диверсификации кандидатов."""
+
+import numpy as np
+
+from halal_rag.rag.diversity import mmr_order, relevance_of
+
+
+def _unit(rows):
+    v = np.asarray(rows, dtype=np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def test_mmr_skips_near_duplicate():
+    vectors = _unit([[1, 0], [0.99, 0.01], [0, 1]])
+    relevance = np.array([1.0, 0.95, 0.6], dtype=np.float32)
+    assert mmr_order(relevance, vectors, 2, lambda_=0.5) == [0, 2]
+
+
+def test_lambda_one_is_pure_relevance():
+    vectors = _unit([[1, 0], [0.99, 0.01], [0, 1]])
+    relevance = np.array([1.0, 0.95, 0.6], dtype=np.float32)
+    assert mmr_order(relevance, vectors, 3, lambda_=1.0) == [0, 1, 2]
+
+
+def test_mmr_k_larger_than_pool():
+    vectors = _unit([[1, 0], [0, 1]])
+    assert sorted(mmr_order(np.array([0.2, 0.1]), vectors, 5)) == [0, 1]
+    assert mmr_order(np.zeros(0), np.zeros((0, 2)), 3) == []
+
+
+def test_relevance_uses_ordering_score():
+    hybrid = [{"score": 0.1, "rrf_score": 0.03}, {"score": 0.9, "rrf_score": 0.01}]
+    assert relevance_of(hybrid).tolist() == [1.0, 0.0]
+    reranked = [{"score": 0.5, "rerank_score": 4.0}, {"score": 0.5, "rerank_score": 2.0}, {"score": 0.1}]
+    assert relevance_of(reranked).tolist() == [1.0, 0.5, 0.0]
+    assert relevance_of([{"score": 0.3}, {"score": 0.3}]).tolist() == [1.0, 1.0]
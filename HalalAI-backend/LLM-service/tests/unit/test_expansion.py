@@ -0,0 +1,104 @@
+"""Тесты расширения запросов синонимами и многовекторного поиска."""
+
+import torch
+
+from halal_rag.rag.expansion import (
+    QueryExpander,
+    expand_query,
+    generate_query_variants,
+    normalize_food_query,
+    synonym_terms,
+)
+from halal_rag.rag.vector_store import VectorStore
+
+
+class CountingEncoder:
+    """Детерминированные эмбеддинги по хэшу текста; считает вызовы модели."""
+
+    dim = 16
+
+    def __init__(self):
+        self.calls: list[int] = []
+
+    def _vec(self, text):
+        g = torch.Generator().manual_seed(abs(hash(text)) % (2**31))
+        return torch.randn(self.dim, generator=g)
+
+    def encode(self, texts):
+        self.calls.append(len(texts))
+        return torch.stack([self._vec(t) for t in texts])
+
+    def encode_single(self, text):
+        return self.encode([text])[0]
+
+
+def test_expand_query_with_known_terms():
+    variants = expand_query("Можно ли есть свинину?")
+    assert variants[0] == "Можно ли есть свинину?"
+    assert any("мясо свиньи" in v for v in variants)
+    namaz = expand_query("Расскажи про намаз")
+    assert any("молитва" in v for v in namaz) and any("салят" in v for v in namaz)
+
+
+def test_expand_query_without_terms_and_limit():
+    assert expand_query("Расскажи об истории Пророка") == ["Расскажи об истории Пророка"]
+    assert len(expand_query("свинина намаз пост алкоголь", max_variants=3)) <= 3
+
+
+def test_corpus_topic_is_not_expanded():
+    # «Коран» есть почти в каждом запросе: варианты с «книга» размывали бы поиск
+    assert expand_query("Что Коран говорит о терпении?") == ["Что Коран говорит о терпении?"]
+    variants = expand_query("Что Коран говорит о свинине?")
+    assert not any("книга" in v or "писание" in v for v in variants)
+
+
+def test_normalize_food_query_forms():
+    for query in ("свинина", "свинину", "свининой", "свинины"):
+        normalized = normalize_food_query(query)
+        assert "мясо свиньи" in normalized and "свинин" not in normalized
+    assert "запрет" in normalize_food_query("Можно ли есть свинину?")
+    assert normalize_food_query("Расскажи о намазе") == "Расскажи о намазе"
+
+
+def test_generate_query_variants_unique_and_bounded():
+    variants = generate_query_variants("Можно ли есть свинину?", max_variants=3)
+    assert variants[0] == "Можно ли есть свинину?"
+    assert len(variants) == len(set(variants)) <= 3
+
+
+def test_offset_mode_precomputes_terms_and_adds_no_forward():
+    encoder = CountingEncoder()
+    expander = QueryExpander(encoder, mode="offset", max_variants=2)
+    startup_calls = len(encoder.calls)
+    assert startup_calls == 1 and expander.stats()["precomputed_terms"] > 10
+
+    vectors = expander.query_vectors("Можно ли есть свинину?")
+    assert len(encoder.calls) == startup_calls + 1  # только сам запрос
+    assert vectors.shape == (1 + len(synonym_terms("свинину", 2)), encoder.dim)
+    assert torch.allclose(vectors.norm(dim=1), torch.ones(len(vectors)))
+
+    plain = expander.query_vectors("Расскажи об истории")
+    assert plain.dim() == 1
+
+
+def test_text_mode_encodes_variants_in_one_batch():
+    encoder = CountingEncoder()
+    expander = QueryExpander(encoder, mode="text", fusion="mean", max_variants=3)
+    assert encoder.calls == []
+    vector = expander.query_vectors("Расскажи про намаз")
+    assert len(encoder.calls) == 1 and encoder.calls[0] > 1
+    assert vector.dim() == 1
+
+
+def test_lexical_query_appends_synonyms():
+    expander = QueryExpander(CountingEncoder(), mode="text")
+    assert "молитва" in expander.lexical_query("намаз в пути")
+
+
+def test_store_max_fusion_takes_best_variant():
+    store = VectorStore()
+    store.add_documents([{"text": "a"}, {"text": "b"}], torch.eye(2))
+    variants = torch.tensor([[1.0, 0.0], [0.0, 1.0]])
+    assert torch.allclose(store.scores(variants), torch.ones(2))
+    hits = store.search(variants, top_k=2)
+    assert {h["text"] for h in hits} == {"a", "b"}
@@ -0,0 +1,136 @@
+"""Хеджирование запросов и цепочка fallback-моделей."""
+
+import asyncio
+
+import pytest
+
+from halal_rag.llm.hedging import HedgedExecutor, LatencyTracker
+
+
+def _caller(behaviour):
+    """behaviour: model -> (delay, result or Exception)"""
+    started = []
+    cancelled = []
+
+    async def call(model):
+        started.append(model)
+        delay, outcome = behaviour[model]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return call, started, cancelled
+
+
+def test_latency_tracker_quantile_needs_min_samples():
+    t = LatencyTracker(min_samples=5)
+    for v in (0.1, 0.2, 0.3, 0.4):
+        t.record("m", v)
+    assert t.quantile("m", 0.9) is None
+    t.record("m", 1.0)
+    assert t.quantile("m", 0.9) == 1.0
+    assert t.quantile("m", 0.5) == 0.3
+
+
+def test_latency_and_stats_keep_at_most_max_models():
+    t = LatencyTracker(min_samples=1, max_models=2)
+    for model in ("a", "b", "a", "c"):
+        t.record(model, 0.1)
+    assert t.quantile("a", 0.9) == 0.1
+    assert t.quantile("b", 0.9) is None  # вытеснена как давно не встречавшаяся
+
+    ex = HedgedExecutor(max_models=2)
+    for model in ("m1", "m2", "m3"):
+        ex.stats.counters(model)["launched"] += 1
+    stats = ex.stats.as_dict()
+    assert list(stats["models"]) == ["m2", "m3"]
+    assert stats["evicted"] == 1
+    assert ex.latency.max_models == 2
+
+
+def test_hedge_delay_uses_observed_p90():
+    ex = HedgedExecutor(latency=LatencyTracker(min_samples=1), default_delay=5.0, min_delay=0.0)
+    assert ex.hedge_delay("m") == 5.0
+    ex.latency.record("m", 0.4)
+    assert ex.hedge_delay("m") == 0.4
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_wins_without_hedge():
+    call, started, _ = _caller({"a": (0.0, "A"), "b": (0.0, "B")})
+    ex = HedgedExecutor(default_delay=1.0)
+
+    assert await ex.run(["a", "b"], call) == ("A", "a")
+    assert started == ["a"]
+    assert ex.stats.as_dict()["hedge_rate"] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_loser_cancelled():
+    call, started, cancelled = _caller({"a": (1.0, "A"), "b": (0.01, "B")})
+    ex = HedgedExecutor(default_delay=0.05, min_delay=0.0)
+
+    result = await ex.run(["a", "b"], call)
+    await asyncio.sleep(0)
+
+    assert result == ("B", "b")
+    assert started == ["a", "b"]
+    assert cancelled == ["a"]
+    stats = ex.stats.as_dict()
+    assert stats["hedge_rate"] == 1.0
+    assert stats["models"]["b"]["wins"] == 1
+    assert stats["models"]["b"]["hedges"] == 1
+    assert stats["models"]["a"]["win_rate"] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_failed_primary_falls_back_immediately():
+    call, started, _ = _caller({"a": (0.0, RuntimeError("429")), "b": (0.0, "B")})
+    ex = HedgedExecutor(default_delay=10.0)
+
+    assert await ex.run(["a", "b"], call) == ("B", "b")
+    assert ex.stats.models["b"]["fallbacks"] == 1
+    assert ex.stats.hedged_requests == 0
+
+
+@pytest.mark.asyncio
+async def test_all_models_fail_raises_last_error():
+    call, _, _ = _caller({"a": (0.0, RuntimeError("a down")), "b": (0.0, RuntimeError("b down"))})
+    with pytest.raises(RuntimeError, match="b down"):
+        await HedgedExecutor().run(["a", "b"], call)
+
+
+@pytest.mark.asyncio
+async def test_hedging_disabled_is_sequential():
+    call, started, _ = _caller({"a": (0.1, "A"), "b": (0.0, "B")})
+    ex = HedgedExecutor(hedging=False, default_delay=0.01, min_delay=0.0)
+    assert await ex.run(["a", "b"], call) == ("A", "a")
+    assert started == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_losers_and_failures_add_latency_samples():
+    call, _, _ = _caller({"a": (1.0, "A"), "b": (0.01, "B"), "c": (0.0, RuntimeError("503"))})
+    ex = HedgedExecutor(latency=LatencyTracker(min_samples=1), default_delay=0.05, min_delay=0.0)
+
+    assert await ex.run(["a", "b"], call) == ("B", "b")
+    # Проигравшая основная модель проработала не меньше задержки хеджа
+    assert ex.latency.quantile("a", 0.9) >= 0.05
+
+    await ex.run(["c", "b"], call)
+    assert ex.latency.quantile("c", 0.9) is not None
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_before_min_samples_without_default_delay():
+    call, started, _ = _caller({"a": (0.1, "A"), "b": (0.0, "B")})
+    ex = HedgedExecutor(latency=LatencyTracker(min_samples=2), min_delay=0.0)
+
+    assert ex.hedge_delay("a") is None
+    assert await ex.run(["a", "b"], call) == ("A", "a")
+    assert started == ["a"]
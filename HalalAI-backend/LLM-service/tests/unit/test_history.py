@@ -0,0 +1,113 @@
+"""Тесты окна истории диалога и кэша краткого содержания."""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from halal_rag.llm.history import (
+    SUMMARY_PREFIX,
+    ConversationMemory,
+    ExtractiveSummarizer,
+    LLMSummarizer,
+)
+
+
+def _dialog(turns, question="Последний вопрос?"):
+    messages = [{"role": "system", "content": "клиентский system"}]
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"Вопрос {i}. Подробности {i}."})
+        messages.append({"role": "assistant", "content": f"Ответ {i}. Пояснение {i}."})
+    messages.append({"role": "user", "content": question})
+    return messages
+
+
+class CountingSummarizer(ExtractiveSummarizer):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    async def summarize(self, previous_summary, messages, api_key=None, model=None):
+        self.calls.append(len(messages))
+        return await super().summarize(previous_summary, messages)
+
+
+@pytest.mark.asyncio
+async def test_short_dialog_kept_verbatim_without_summary():
+    memory = ConversationMemory(keep_turns=3)
+    windowed = await memory.window(_dialog(2))
+    assert windowed.summary == ""
+    assert len(windowed.recent) == 4
+    assert all(m["role"] in ("user", "assistant") for m in windowed.as_messages())
+
+
+@pytest.mark.asyncio
+async def test_older_turns_folded_into_summary():
+    memory = ConversationMemory(keep_turns=2)
+    windowed = await memory.window(_dialog(5))
+
+    assert [m["content"] for m in windowed.recent][0] == "Вопрос 3. Подробности 3."
+    assert windowed.folded_messages == 6
+    assert "Пользователь: Вопрос 0." in windowed.summary
+    assert "Подробности 0" not in windowed.summary
+    first = windowed.as_messages()[0]
+    assert first["role"] == "system" and first["content"].startswith(SUMMARY_PREFIX)
+
+
+@pytest.mark.asyncio
+async def test_cached_summary_only_summarizes_delta():
+    summarizer = CountingSummarizer()
+    memory = ConversationMemory(summarizer=summarizer, keep_turns=1)
+
+    await memory.window(_dialog(3), conversation_id="c1")
+    await memory.window(_dialog(4), conversation_id="c1")
+    await memory.window(_dialog(4), conversation_id="c1")
+
+    assert summarizer.calls == [4, 2]
+    assert memory.stats()["cache_hits"] == 2
+    assert memory.stats()["messages_summarized"] == 6
+
+
+@pytest.mark.asyncio
+async def test_rewritten_history_rebuilds_summary():
+    summarizer = CountingSummarizer()
+    memory = ConversationMemory(summarizer=summarizer, keep_turns=1)
+    await memory.window(_dialog(3), conversation_id="c1")
+
+    edited = _dialog(4)
+    edited[1]["content"] = "Другой первый вопрос."
+    windowed = await memory.window(edited, conversation_id="c1")
+
+    assert summarizer.calls == [4, 6]
+    assert "Другой первый вопрос." in windowed.summary
+
+
+@pytest.mark.asyncio
+async def test_cache_evicts_lru_and_expired_entries():
+    now = [0.0]
+    memory = ConversationMemory(keep_turns=1, cache_size=2, ttl_seconds=10, clock=lambda: now[0])
+    for cid in ("a", "b", "c"):
+        await memory.window(_dialog(3), conversation_id=cid)
+    assert memory.stats()["conversations_cached"] == 2
+
+    now[0] = 20.0
+    await memory.window(_dialog(3), conversation_id="c")
+    assert memory.stats()["cache_misses"] == 4
+
+
+@pytest.mark.asyncio
+async def test_extractive_summary_is_bounded():
+    summarizer = ExtractiveSummarizer(max_chars=100)
+    summary = await summarizer.summarize("", [{"role": "user", "content": "слово " * 100}] * 5)
+    assert len(summary) <= 100
+    assert summary.startswith("…")
+
+
+@pytest.mark.asyncio
+async def test_llm_summarizer_falls_back_on_error():
+    llm = MagicMock()
+    llm.generate = AsyncMock(side_effect=RuntimeError("upstream down"))
+    summarizer = LLMSummarizer(llm)
+    summary = await summarizer.summarize("", [{"role": "user", "content": "Что такое закят?"}], api_key="k")
+    assert summary == "Пользователь: Что такое закят?"
+
+    llm.generate = AsyncMock(return_value="  Пользователь спросил о закяте.  ")
+    assert await summarizer.summarize("", [{"role": "user", "content": "x"}]) == "Пользователь спросил о закяте."
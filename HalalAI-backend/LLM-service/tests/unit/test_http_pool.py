@@ -0,0 +1,78 @@
+"""Настройки пула соединений и мониторинг утилизации."""
+
+import httpx
+import pytest
+
+from halal_rag.llm import http_pool
+from halal_rag.llm.http_pool import HttpPoolSettings, PoolMonitor, create_http_client
+
+
+def test_settings_from_env_overrides_defaults(monkeypatch):
+    monkeypatch.setenv("OPENROUTER_MAX_CONNECTIONS", "7")
+    monkeypatch.setenv("OPENROUTER_CONNECT_TIMEOUT", "1.5")
+    monkeypatch.setenv("OPENROUTER_HTTP2", "false")
+
+    s = HttpPoolSettings.from_env()
+
+    assert s.max_connections == 7
+    assert s.connect_timeout == 1.5
+    assert s.http2 is False
+    assert s.read_timeout == HttpPoolSettings.read_timeout
+
+
+def test_limits_and_timeouts_are_split():
+    s = HttpPoolSettings(max_connections=3, max_keepalive_connections=2, connect_timeout=1.0, read_timeout=9.0)
+    assert s.limits.max_connections == 3
+    assert s.limits.max_keepalive_connections == 2
+    assert s.timeout.connect == 1.0
+    assert s.timeout.read == 9.0
+
+
+@pytest.mark.asyncio
+async def test_http2_falls_back_without_h2(monkeypatch):
+    monkeypatch.setattr(http_pool, "http2_available", lambda: False)
+    client = create_http_client("http://upstream", HttpPoolSettings(http2=True))
+    try:
+        assert PoolMonitor(client, HttpPoolSettings(http2=True)).stats()["http2"] is False
+    finally:
+        await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_pool_monitor_tracks_in_flight_and_peak():
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json={}))
+    settings = HttpPoolSettings(max_connections=4)
+    client = create_http_client("http://upstream", settings, transport=transport)
+    monitor = PoolMonitor(client, settings)
+
+    with monitor:
+        with monitor:
+            assert monitor.stats()["in_flight"] == 2
+    stats = monitor.stats()
+
+    assert stats["in_flight"] == 0
+    assert stats["peak_in_flight"] == 2
+    assert stats["requests_total"] == 2
+    assert stats["max_connections"] == 4
+    await client.aclose()
+
+
+def test_pool_introspection_is_limited_to_checked_httpx_versions():
+    assert http_pool.pool_introspection_supported(httpx.__version__)
+    assert http_pool.pool_introspection_supported("0.24.1")
+    assert not http_pool.pool_introspection_supported("1.0.0")
+    assert not http_pool.pool_introspection_supported("dev")
+
+
+@pytest.mark.asyncio
+async def test_pool_monitor_reads_connections_on_checked_versions(monkeypatch):
+    settings = HttpPoolSettings()
+    client = create_http_client("http://upstream", settings)
+    try:
+        assert PoolMonitor(client, settings).stats()["open_connections"] == 0
+
+        monkeypatch.setattr(http_pool, "pool_introspection_supported", lambda: False)
+        stats = PoolMonitor(client, settings).stats()
+        assert stats["open_connections"] is None and stats["idle_connections"] is None
+    finally:
+        await client.aclose()
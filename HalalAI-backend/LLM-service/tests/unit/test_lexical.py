@@ -0,0 +1,91 @@
+"""Тесты BM25-индекса и reciprocal rank fusion."""
+
+import math
+import time
+
+import numpy as np
+import pytest
+
+from halal_rag.rag.lexical import BM25Index, reciprocal_rank_fusion, tokenize
+
+DOCS = [
+    "Он запретил вам мертвечину, кровь, мясо свиньи",
+    "Совершайте намаз и выплачивайте закят",
+    "Муса сказал своему народу",
+    "Ешьте из благ, которыми Мы вас наделили, и благодарите Аллаха",
+]
+
+
+@pytest.fixture
+def index():
+    idx = BM25Index()
+    idx.add_documents(DOCS)
+    return idx
+
+
+def test_tokenize_lowercases_and_folds_yo():
+    assert tokenize("Её Закят, 2:43!") == ["ее", "закят", "2", "43"]
+
+
+def test_exact_term_found(index):
+    hits = index.search("Муса", top_k=3)
+    assert hits[0][0] == 2
+    assert len(hits) == 1
+
+
+def test_unknown_terms_return_empty(index):
+    assert index.search("несуществующееслово") == []
+    assert index.scores("несуществующееслово") is None
+
+
+def test_scores_match_reference_bm25(index):
+    """Предвычисленные веса постингов совпадают с формулой BM25."""
+    k1, b = index.k1, index.b
+    docs = [tokenize(d) for d in DOCS]
+    avgdl = sum(len(d) for d in docs) / len(docs)
+    query = ["намаз", "закят", "аллаха"]
+    expected = []
+    for doc in docs:
+        score = 0.0
+        for term in query:
+            df = sum(term in d for d in docs)
+            tf = doc.count(term)
+            if tf:
+                idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / avgdl))
+        expected.append(score)
+    np.testing.assert_allclose(index.scores(" ".join(query)), expected, rtol=1e-5)
+
+
+def test_top_k_ordering(index):
+    hits = index.search("мясо свиньи закят", top_k=1)
+    assert len(hits) == 1
+    assert hits[0][0] == 0
+
+
+def test_add_documents_rebuilds(index):
+    index.add_documents(["Мертвечина запрещена"])
+    assert len(index) == 5
+    assert index.search("запрещена")[0][0] == 4
+    assert index.stats()["documents"] == 5
+
+
+def test_query_latency_on_corpus_sized_index():
+    """6236 аятов по ~20 слов: лексический путь заметно быстрее миллисекунды."""
+    rng = np.random.default_rng(0)
+    vocab = [f"слово{i}" for i in range(8000)]
+    docs = [" ".join(rng.choice(vocab, size=20)) for _ in range(6236)]
+    idx = BM25Index()
+    idx.add_documents(docs)
+    idx.search("слово1 слово2 слово3", top_k=50)
+    started = time.perf_counter()
+    for _ in range(200):
+        idx.search("слово1 слово2 слово3", top_k=50)
+    assert (time.perf_counter() - started) / 200 < 0.005  # запас для медленных CI
+
+
+def test_rrf_prefers_documents_in_both_lists():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 4]], k=60)
+    assert fused[0][0] == 3
+    assert fused[0][1] == pytest.approx(1 / 63 + 1 / 61)
+    assert {doc for doc, _ in fused} == {1, 2, 3, 4}
@@ -0,0 +1,82 @@
+"""Тесты структурированного логирования через очередь."""
+
+import io
+import json
+import logging
+
+import pytest
+
+from halal_rag.observability import logs
+
+
+@pytest.fixture
+def stream():
+    buffer = io.StringIO()
+    logs.shutdown_logging()
+    logs.configure_logging(level="INFO", fmt="json", stream=buffer)
+    yield buffer
+    logs.shutdown_logging()
+
+
+def _records(buffer):
+    return [json.loads(line) for line in buffer.getvalue().splitlines() if line.startswith("{")]
+
+
+def test_json_records_carry_request_id_and_extra(stream):
+    request_id = logs.bind_request("req-42")
+    logging.getLogger("halal.test").info("Chat request", extra={"model": "x/y"})
+    logs.shutdown_logging()  # дожидаемся фонового потока
+
+    record = [r for r in _records(stream) if r["msg"] == "Chat request"][0]
+    assert request_id == "req-42"
+    assert record["request_id"] == "req-42"
+    assert record["model"] == "x/y"
+    assert record["level"] == "INFO"
+
+
+def test_malformed_request_id_is_replaced():
+    assert logs.bind_request("bad id\nwith newline") != "bad id\nwith newline"
+    assert len(logs.bind_request(None)) == 32
+
+
+def test_debug_records_filtered_by_level(stream):
+    logging.getLogger("halal.test").debug("noise")
+    logs.shutdown_logging()
+    assert not [r for r in _records(stream) if r["msg"] == "noise"]
+
+
+def test_body_logging_flag_and_sampling(monkeypatch):
+    monkeypatch.delenv("LOG_BODIES", raising=False)
+    monkeypatch.setenv("LOG_BODY_SAMPLE_RATE", "0")
+    logs.bind_request()
+    assert logs.log_bodies() is False
+
+    monkeypatch.setenv("LOG_BODY_SAMPLE_RATE", "1")
+    logs.bind_request()
+    assert logs.log_bodies() is True
+
+    monkeypatch.setenv("LOG_BODY_SAMPLE_RATE", "0")
+    monkeypatch.setenv("LOG_BODIES", "true")
+    logs.bind_request()
+    assert logs.log_bodies() is True
+
+
+def test_operator_handlers_survive_reconfiguration(tmp_path):
+    # FileHandler — подкласс StreamHandler; его настроил оператор, а не модуль логирования
+    file_handler = logging.FileHandler(tmp_path / "service.log")
+    root = logging.getLogger()
+    root.addHandler(file_handler)
+    try:
+        logs.shutdown_logging()
+        logs.configure_logging(level="INFO", stream=io.StringIO())
+        logs.shutdown_logging()  # возвращает собственный sink в root
+        logs.configure_logging(level="INFO", stream=io.StringIO())
+
+        assert file_handler in root.handlers
+        own = [h for h in root.handlers if getattr(h, logs._SINK_TAG, False)]
+        assert own == []
+        assert sum(isinstance(h, logs._QueueHandler) for h in root.handlers) == 1
+    finally:
+        logs.shutdown_logging()
+        root.removeHandler(file_handler)
+        file_handler.close()
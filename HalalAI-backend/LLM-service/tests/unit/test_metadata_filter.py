@@ -0,0 +1,85 @@
+"""Тесты индекса метаданных: диапазоны строк по сурам и битовые маски."""
+
+import numpy as np
+import pytest
+import torch
+
+from halal_rag.rag.metadata import MetadataIndex, SearchFilter, document_order_key, verse_bounds
+from halal_rag.rag.vector_store import VectorStore
+
+
+def _corpus():
+    docs = []
+    for corpus in ("quran_ru", "quran_en"):
+        for sura, verses in ((1, 7), (2, 10), (5, 4)):
+            for verse in range(1, verses + 1):
+                docs.append({"corpus": corpus, "sura": sura, "verse": str(verse), "text": f"{corpus} {sura}:{verse}"})
+    return sorted(docs, key=document_order_key)
+
+
+@pytest.fixture
+def index():
+    idx = MetadataIndex()
+    idx.build(_corpus())
+    return idx
+
+
+def test_verse_bounds_formats():
+    assert verse_bounds({"verse": "173"}) == (173, 173)
+    assert verse_bounds({"verse": "1-3"}) == (1, 3)
+    assert verse_bounds({"verse_start": 4, "verse_end": 6}) == (4, 6)
+    assert verse_bounds({}) == (-1, -1)
+
+
+def test_sura_filter_resolves_to_contiguous_slices(index):
+    selection = index.select(SearchFilter(suras=[2]))
+    assert selection.rows is None
+    assert len(selection.slices) == 2  # по одному диапазону на каждый перевод
+    assert selection.size == 20
+
+
+def test_verse_range_narrows_slices(index):
+    selection = index.select(SearchFilter(suras=[2], verse_from=3, verse_to=5))
+    assert selection.rows is None
+    docs = _corpus()
+    assert sorted(int(docs[r]["verse"]) for r in selection.row_ids()) == [3, 3, 4, 4, 5, 5]
+
+
+def test_bitmap_filter_combines_with_sura(index):
+    selection = index.select(SearchFilter(suras=[1, 5], metadata={"corpus": ["quran_en"]}))
+    docs = _corpus()
+    rows = selection.row_ids()
+    assert len(rows) == 11
+    assert {docs[r]["corpus"] for r in rows} == {"quran_en"}
+    assert np.all(np.diff(rows) > 0)
+
+
+def test_unknown_values_match_nothing(index):
+    assert index.select(SearchFilter(suras=[99])).size == 0
+    assert index.select(SearchFilter(metadata={"translation": ["kuliev"]})).size == 0
+
+
+def test_overlapping_chunks_use_binary_search():
+    idx = MetadataIndex()
+    idx.build([{"sura": 2, "verse_start": s, "verse_end": s + 2} for s in (1, 3, 5, 7)])
+    selection = idx.select(SearchFilter(suras=[2], verse_from=4, verse_to=6))
+    assert selection.slices == [(1, 3)]
+
+
+def test_unsorted_run_falls_back_to_row_mask():
+    idx = MetadataIndex()
+    idx.build([{"sura": 2, "verse": v} for v in ("5", "1", "3")])
+    selection = idx.select(SearchFilter(suras=[2], verse_from=2, verse_to=4))
+    assert selection.row_ids().tolist() == [2]
+
+
+def test_vector_store_scores_only_selected_rows():
+    docs = _corpus()
+    store = VectorStore()
+    store.add_documents(docs, torch.randn(len(docs), 8))
+    hits = store.search(torch.randn(8), top_k=50, search_filter=SearchFilter(suras=[5], verse_to=2))
+    assert len(hits) == 4
+    assert all(h["sura"] == 5 and int(h["verse"]) <= 2 for h in hits)
+    scores, rows = store.scores_for(torch.randn(8), store.select(SearchFilter(suras=[1])))
+    assert len(scores) == len(rows) == 14
+    assert store.search(torch.randn(8), search_filter=SearchFilter(suras=[42])) == []
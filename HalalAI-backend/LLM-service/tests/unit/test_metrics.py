@@ -0,0 +1,100 @@
+"""Тесты реестра метрик и эндпоинта /metrics в формате Prometheus."""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from halal_rag.llm.retry import RetryPolicy, call_with_retry
+from halal_rag.observability import metrics
+from halal_rag.observability.metrics import MetricsRegistry
+
+
+def _sample(text, line_prefix):
+    values = [line.rsplit(" ", 1)[1] for line in text.splitlines() if line.startswith(line_prefix)]
+    return float(values[0]) if values else 0.0
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    hist = registry.histogram("t_seconds", "Test", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.labels("encode").observe(value)
+
+    text = registry.render()
+    assert "# TYPE t_seconds histogram" in text
+    assert 't_seconds_bucket{stage="encode",le="0.1"} 2' in text  # граница включительно
+    assert 't_seconds_bucket{stage="encode",le="1"} 3' in text
+    assert 't_seconds_bucket{stage="encode",le="+Inf"} 4' in text
+    assert 't_seconds_count{stage="encode"} 4' in text
+    assert 't_seconds_sum{stage="encode"} 3.65' in text
+
+
+def test_counter_gauge_and_label_escaping():
+    registry = MetricsRegistry()
+    errors = registry.counter("t_errors_total", "Errors", ["error"])
+    errors.labels('bad "quote"\n').inc(2)
+    gauge = registry.gauge("t_in_flight", "In flight")
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+
+    text = registry.render()
+    assert 't_errors_total{error="bad \\"quote\\"\\n"} 2' in text
+    assert "t_in_flight 1" in text
+
+
+def test_registry_reuses_names_and_checks_labels():
+    registry = MetricsRegistry()
+    assert registry.counter("t_total", "x") is registry.counter("t_total", "x")
+    with pytest.raises(ValueError):
+        registry.gauge("t_total", "x")
+    with pytest.raises(ValueError):
+        registry.counter("t_labelled_total", "x", ["a"]).labels()
+
+
+def test_run_queued_leaves_no_queue_depth_behind():
+    depth = metrics.QUEUE_DEPTH.labels("test")
+
+    async def run():
+        return await asyncio.gather(*(metrics.run_queued("test", lambda x: x * 2, i) for i in range(5)))
+
+    assert asyncio.run(run()) == [0, 2, 4, 6, 8]
+    assert depth.value == 0
+
+
+def test_retries_counted_by_triggering_error():
+    before = metrics.RETRIES.labels("http_503").value
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            request = httpx.Request("POST", "https://x")
+            raise httpx.HTTPStatusError("busy", request=request, response=httpx.Response(503, request=request))
+        return "ok"
+
+    async def no_sleep(_):
+        return None
+
+    policy = RetryPolicy(max_attempts=2, base_delay=0.0)
+    assert asyncio.run(call_with_retry(flaky, policy, deadline=float("inf"), sleep=no_sleep)) == "ok"
+    assert metrics.RETRIES.labels("http_503").value == before + 1
+
+
+def test_metrics_endpoint_serves_prometheus_text():
+    from halal_rag.api.main import app
+
+    with metrics.timed("encode"):
+        pass
+    client = TestClient(app)
+    client.get("/llm/health")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert _sample(response.text, 'halal_rag_stage_duration_seconds_count{stage="encode"}') >= 1
+    assert "# TYPE halal_rag_requests_in_flight gauge" in response.text
+    # Сам запрос /metrics ещё выполняется
+    assert _sample(response.text, "halal_rag_requests_in_flight ") == 1
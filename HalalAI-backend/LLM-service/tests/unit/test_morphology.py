@@ -0,0 +1,50 @@
+"""Тесты лемматизации для лексического поиска."""
+
+import pytest
+
+from halal_rag.rag import morphology
+from halal_rag.rag.lexical import BM25Index
+from halal_rag.rag.morphology import Lemmatizer
+
+pytestmark = pytest.mark.skipif(not morphology.pymorphy_available(), reason="pymorphy3 не установлен")
+
+
+@pytest.fixture(scope="module")
+def lemmatizer():
+    return Lemmatizer()
+
+
+def test_inflected_forms_share_lemma(lemmatizer):
+    assert {lemmatizer.lemma(w) for w in ("свинина", "свинину", "свинины")} == {"свинина"}
+    assert lemmatizer.lemma("аятов") == "аят"
+
+
+def test_non_cyrillic_tokens_pass_through(lemmatizer):
+    assert lemmatizer.analyze("Сура 2 abc") == ["сура", "2", "abc"]
+
+
+def test_memo_hits_after_warm():
+    lem = Lemmatizer()
+    assert lem.warm(["намаза", "намаза", "закят"]) == 2
+    lem.lemma("намаза")
+    assert lem.stats()["hit_rate"] == 1.0
+    assert lem.stats()["memo_size"] == 2
+
+
+def test_memo_is_bounded():
+    lem = Lemmatizer(cache_size=1)
+    lem.lemma("намаза")
+    lem.lemma("аятов")
+    assert lem.stats()["memo_size"] == 1
+    assert lem.lemma("аятов") == "аят"  # считается заново, но корректно
+
+
+def test_query_key_ignores_inflection(lemmatizer):
+    assert lemmatizer.query_key("Можно ли есть свинину?") == lemmatizer.query_key("можно ли есть свинина")
+
+
+def test_bm25_with_lemmas_matches_other_case(lemmatizer):
+    index = BM25Index(analyzer=lemmatizer.analyze)
+    index.add_documents(["Он запретил вам мясо свиньи и свинину", "Совершайте намаз"])
+    assert index.search("свинина")[0][0] == 0
+    assert index.search("намаза")[0][0] == 1
@@ -48,6 +48,21 @@ async def test_generate_uses_default_system_prompt(client):
     assert "HalalAI" in body["messages"][0]["content"]
 
 
+@pytest.mark.asyncio
+async def test_generate_puts_history_between_system_and_question(client):
+    mock_resp = MagicMock()
+    mock_resp.raise_for_status = MagicMock()
+    mock_resp.json.return_value = {"choices": [{"message": {"content": "ok"}}]}
+    client.client.post = AsyncMock(return_value=mock_resp)
+    history = [{"role": "user", "content": "Что такое намаз?"}, {"role": "assistant", "content": "Молитва."}]
+    await client.generate("А сколько раз?", "", api_key="k", history=history)
+
+    messages = client.client.post.await_args[1]["json"]["messages"]
+    assert [m["role"] for m in messages] == ["system", "user", "assistant", "user"]
+    assert messages[1:3] == history
+    assert "А сколько раз?" in messages[3]["content"]
+
+
 @pytest.mark.asyncio
 async def test_generate_http_error_propagates(client):
     client.client.post = AsyncMock(side_effect=httpx.HTTPError("boom"))
@@ -79,3 +94,140 @@ async def test_generate_success_without_usage_field(client):
 async def test_close_swallows_errors(client):
     client.client.aclose = AsyncMock(side_effect=RuntimeError("x"))
     await client.close()
+
+
+@pytest.mark.asyncio
+async def test_generate_total_timeout_raises_timeout_exception():
+    import asyncio
+
+    from halal_rag.llm.http_pool import HttpPoolSettings
+
+    client = OpenRouterClient(settings=HttpPoolSettings(total_timeout=0.01))
+
+    async def slow_post(*_a, **_kw):
+        await asyncio.sleep(1)
+
+    client.client.post = slow_post
+    with pytest.raises(httpx.TimeoutException, match="total timeout"):
+        await client.generate("q", "s", api_key="k")
+    assert client.stats()["pool"]["in_flight"] == 0
+
+
+def test_base_url_from_env(monkeypatch):
+    monkeypatch.setenv("OPENROUTER_BASE_URL", "http://localhost:9999/v1")
+    assert OpenRouterClient().base_url == "http://localhost:9999/v1"
+
+
+@pytest.mark.asyncio
+async def test_generate_retries_429_over_real_transport():
+    from halal_rag.llm.retry import RetryPolicy
+
+    responses = iter([
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(200, json={"choices": [{"message": {"content": "после повтора"}}]}),
+    ])
+    transport = httpx.MockTransport(lambda request: next(responses))
+    client = OpenRouterClient(base_url="http://upstream", transport=transport, retry_policy=RetryPolicy(base_delay=0))
+
+    out = await client.generate("q", "", api_key="k")
+
+    assert out == "после повтора"
+    retries = client.stats()["retries"]
+    assert retries["attempts"] == 2
+    assert retries["outcomes"] == {"recovered": 1}
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_fails_fast_without_http_call():
+    from halal_rag.llm.circuit_breaker import BreakerSettings, CircuitBreakerRegistry, CircuitOpenError
+    from halal_rag.llm.retry import RetryPolicy
+
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    client = OpenRouterClient(
+        base_url="http://upstream",
+        transport=httpx.MockTransport(handler),
+        retry_policy=RetryPolicy(max_attempts=1),
+        breakers=CircuitBreakerRegistry(BreakerSettings(min_calls=2, failure_rate_threshold=0.5)),
+    )
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.generate("q", "", api_key="k", model="down/model")
+
+    with pytest.raises(CircuitOpenError):
+        await client.generate("q", "", api_key="k", model="down/model")
+
+    assert len(calls) == 2
+    assert client.stats()["circuit_breakers"]["down/model"]["state"] == "open"
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_half_open_probe_does_not_block_the_breaker():
+    import asyncio
+
+    from halal_rag.llm.circuit_breaker import CLOSED, HALF_OPEN, BreakerSettings, CircuitBreakerRegistry
+    from halal_rag.llm.retry import RetryPolicy
+
+    now = [1000.0]
+    slow = asyncio.Event()
+
+    async def handler(request):
+        if not slow.is_set():
+            await asyncio.sleep(10)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+    breakers = CircuitBreakerRegistry(BreakerSettings(min_calls=1, open_seconds=30), clock=lambda: now[0])
+    breaker = breakers.get("m/x")
+    breaker.record(0.1, failed=True)
+    now[0] += 31
+    assert breaker.state == HALF_OPEN
+
+    client = OpenRouterClient(
+        base_url="http://upstream",
+        transport=httpx.MockTransport(handler),
+        retry_policy=RetryPolicy(max_attempts=1),
+        breakers=breakers,
+    )
+    # Пробный вызов проигрывает хедж / клиент отключается
+    probe = asyncio.create_task(client.generate("q", "", api_key="k", model="m/x"))
+    await asyncio.sleep(0.05)
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    slow.set()
+    assert await client.generate("q", "", api_key="k", model="m/x") == "ok"
+    assert breaker.state == CLOSED
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_usage_recorded_per_model_and_key():
+    def handler(request):
+        if request.headers["Authorization"] == "Bearer bad":
+            return httpx.Response(401, json={"error": "unauthorized"})
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": "ok"}}],
+            "usage": {"prompt_tokens": 30, "completion_tokens": 5, "total_tokens": 35},
+        })
+
+    client = OpenRouterClient(base_url="https://fake.local", transport=httpx.MockTransport(handler))
+    await client.generate("q", "", api_key="good", model="x/y")
+    with pytest.raises(httpx.HTTPStatusError):
+        await client.generate("q", "", api_key="bad", model="x/y")
+
+    usage = client.usage_stats()
+    model = usage["models"]["x/y"]
+    assert model["calls"] == 2
+    assert model["errors"] == {"http_401": 1}
+    assert model["prompt_tokens"] == 30
+    assert model["ttft"]["count"] == 1
+    assert len(usage["api_keys"]) == 2
+    assert all(label.startswith("key_") for label in usage["api_keys"])
+    await client.close()
@@ -0,0 +1,58 @@
+"""Pre-fork entry point без реального fork и загрузки модели."""
+
+from unittest.mock import MagicMock
+
+import torch
+from torch import nn
+
+from halal_rag.api import dependencies, prefork
+
+
+def test_preload_sets_rag_and_freezes_gc(monkeypatch):
+    rag = MagicMock()
+    rag.embeddings.model = nn.Linear(2, 2)
+    rag.store.embeddings = torch.randn(4, 3).t()
+    monkeypatch.setattr(prefork, "load_rag", lambda: rag)
+    freeze = MagicMock()
+    monkeypatch.setattr(prefork.gc, "freeze", freeze)
+
+    prefork.preload()
+
+    assert dependencies.get_rag() is rag
+    freeze.assert_called_once()
+    assert all(not p.requires_grad for p in rag.embeddings.model.parameters())
+    assert rag.store.embeddings.is_contiguous()
+
+
+def test_preload_reenables_gc_when_loading_fails(monkeypatch):
+    def boom():
+        raise FileNotFoundError("no data")
+
+    monkeypatch.setattr(prefork, "load_rag", boom)
+    try:
+        prefork.preload()
+    except FileNotFoundError:
+        pass
+    assert prefork.gc.isenabled()
+    assert dependencies.get_rag() is None
+
+
+def test_main_passes_cli_arguments_to_serve(monkeypatch):
+    serve = MagicMock()
+    monkeypatch.setattr(prefork, "serve", serve)
+
+    prefork.main(["--host", "127.0.0.1", "--port", "9001", "--workers", "3", "--threads", "2"])
+
+    serve.assert_called_once_with("127.0.0.1", 9001, 3, 2)
+
+
+def test_main_reads_worker_count_from_env(monkeypatch):
+    serve = MagicMock()
+    monkeypatch.setattr(prefork, "serve", serve)
+    monkeypatch.setenv("RAG_WORKERS", "5")
+    monkeypatch.delenv("RAG_WORKER_THREADS", raising=False)
+
+    prefork.main([])
+
+    assert serve.call_args[0][2] == 5
+    assert serve.call_args[0][3] is None
@@ -0,0 +1,76 @@
+"""Тесты сэмплирующего профилировщика и эндпоинта /admin/profile."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from halal_rag.observability import profiler
+
+
+def busy_encode(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+async def waiting_request():
+    await asyncio.sleep(10)
+
+
+@pytest.mark.asyncio
+async def test_profile_samples_threads_and_suspended_tasks():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_encode, args=(stop,), name="asyncio_0")
+    worker.start()
+    task = asyncio.create_task(waiting_request())
+    try:
+        result = await profiler.profile(0.2, interval=0.005)
+    finally:
+        stop.set()
+        worker.join()
+        task.cancel()
+
+    lines = result.collapsed().splitlines()
+    assert result.ticks > 5
+    assert any(line.startswith("thread:asyncio_0;") and "test_profiler:busy_encode" in line for line in lines)
+    assert any(line.startswith("asyncio-task;") and "test_profiler:waiting_request" in line for line in lines)
+    # Формат folded: «кадр;кадр;... число»
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+@pytest.mark.asyncio
+async def test_profile_stops_after_requests_and_rejects_a_second_run():
+    async def traffic():
+        await asyncio.sleep(0.05)
+        with pytest.raises(profiler.ProfilerBusyError):
+            await profiler.profile(1)
+        profiler.request_finished()
+        profiler.request_finished()
+
+    started = time.monotonic()
+    result, _ = await asyncio.gather(profiler.profile(5, requests=2, include_tasks=False), traffic())
+
+    assert result.requests == 2
+    assert time.monotonic() - started < 2
+    assert profiler._active is None
+    profiler.request_finished()  # без активного профиля — ничего не происходит
+
+
+def test_admin_profile_endpoint_requires_token(monkeypatch):
+    from halal_rag.api.main import app
+
+    client = TestClient(app)
+    monkeypatch.delenv("LLM_ADMIN_TOKEN", raising=False)
+    assert client.post("/admin/profile?seconds=0.05").status_code == 404
+
+    monkeypatch.setenv("LLM_ADMIN_TOKEN", "s3cret")
+    assert client.post("/admin/profile?seconds=0.05", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.post("/admin/profile?seconds=0", headers={"X-Admin-Token": "s3cret"}).status_code == 400
+
+    response = client.post("/admin/profile?seconds=0.1", headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200
+    assert response.headers["content-disposition"].endswith('.folded"')
+    assert int(response.headers["x-profile-samples"]) > 0
+    assert "thread:" in response.text
@@ -0,0 +1,67 @@
+"""Тесты разбора явных ссылок на аяты и словаря (сура, аят) -> строки."""
+
+import pytest
+
+from halal_rag.rag.references import SURA_ALIASES, VerseLookup, VerseRef, normalize_name, parse_references
+
+
+@pytest.mark.parametrize(
+    "query, refs",
+    [
+        ("2:173", [VerseRef(2, 173, 173)]),
+        ("сура 5 аят 90", [VerseRef(5, 90, 90)]),
+        ("суры 5, аяты 90-91", [VerseRef(5, 90, 91)]),
+        ("90-й аят суры 5", [VerseRef(5, 90, 90)]),
+        ("покажи 5:90-93 и 2:219", [VerseRef(5, 90, 93), VerseRef(2, 219, 219)]),
+        ("сура 112", [VerseRef(112)]),
+        ("сура Аль-Бакара", [VerseRef(2)]),
+        ("в суре Корова: 255", [VerseRef(2, 255, 255)]),
+        ("сура Семейство Имрана аяты 3-5", [VerseRef(3, 3, 5)]),
+        ("сура 200:1", []),
+        ("сура 2:25", [VerseRef(2, 25, 25)]),
+        ("покажи 2:25", [VerseRef(2, 25, 25)]),
+        ("аят 10:30 про время", [VerseRef(10, 30, 30)]),
+        ("встреча в 10:30", []),
+        ("можно ли есть до 05:45 в рамадан?", []),
+        ("что говорит коран о намазе в 12:30", []),
+        ("намаз в 12:30 и сура 5:90", [VerseRef(5, 90, 90)]),
+        ("ресурсы 5", []),
+        ("ресурсы время", []),
+        ("перестихотворение 5 сура 2", [VerseRef(2)]),
+        ("Что такое время?", []),
+        ("люди и свет", []),
+        ("сура Время", [VerseRef(103)]),
+    ],
+)
+def test_parse_references(query, refs):
+    assert parse_references(query).refs == refs
+
+
+def test_pure_and_mixed_queries():
+    assert parse_references("сура 5 аят 90").is_pure
+    assert parse_references("покажи 2:173").is_pure
+    mixed = parse_references("Что говорится в суре Аль-Бакара о посте?")
+    assert mixed.refs == [VerseRef(2)]
+    assert not mixed.is_pure
+    assert "пост" in mixed.remainder and "бакара" not in mixed.remainder
+    plain = parse_references("Что Коран говорит о свинине?")
+    assert plain.refs == [] and not plain.is_pure
+
+
+def test_alias_table_covers_every_sura():
+    assert set(SURA_ALIASES.values()) == set(range(1, 115))
+    assert normalize_name("Аль-Бакара") == normalize_name("аль бакара") == "бакара"
+
+
+def test_verse_lookup_rows():
+    docs = [
+        {"sura": 2, "verse": "172"},
+        {"sura": 2, "verse": "173"},
+        {"sura": 2, "verse_start": 173, "verse_end": 175},
+        {"sura": 5, "verse": "3"},
+    ]
+    lookup = VerseLookup(docs)
+    assert lookup.rows(VerseRef(2, 173, 173)) == [1, 2]
+    assert lookup.rows(VerseRef(2, 172, 175)) == [0, 1, 2]
+    assert lookup.rows(VerseRef(2), limit=2) == [0, 1]
+    assert lookup.rows(VerseRef(9, 1, 1)) == []
@@ -0,0 +1,162 @@
+"""Тесты реестра корпусов: общий энкодер, шарды, маршрутизация и память."""
+
+import json
+import threading
+from unittest.mock import MagicMock
+
+import torch
+
+from halal_rag.rag.metadata import SearchFilter
+from halal_rag.rag.registry import (
+    IndexRegistry,
+    SharedEncoder,
+    parse_corpora,
+    merge_ranked,
+    shard_documents,
+)
+from halal_rag.rag.retriever import SimpleRAG
+
+
+class HashEncoder:
+    dim = 8
+
+    def __init__(self):
+        self.single_calls = 0
+
+    def encode(self, texts):
+        return torch.stack([torch.randn(self.dim, generator=torch.Generator().manual_seed(len(t))) for t in texts])
+
+    def encode_single(self, text):
+        self.single_calls += 1
+        return self.encode([text])[0]
+
+
+def _write(path, docs):
+    path.write_text("\n".join(json.dumps(d, ensure_ascii=False) for d in docs), encoding="utf-8")
+    return path
+
+
+def _registry(tmp_path, encoder, quran_shards=2, **options):
+    quran = [{"sura": s, "verse": str(v), "text": f"аят {s}:{v}" + "!" * (s * v)} for s in (1, 2, 3) for v in (1, 2)]
+    hadith = [{"reference": f"Бухари {i}", "text": f"хадис {i}" + "?" * i} for i in range(3)]
+    specs = parse_corpora(
+        f"quran_ru={_write(tmp_path / 'q.jsonl', quran)}:{quran_shards},hadith={_write(tmp_path / 'h.jsonl', hadith)}"
+    )
+
+    def pipeline(documents, embeddings):
+        return SimpleRAG(documents, embeddings=embeddings, hybrid=False, references=False, **options)
+
+    return IndexRegistry.build(specs, pipeline, encoder, default=["quran_ru"])
+
+
+def test_parse_corpora_with_shards():
+    specs = parse_corpora("quran_ru=data/quran_ru.jsonl, hadith=/srv/h.jsonl:4")
+    assert [(s.name, str(s.path), s.shards) for s in specs] == [
+        ("quran_ru", "data/quran_ru.jsonl", 1),
+        ("hadith", "/srv/h.jsonl", 4),
+    ]
+
+
+def test_shards_do_not_split_suras():
+    docs = [{"sura": s, "verse": str(v)} for s in (1, 2, 3, 4) for v in range(1, 4)]
+    parts = shard_documents(docs, 2)
+    assert [len(p) for p in parts] == [6, 6]
+    assert {d["sura"] for d in parts[0]} == {1, 2}
+
+
+def test_shared_encoder_memoises_queries():
+    inner = HashEncoder()
+    shared = SharedEncoder(inner, cache_size=1)
+    shared.encode_single("a")
+    shared.encode_single("a")
+    shared.encode_single("b")
+    shared.encode_single("a")
+    assert inner.single_calls == 3
+
+
+def test_shared_encoder_memo_is_safe_across_threads():
+    # Шарды ищут в разных потоках с одним и тем же кэшем эмбеддингов запросов
+    shared = SharedEncoder(HashEncoder(), cache_size=2)
+    errors = []
+
+    def worker(offset):
+        try:
+            for i in range(500):
+                shared.encode_single(f"q{(offset + i) % 6}")
+        except Exception as e:  # pragma: no cover - только при гонке
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert len(shared._queries) == 2
+
+
+def test_routing_touches_only_requested_corpora(tmp_path):
+    encoder = HashEncoder()
+    registry = _registry(tmp_path, encoder)
+    quran, hadith = registry.corpora["quran_ru"], registry.corpora["hadith"]
+    assert len(quran) == 2 and len(hadith) == 1
+    assert all(shard.embeddings is registry.embeddings for shard in registry.pipelines())
+
+    for shard in registry.pipelines():
+        shard.search = MagicMock(wraps=shard.search)
+
+    hits = registry.search("вопрос", top_k=3)
+    assert all(h["corpus"] == "quran_ru" for h in hits)
+    hadith[0].search.assert_not_called()
+    assert encoder.single_calls == 1  # один проход энкодера на оба шарда
+
+    hits = registry.search("вопрос", top_k=10, search_filter=SearchFilter(metadata={"corpus": ["hadith"]}))
+    assert [h["corpus"] for h in hits] == ["hadith"] * 3
+    _, kwargs = hadith[0].search.call_args
+    assert kwargs["search_filter"] is None
+
+    both = registry.search("вопрос", top_k=20, search_filter=SearchFilter(metadata={"corpus": ["quran_ru", "hadith"]}))
+    assert len(both) == 9
+    assert [h["score"] for h in both] == sorted((h["score"] for h in both), reverse=True)
+
+
+def test_mmr_runs_once_over_the_merged_shard_pool(tmp_path):
+    encoder = HashEncoder()
+    single = _registry(tmp_path, encoder, quran_shards=1, mmr_lambda=0.3)
+    sharded = _registry(tmp_path, encoder, quran_shards=2, mmr_lambda=0.3)
+    for shard in sharded.pipelines():
+        shard.search = MagicMock(wraps=shard.search)
+
+    expected = [(h["sura"], h["verse"]) for h in single.search("вопрос", top_k=4)]
+    assert [(h["sura"], h["verse"]) for h in sharded.search("вопрос", top_k=4)] == expected
+    # Шарды отдают пул по релевантности, разнообразие выбирается один раз после слияния
+    _, kwargs = sharded.corpora["quran_ru"][0].search.call_args
+    assert kwargs["mmr_lambda"] == 1.0 and kwargs["top_k"] == 20
+
+
+def test_merge_ranked_fuses_hybrid_hits_over_merged_ranks():
+    # Оба шарда поставили свой лучший документ первым: локальные RRF равны, но сравнимы только cosine и BM25
+    hits = [
+        {"text": "a", "score": 0.9, "bm25_score": 5.0, "rrf_score": 2 / 61},
+        {"text": "b", "score": 0.5, "bm25_score": 0.0, "rrf_score": 1 / 61},
+        {"text": "c", "score": 0.4, "bm25_score": 1.0, "rrf_score": 2 / 61},
+        {"text": "d", "score": 0.8, "bm25_score": 4.0, "rrf_score": 1 / 62},
+    ]
+    merged = merge_ranked(hits, rrf_k=60)
+    assert [doc["text"] for _, doc in merged] == ["a", "d", "c", "b"]
+    assert [i for i, _ in merged] == [0, 3, 2, 1]
+    assert merged[0][1]["rrf_score"] == 2 / 61 and merged[1][1]["rrf_score"] == 2 / 62
+    assert hits[3]["rrf_score"] == 1 / 62  # исходные хиты не меняются
+
+    reranked = [dict(doc, rerank_score=-i) for i, doc in enumerate(hits)]
+    assert [i for i, _ in merge_ranked(reranked)] == [0, 1, 2, 3]
+
+
+def test_stats_report_memory_per_corpus(tmp_path):
+    stats = _registry(tmp_path, HashEncoder()).stats()
+    quran = stats["corpora"]["quran_ru"]
+    assert quran["documents"] == 6 and quran["shards"] == 2
+    assert quran["memory_bytes"]["embeddings"] == 6 * 8 * 4
+    assert quran["memory_bytes_total"] > quran["memory_bytes"]["embeddings"]
+    assert stats["default"] == ["quran_ru"]
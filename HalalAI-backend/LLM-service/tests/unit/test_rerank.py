@@ -0,0 +1,121 @@
+"""Тесты каскадного переранжирования с бюджетом задержки и кэшем оценок."""
+
+import threading
+
+from halal_rag.rag.rerank import PairCostModel, Reranker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeScorer:
+    """Оценка — число в тексте; каждая пара «стоит» pair_ms по часам теста."""
+
+    def __init__(self, clock: FakeClock, pair_ms: float = 1.0):
+        self.clock = clock
+        self.pair_ms = pair_ms
+        self.batches: list[int] = []
+
+    def score(self, query, passages):
+        self.batches.append(len(passages))
+        self.clock.now += len(passages) * self.pair_ms / 1000
+        return [float(p.split()[-1]) for p in passages]
+
+
+def _candidates(values):
+    return [{"text": f"doc {v}", "score": 1.0 - i / 100} for i, v in enumerate(values)]
+
+
+def _reranker(budget_ms=1000.0, pair_ms=1.0, **kwargs):
+    clock = FakeClock()
+    scorer = FakeScorer(clock, pair_ms)
+    reranker = Reranker(scorer, budget_ms=budget_ms, clock=clock, **kwargs)
+    reranker.cost = PairCostModel(pair_ms=pair_ms, batch_ms=0.0)
+    return reranker, scorer
+
+
+def test_rerank_reorders_by_cross_encoder_score():
+    reranker, scorer = _reranker(batch_size=4)
+    results = reranker.rerank("q", _candidates([1, 5, 3, 9, 2, 7]), top_k=3)
+    assert [r["rerank_score"] for r in results] == [9.0, 7.0, 5.0]
+    assert scorer.batches == [4, 2]
+
+
+def test_budget_limits_candidate_count():
+    reranker, scorer = _reranker(budget_ms=5.0, batch_size=2, min_candidates=1)
+    results = reranker.rerank("q", _candidates([1, 2, 3, 4, 5, 9, 8, 7]), top_k=8)
+    assert sum(scorer.batches) == 5
+    # Непереоценённые кандидаты идут после переоценённых в исходном порядке
+    assert [r["text"] for r in results[5:]] == ["doc 9", "doc 8", "doc 7"]
+    assert "rerank_score" not in results[-1]
+
+
+def test_deadline_stops_between_batches_when_model_is_slower_than_predicted():
+    reranker, scorer = _reranker(budget_ms=8.0, pair_ms=1.0, batch_size=2, min_candidates=1)
+    scorer.pair_ms = 3.0  # реальная модель медленнее оценки
+    results = reranker.rerank("q", _candidates(range(10)), top_k=3)
+    # План — 8 пар, но после первого пакета (6 мс) следующий уже не укладывается
+    assert scorer.batches == [2]
+    assert [r["text"] for r in results] == ["doc 1", "doc 0", "doc 2"]
+    assert reranker.stats()["budget_cuts"] == 1
+    assert reranker.cost.pair_ms > 1.0
+
+
+def test_cached_pairs_are_free_and_reused():
+    reranker, scorer = _reranker(batch_size=8)
+    first = reranker.rerank("Свинина", _candidates([1, 2, 3]), top_k=3)
+    second = reranker.rerank("  свинина ", _candidates([1, 2, 3]), top_k=3)
+    assert first == second
+    assert scorer.batches == [3]
+    assert reranker.stats()["cache_hits"] == 3
+
+
+def test_cache_is_bounded():
+    reranker, _ = _reranker(cache_size=2)
+    reranker.rerank("q", _candidates([1, 2, 3]), top_k=3)
+    assert reranker.stats()["cache_size"] == 2
+
+
+def test_cache_is_safe_across_threads():
+    # Поиски идут в потоках run_queued: вытеснение между get и move_to_end не должно падать
+    reranker, _ = _reranker(cache_size=4)
+    errors = []
+
+    def worker(offset):
+        try:
+            for i in range(2000):
+                key = ("q", (offset + i) % 16)
+                reranker._store(key, 1.0)
+                reranker._cached(key)
+                reranker._cached(("q", (offset - i) % 16))
+        except Exception as e:  # pragma: no cover - только при гонке
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert reranker.stats()["cache_size"] == 4
+
+
+def test_min_candidates_is_a_floor():
+    reranker, scorer = _reranker(budget_ms=0.0, min_candidates=2)
+    reranker.rerank("q", _candidates([1, 2, 3]), top_k=1)
+    assert scorer.batches == [2]
+
+
+def test_from_env_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("RAG_RERANK", raising=False)
+    assert Reranker.from_env() is None
+    monkeypatch.setenv("RAG_RERANK", "true")
+    monkeypatch.setenv("RAG_RERANK_CANDIDATES", "12")
+    reranker = Reranker.from_env()
+    assert reranker.max_candidates == 12
@@ -0,0 +1,122 @@
+"""Политика повторов: full jitter, Retry-After и бюджет по дедлайну."""
+
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+from halal_rag.llm.retry import RetryPolicy, RetryStats, call_with_retry, parse_retry_after
+
+
+def _status_error(status: int, retry_after: str = None) -> httpx.HTTPStatusError:
+    headers = {"Retry-After": retry_after} if retry_after else {}
+    request = httpx.Request("POST", "http://upstream/chat/completions")
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError(f"{status}", request=request, response=response)
+
+
+class _Sleeps:
+    def __init__(self):
+        self.delays = []
+
+    async def __call__(self, delay):
+        self.delays.append(delay)
+
+
+def test_parse_retry_after_seconds_and_date():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("-1") == 0.0
+    now = datetime(2026, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+    assert parse_retry_after(format_datetime(now + timedelta(seconds=10), usegmt=True), now=now) == 10.0
+    assert parse_retry_after("garbage") is None
+    assert parse_retry_after(None) is None
+
+
+def test_backoff_is_bounded_by_exponential_cap():
+    policy = RetryPolicy(base_delay=0.5, max_delay=2.0)
+    for _ in range(50):
+        assert 0.0 <= policy.backoff(1) <= 0.5
+        assert 0.0 <= policy.backoff(2) <= 1.0
+        assert 0.0 <= policy.backoff(10) <= 2.0
+
+
+def test_retryable_classification():
+    policy = RetryPolicy()
+    assert policy.is_retryable(_status_error(429))
+    assert policy.is_retryable(_status_error(503))
+    assert policy.is_retryable(httpx.ConnectError("refused"))
+    assert not policy.is_retryable(_status_error(401))
+    assert not policy.is_retryable(ValueError("bad json"))
+
+
+@pytest.mark.asyncio
+async def test_recovers_after_429_and_honors_retry_after():
+    calls = []
+
+    async def func():
+        calls.append(1)
+        if len(calls) == 1:
+            raise _status_error(429, retry_after="2")
+        return "ok"
+
+    sleeps, stats = _Sleeps(), RetryStats()
+    out = await call_with_retry(func, RetryPolicy(), time.monotonic() + 60, stats, sleep=sleeps)
+
+    assert out == "ok"
+    assert sleeps.delays == [2.0]
+    assert stats.attempts == 2
+    assert stats.outcomes["recovered"] == 1
+    assert stats.retried_statuses[429] == 1
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_attempts():
+    async def func():
+        raise _status_error(502)
+
+    stats = RetryStats()
+    with pytest.raises(httpx.HTTPStatusError):
+        await call_with_retry(func, RetryPolicy(max_attempts=3), time.monotonic() + 60, stats, sleep=_Sleeps())
+    assert stats.attempts == 3
+    assert stats.outcomes["exhausted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_error_raises_immediately():
+    async def func():
+        raise _status_error(401)
+
+    stats = RetryStats()
+    with pytest.raises(httpx.HTTPStatusError):
+        await call_with_retry(func, RetryPolicy(), time.monotonic() + 60, stats, sleep=_Sleeps())
+    assert stats.attempts == 1
+    assert stats.outcomes["non_retryable"] == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_after_beyond_deadline_is_not_waited_for():
+    async def func():
+        raise _status_error(429, retry_after="30")
+
+    sleeps, stats = _Sleeps(), RetryStats()
+    with pytest.raises(httpx.HTTPStatusError):
+        await call_with_retry(func, RetryPolicy(), time.monotonic() + 5, stats, sleep=sleeps)
+    assert sleeps.delays == []
+    assert stats.outcomes["budget_exhausted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_after_above_cap_stops_retrying():
+    async def func():
+        raise _status_error(503, retry_after="120")
+
+    sleeps, stats = _Sleeps(), RetryStats()
+    policy = RetryPolicy(max_retry_after=30)
+    with pytest.raises(httpx.HTTPStatusError):
+        await call_with_retry(func, policy, time.monotonic() + 600, stats, sleep=sleeps)
+    # Повтор через 30 с вместо запрошенных 120 был бы ещё одним отказом
+    assert sleeps.delays == []
+    assert stats.outcomes["budget_exhausted"] == 1
+    assert policy.delay_for(_status_error(429, retry_after="30"), 1) == 30.0
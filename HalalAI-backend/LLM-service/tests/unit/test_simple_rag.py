@@ -50,3 +50,155 @@ def test_simple_rag_search_returns_ranked_docs():
     assert len(hits) >= 1
     assert hits[0]["text"] == "alpha doc"
     assert "score" in hits[0]
+
+
+def test_hybrid_search_is_opt_in(monkeypatch):
+    """Без RAG_HYBRID поиск только векторный: порядок и score прежние."""
+    docs = [{"text": "alpha doc", "sura": 1, "verse": "1"}, {"text": "beta doc", "sura": 2, "verse": "2"}]
+    monkeypatch.delenv("RAG_HYBRID", raising=False)
+    with patch("halal_rag.rag.retriever.EmbeddingModel", MagicMock(return_value=_fake_embedding_model())):
+        rag = SimpleRAG(docs)
+        monkeypatch.setenv("RAG_HYBRID", "true")
+        hybrid = SimpleRAG(docs)
+    assert rag.hybrid is False and rag.lexical is None
+    assert "rrf_score" not in rag.search("alpha", top_k=1)[0]
+    assert hybrid.hybrid is True
+
+
+def test_hybrid_search_surfaces_exact_term_missed_by_dense():
+    """BM25-ветка поднимает документ с точным совпадением слова, который dense-поиск не нашёл."""
+    fake = _fake_embedding_model()
+    docs = [
+        {"text": "alpha doc", "sura": 1, "verse": "1"},
+        {"text": "beta doc", "sura": 2, "verse": "2"},
+        {"text": "Муса и Харун", "sura": 20, "verse": "30"},
+    ]
+    with patch("halal_rag.rag.retriever.EmbeddingModel", MagicMock(return_value=fake)):
+        rag = SimpleRAG(docs, hybrid=True)
+        dense_only = SimpleRAG(docs, hybrid=False)
+
+    assert all(h["sura"] != 20 for h in dense_only.search("Муса", top_k=1))
+    hits = rag.search("Муса", top_k=2)
+    assert 20 in [h["sura"] for h in hits]
+    lexical_hit = next(h for h in hits if h["sura"] == 20)
+    assert lexical_hit["bm25_score"] > 0
+    assert "rrf_score" in lexical_hit
+    assert -1.0 <= lexical_hit["score"] <= 1.0
+
+
+def test_hybrid_search_respects_sura_filter():
+    from halal_rag.rag.metadata import SearchFilter
+
+    fake = _fake_embedding_model()
+    docs = [
+        {"text": "alpha doc", "sura": 1, "verse": "1"},
+        {"text": "beta doc", "sura": 2, "verse": "2"},
+        {"text": "alpha again", "sura": 2, "verse": "3"},
+    ]
+    with patch("halal_rag.rag.retriever.EmbeddingModel", MagicMock(return_value=fake)):
+        rag = SimpleRAG(docs, hybrid=True)
+    hits = rag.search("alpha", top_k=3, search_filter=SearchFilter(suras=[2]))
+    assert {h["sura"] for h in hits} == {2}
+    assert hits[0]["verse"] == "3"
+
+
+def test_search_with_reranker_widens_first_stage():
+    fake = _fake_embedding_model()
+    docs = [
+        {"text": "alpha doc", "sura": 1, "verse": "1"},
+        {"text": "beta doc", "sura": 2, "verse": "2"},
+        {"text": "gamma doc", "sura": 3, "verse": "3"},
+    ]
+    reranker = MagicMock(max_candidates=10)
+    reranker.rerank.side_effect = lambda query, candidates, top_k: candidates[::-1][:top_k]
+    with patch("halal_rag.rag.retriever.EmbeddingModel", MagicMock(return_value=fake)):
+        rag = SimpleRAG(docs, hybrid=False, reranker=reranker)
+    hits = rag.search("alpha", top_k=1)
+    _, candidates, top_k = reranker.rerank.call_args.args
+    assert len(candidates) == 3 and top_k == 1
+    assert hits == [candidates[-1]]
+
+
+def test_mmr_search_drops_duplicate_verse():
+    class DupEmb:
+        def encode(self, texts):
+            return torch.tensor([[1.0, 0.0], [1.0, 0.01], [0.6, 0.8], [0.0, 1.0]])[: len(texts)]
+
+        def encode_single(self, text):
+            return torch.tensor([1.0, 0.1])
+
+    docs = [
+        {"text": "first", "sura": 1, "verse": "1"},
+        {"text": "copy", "sura": 1, "verse": "2"},
+        {"text": "other", "sura": 1, "verse": "3"},
+        {"text": "far", "sura": 1, "verse": "4"},
+    ]
+    with patch("halal_rag.rag.retriever.EmbeddingModel", MagicMock(return_value=DupEmb())):
+        rag = SimpleRAG(docs, hybrid=False)
+    assert [h["text"] for h in rag.search("q", top_k=2)] == ["copy", "first"]
+    assert [h["text"] for h in rag.search("q", top_k=2, mmr_lambda=0.5)] == ["copy", "other"]
+
+
+def test_context_window_expands_hit_without_extra_encoding():
+    fake = _fake_embedding_model()
+    docs = [{"text": t, "sura": 1, "verse": str(v)} for v, t in enumerate(["first", "second", "third"], start=1)]
+    encode = MagicMock(side_effect=fake.encode)
+    fake.encode = encode
+    with patch("halal_rag.rag.retriever.EmbeddingModel", MagicMock(return_value=fake)):
+        rag = SimpleRAG(docs, hybrid=False)
+    hits = rag.search("beta", top_k=1, context_window=1)
+    assert encode.call_count == 1
+    assert hits[0]["verse"] == "1-3"
+    assert hits[0]["text"] == "first\nsecond\nthird"
+
+
+def _reference_rag():
+    fake = _fake_embedding_model()
+    encode_single = MagicMock(side_effect=fake.encode_single)
+    fake.encode_single = encode_single
+    docs = [
+        {"text": "alpha", "sura": 2, "verse": "172"},
+        {"text": "pork", "sura": 2, "verse": "173"},
+        {"text": "wine", "sura": 5, "verse": "90"},
+    ]
+    with patch("halal_rag.rag.retriever.EmbeddingModel", MagicMock(return_value=fake)):
+        rag = SimpleRAG(docs, hybrid=False)
+    return rag, encode_single
+
+
+def test_pure_reference_skips_embedding():
+    rag, encode_single = _reference_rag()
+    hits = rag.search("сура 5 аят 90", top_k=3)
+    assert encode_single.call_count == 0
+    assert [(h["sura"], h["verse"], h["match"]) for h in hits] == [(5, "90", "reference")]
+
+
+def test_mixed_reference_query_merges_with_semantic_results():
+    rag, encode_single = _reference_rag()
+    hits = rag.search("alpha и 5:90", top_k=2)
+    assert encode_single.call_count == 1
+    assert hits[0]["verse"] == "90" and hits[0]["score"] == 1.0
+    assert "match" not in hits[1] and hits[1]["verse"] != "90"
+
+
+def test_named_sura_narrows_semantic_search():
+    rag, _ = _reference_rag()
+    hits = rag.search("о вине в суре Трапеза", top_k=3)
+    assert {h["sura"] for h in hits} == {5}
+
+
+def test_expander_vectors_and_lexical_query_are_used():
+    fake = _fake_embedding_model()
+    docs = [
+        {"text": "молитва в пути", "sura": 4, "verse": "101"},
+        {"text": "другое", "sura": 2, "verse": "1"},
+    ]
+    expander = MagicMock()
+    expander.query_vectors.return_value = torch.tensor([[0.0, 0.0, 1.0, 0.0], [1.0, 0.0, 0.0, 0.0]])
+    expander.lexical_query.return_value = "намаз молитва"
+    with patch("halal_rag.rag.retriever.EmbeddingModel", MagicMock(return_value=fake)):
+        rag = SimpleRAG(docs, hybrid=True, lemmatize=False, expander=expander)
+    hits = rag.search("намаз", top_k=1)
+    expander.query_vectors.assert_called_once_with("намаз")
+    assert hits[0]["text"] == "молитва в пути"
+    assert hits[0]["bm25_score"] > 0
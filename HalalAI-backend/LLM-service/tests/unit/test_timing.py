@@ -0,0 +1,43 @@
+"""Тесты поэтапных таймингов запроса для заголовка Server-Timing."""
+
+import asyncio
+
+from halal_rag.observability import timing
+from halal_rag.observability.metrics import timed
+from halal_rag.observability.timing import RequestTimings
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_repeated_stages_are_summed_and_total_defaults_to_elapsed():
+    clock = FakeClock()
+    timings = RequestTimings(clock=clock)
+    timings.add("encode", 0.002)
+    timings.add("search", 0.0035)
+    timings.add("encode", 0.001)  # второй шард
+    clock.now += 0.25
+
+    assert timings.as_dict() == {"encode": 3.0, "search": 3.5, "total": 250.0}
+    assert timings.header() == "encode;dur=3.0, search;dur=3.5, total;dur=250.0"
+
+
+def test_timed_records_into_the_bound_request_only():
+    timing.record_stage("orphan", 1.0)  # без привязанного запроса — ничего не происходит
+
+    async def request():
+        timings = timing.bind_timings()
+        with timed("prompt_build"):
+            pass
+        # Потоки asyncio.to_thread наследуют контекст запроса
+        await asyncio.to_thread(lambda: timing.record_stage("search", 0.004))
+        return timings
+
+    timings = asyncio.run(request())
+    assert set(timings.stages) == {"prompt_build", "search"}
+    assert timings.stages["search"] == 0.004
@@ -0,0 +1,110 @@
+"""Тесты оценки токенов и обрезки источников под бюджет промпта."""
+
+from halal_rag.llm.token_budget import PromptBudgeter, TokenCounter, _parse_mapping
+
+
+def _source(verse, score, words=40):
+    return {"sura": 2, "verse": str(verse), "text": " ".join(["слово"] * words), "score": score}
+
+
+def test_counter_estimate_cyrillic_denser_than_latin():
+    counter = TokenCounter()
+    assert not counter.exact
+    assert counter.count("") == 0
+    assert counter.count("а" * 300) == 100
+    assert counter.count("a" * 400) == 100
+
+
+def test_counter_unknown_tokenizer_falls_back_to_estimate():
+    counter = TokenCounter("no/such-tokenizer-for-tests")
+    assert not counter.exact
+    assert counter.count("abcd") == 1
+
+
+def test_parse_mapping():
+    assert _parse_mapping("a/m=1000, b/m:free=2000,broken") == {"a/m": 1000, "b/m:free": 2000}
+
+
+def test_budget_uses_smallest_window_in_chain():
+    budgeter = PromptBudgeter(
+        context_windows={"small": 4000, "big": 100000}, default_context_window=8000, safety_margin=0
+    )
+    assert budgeter.budget_for(["big", "small"], 1000) == 3000
+    assert budgeter.budget_for(["unknown"], 1000) == 7000
+    assert PromptBudgeter(prompt_cap=500).budget_for(["unknown"], 1000) == 500
+
+
+def test_fit_keeps_everything_under_budget():
+    budgeter = PromptBudgeter(prompt_cap=10000)
+    sources = [_source(1, 0.5), _source(2, 0.9)]
+    result = budgeter.fit("system", "вопрос", sources, ["m"], 100)
+    assert [s["verse"] for s in result.sources] == ["2", "1"]
+    assert result.dropped_sources == 0
+    assert result.tokens_saved == 0
+
+
+def test_fit_drops_lowest_scores_and_truncates_last():
+    counter = TokenCounter()
+    sources = [_source(1, 0.2), _source(2, 0.9), _source(3, 0.5)]
+    fixed = counter.count("system") + counter.count("вопрос") + 8
+    one = counter.count(PromptBudgeter.source_text(sources[0])) + 2
+    budgeter = PromptBudgeter(counter=counter, prompt_cap=fixed + one + one // 2, min_truncated_tokens=10)
+
+    result = budgeter.fit("system", "вопрос", sources, ["m"], 100)
+
+    assert [s["verse"] for s in result.sources] == ["2", "3"]
+    assert result.sources[1]["text"].endswith("…")
+    assert result.truncated_sources == 1
+    assert result.dropped_sources == 1
+    assert result.prompt_tokens <= result.budget
+    assert result.tokens_saved > 0
+    assert sources[2]["text"] != result.sources[1]["text"]  # исходный словарь не изменён
+
+    stats = budgeter.stats()
+    assert stats["prompts"] == 1
+    assert stats["sources_dropped_total"] == 1
+    assert stats["prompt_tokens_saved_total"] == result.tokens_saved
+
+
+def test_fit_drops_partial_source_below_minimum():
+    counter = TokenCounter()
+    sources = [_source(1, 0.9), _source(2, 0.5)]
+    fixed = counter.count("s") + counter.count("q") + 8
+    one = counter.count(PromptBudgeter.source_text(sources[0])) + 2
+    budgeter = PromptBudgeter(counter=counter, prompt_cap=fixed + one + 5, min_truncated_tokens=48)
+    result = budgeter.fit("s", "q", sources, ["m"], 100)
+    assert [s["verse"] for s in result.sources] == ["1"]
+    assert result.truncated_sources == 0
+
+
+def test_fit_recounts_the_truncated_source():
+    # Счётчик, для которого голова текста «дороже» хвоста: пропорциональная оценка промахивается
+    class HeavyHead(TokenCounter):
+        def count(self, text):
+            return super().count(text) + (40 if text.endswith("…") else 0)
+
+    counter = HeavyHead()
+    sources = [_source(1, 0.9, words=200)]
+    fixed = counter.count("s") + counter.count("q") + 8
+    budgeter = PromptBudgeter(counter=counter, prompt_cap=fixed + 120, min_truncated_tokens=10)
+
+    result = budgeter.fit("s", "q", sources, ["m"], 100)
+
+    assert result.truncated_sources == 1
+    assert result.prompt_tokens <= result.budget
+    assert result.prompt_tokens == fixed + counter.count(PromptBudgeter.source_text(result.sources[0])) + 2
+
+
+def test_fit_drops_oldest_history_when_it_alone_exceeds_budget():
+    counter = TokenCounter()
+    history = [{"role": "user", "content": "а" * 300}, {"role": "assistant", "content": "б" * 30}]
+    fixed = counter.count("s") + counter.count("q") + 8
+    budgeter = PromptBudgeter(counter=counter, prompt_cap=fixed + 20)
+
+    result = budgeter.fit("s", "q", [_source(1, 0.9)], ["m"], 100, history=history)
+
+    assert result.history == history[1:]
+    assert result.dropped_history == 1
+    assert result.sources == []
+    assert result.prompt_tokens == fixed + counter.count("б" * 30) + 4 <= result.budget
+    assert len(history) == 2  # список вызывающего не изменён
@@ -0,0 +1,137 @@
+"""Тесты трассировки: traceparent, сэмплирование, вложенные спаны и экспортёры."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from halal_rag.llm.open_router import OpenRouterClient
+from halal_rag.observability import tracing
+from halal_rag.observability.interfaces import ISpanExporter
+from halal_rag.observability.metrics import timed
+from halal_rag.observability.tracing import FileSpanExporter, Tracer, parse_traceparent, span
+
+INCOMING = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+class ListExporter(ISpanExporter):
+    def __init__(self):
+        self.traces = []
+
+    def export(self, spans):
+        self.traces.append(spans)
+
+
+def test_parse_traceparent():
+    ctx = parse_traceparent(INCOMING)
+    assert ctx.trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert ctx.span_id == "00f067aa0ba902b7"
+    assert ctx.sampled is True
+    assert parse_traceparent(INCOMING[:-1] + "0").sampled is False
+    for bad in (None, "", "garbage", "ff" + INCOMING[2:], "00-" + "0" * 32 + "-00f067aa0ba902b7-01"):
+        assert parse_traceparent(bad) is None
+
+
+def test_unsampled_requests_create_no_spans():
+    exporter = ListExporter()
+    tracer = Tracer(exporter=exporter, sample_rate=0.0)
+
+    with tracer.trace("http.request") as root:
+        with span("encode") as child:
+            assert root is None and child is None
+
+    assert exporter.traces == []
+    assert tracer.stats()["traces_sampled"] == 0
+
+
+def test_caller_decision_and_trace_id_are_kept():
+    exporter = ListExporter()
+    tracer = Tracer(exporter=exporter, sample_rate=0.0)
+
+    def encode():
+        with timed("encode"):
+            pass
+
+    async def request():
+        with tracer.trace("http.request", traceparent=INCOMING, path="/llm/chat"):
+            with timed("retrieval"):
+                # Поиск выполняется в потоке — спаны наследуют контекст
+                await asyncio.to_thread(encode)
+            with span("upstream_http", model="x/y") as http_span:
+                http_span.set_attribute("status_code", 200)
+
+    asyncio.run(request())
+    (spans,) = exporter.traces
+    by_name = {s["name"]: s for s in spans}
+
+    assert {s["trace_id"] for s in spans} == {"4bf92f3577b34da6a3ce929d0e0e4736"}
+    assert by_name["http.request"]["parent_id"] == "00f067aa0ba902b7"
+    assert by_name["retrieval"]["parent_id"] == by_name["http.request"]["span_id"]
+    assert by_name["encode"]["parent_id"] == by_name["retrieval"]["span_id"]
+    assert by_name["upstream_http"]["attributes"] == {"model": "x/y", "status_code": 200}
+    assert by_name["http.request"]["duration_ms"] >= by_name["retrieval"]["duration_ms"]
+
+
+def test_sampled_out_caller_is_not_traced_and_errors_are_recorded():
+    exporter = ListExporter()
+    tracer = Tracer(exporter=exporter, sample_rate=1.0)
+
+    with tracer.trace("http.request", traceparent=INCOMING[:-1] + "0"):
+        pass
+    assert exporter.traces == []
+
+    with pytest.raises(RuntimeError):
+        with tracer.trace("http.request"):
+            with span("prompt_build"):
+                raise RuntimeError("boom")
+    spans = exporter.traces[0]
+    assert [s["status"] for s in spans] == ["error", "error"]
+    assert spans[1]["attributes"]["error"] == "RuntimeError"
+
+
+def test_file_exporter_writes_json_lines(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(exporter=FileSpanExporter(path), sample_rate=1.0)
+    with tracer.trace("http.request"):
+        with span("search"):
+            pass
+    tracer.shutdown()
+
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [line["name"] for line in lines] == ["http.request", "search"]
+
+
+def test_file_exporters_of_several_workers_keep_lines_whole(tmp_path):
+    # Воркеры pre-fork пишут в один TRACE_FILE: строки не должны перемешиваться
+    path = tmp_path / "traces.jsonl"
+    exporters = [FileSpanExporter(path) for _ in range(4)]
+    payload = "x" * 20_000  # больше буфера файла
+    for n, exporter in enumerate(exporters):
+        for i in range(25):
+            exporter.export([{"worker": n, "i": i, "payload": payload}] * 3)
+    for exporter in exporters:
+        exporter.shutdown()
+
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert len(lines) == 4 * 25 * 3
+    assert all(line["payload"] == payload for line in lines)
+
+
+@pytest.mark.asyncio
+async def test_upstream_call_carries_traceparent_of_its_span():
+    seen = {}
+
+    def handler(request):
+        seen["traceparent"] = request.headers.get("traceparent")
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+    exporter = ListExporter()
+    client = OpenRouterClient(base_url="http://upstream", transport=httpx.MockTransport(handler))
+    with Tracer(exporter=exporter, sample_rate=1.0).trace("http.request", traceparent=INCOMING):
+        await client.generate("q", "", api_key="k")
+    await client.close()
+
+    http_span = [s for s in exporter.traces[0] if s["name"] == "upstream_http"][0]
+    assert seen["traceparent"] == f"00-{http_span['trace_id']}-{http_span['span_id']}-01"
+    assert tracing.current_span() is None
@@ -0,0 +1,75 @@
+"""Тесты учёта токенов и задержек по моделям и ключам."""
+
+import asyncio
+
+import httpx
+
+from halal_rag.llm.circuit_breaker import CircuitOpenError
+from halal_rag.llm.usage import (
+    ANONYMOUS_KEY,
+    LatencyHistogram,
+    UsageTracker,
+    error_class,
+    hash_api_key,
+)
+
+
+def test_hash_api_key_is_stable_and_hides_key():
+    label = hash_api_key("sk-or-secret", salt="")
+    assert label == hash_api_key("sk-or-secret", salt="")
+    assert label.startswith("key_") and "secret" not in label
+    assert label != hash_api_key("sk-or-secret", salt="pepper")
+    assert hash_api_key(None) == ANONYMOUS_KEY
+
+
+def test_error_class_labels():
+    request = httpx.Request("POST", "https://x/chat/completions")
+    status_error = httpx.HTTPStatusError("boom", request=request, response=httpx.Response(503, request=request))
+    assert error_class(status_error) == "http_503"
+    assert error_class(httpx.ReadTimeout("slow")) == "timeout"
+    assert error_class(httpx.ConnectError("refused")) == "transport"
+    assert error_class(CircuitOpenError("m", 1.0)) == "circuit_open"
+    assert error_class(asyncio.CancelledError()) == "cancelled"
+    assert error_class(KeyError("x")) == "KeyError"
+
+
+def test_histogram_quantiles_use_bucket_bounds():
+    hist = LatencyHistogram(buckets=(0.1, 0.5, 1.0))
+    for value in (0.05, 0.05, 0.3, 0.8, 2.5):
+        hist.observe(value)
+    assert hist.quantile(0.4) == 0.1
+    assert hist.quantile(0.6) == 0.5
+    assert hist.quantile(1.0) == 2.5  # переполнение -> фактический максимум
+    summary = hist.summary()
+    assert summary["count"] == 5
+    assert summary["max_ms"] == 2500.0
+    assert LatencyHistogram().summary()["p50_ms"] is None
+
+
+def test_tracker_aggregates_by_model_and_key():
+    tracker = UsageTracker()
+    usage = {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120}
+    tracker.record("a/model", "k1", latency=1.2, ttft=0.4, usage=usage)
+    tracker.record("a/model", "k2", latency=0.8, ttft=0.3, usage=usage)
+    tracker.record("b/model", "k1", latency=5.0, error="http_429")
+
+    snap = tracker.snapshot()
+    a = snap["models"]["a/model"]
+    assert a["calls"] == 2 and a["successes"] == 2
+    assert a["total_tokens"] == 240
+    assert a["avg_prompt_tokens"] == 100.0
+    assert a["ttft"]["count"] == 2
+    b = snap["models"]["b/model"]
+    assert b["errors"] == {"http_429": 1}
+    assert b["error_rate"] == 1.0
+    assert snap["api_keys"][hash_api_key("k1")]["calls"] == 2
+
+
+def test_tracker_is_bounded():
+    tracker = UsageTracker(max_models=2, max_keys=2)
+    for i in range(5):
+        tracker.record(f"m{i}", f"k{i}", latency=0.1)
+    snap = tracker.snapshot()
+    assert list(snap["models"]) == ["m3", "m4"]
+    assert len(snap["api_keys"]) == 2
+    assert snap["evicted"] == 6
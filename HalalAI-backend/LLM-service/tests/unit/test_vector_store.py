@@ -3,6 +3,7 @@
 import pytest
 import torch
 
+from halal_rag.rag.metadata import SearchFilter
 from halal_rag.rag.vector_store import VectorStore
 
 
@@ -54,3 +55,26 @@ def test_append_documents_extends_embeddings():
     assert len(store.documents) == 2
     assert store.embeddings is not None
     assert store.embeddings.shape[0] == 2
+
+
+def test_append_normalizes_only_new_rows_into_one_buffer():
+    store = VectorStore()
+    store.add_documents([{"id": str(i), "sura": 1, "verse": str(i + 1)} for i in range(4)], torch.randn(4, 3) * 5)
+    store.add_documents([{"id": "4", "sura": 2, "verse": "1"}], torch.tensor([[0.0, 3.0, 4.0]]))
+    assert torch.allclose(store.embeddings.norm(dim=1), torch.ones(5))
+    assert torch.allclose(store.embeddings[4], torch.tensor([0.0, 0.6, 0.8]))
+
+    # Запас буфера: следующая вставка пишет на место, без копии всей матрицы
+    buffer = store._buffer
+    assert buffer.shape[0] == 6
+    store.add_documents([{"id": "5", "sura": 2, "verse": "2"}], torch.randn(1, 3))
+    assert store._buffer is buffer and store.embeddings.shape[0] == 6
+
+
+def test_metadata_index_catches_up_with_appended_rows():
+    store = VectorStore()
+    store.add_documents([{"id": "a", "sura": 1, "verse": "1"}], torch.tensor([[1.0, 0.0]]))
+    assert store.search(torch.tensor([0.0, 1.0]), top_k=5, search_filter=SearchFilter(suras=[2])) == []
+    store.add_documents([{"id": "b", "sura": 2, "verse": "1"}], torch.tensor([[0.0, 1.0]]))
+    hits = store.search(torch.tensor([0.0, 1.0]), top_k=5, search_filter=SearchFilter(suras=[2]))
+    assert [h["id"] for h in hits] == ["b"]